@@ -0,0 +1,30 @@
+"""Add inference limits to pricing plans
+
+Revision ID: 228db4c166e4
+Revises: 81ca8e0fde67
+Create Date: 2026-10-18 17:41:09.512803
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '228db4c166e4'
+down_revision: Union[str, Sequence[str], None] = '81ca8e0fde67'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('pricing_plans', sa.Column('max_concurrent_inferences', sa.Integer(), nullable=True))
+    op.add_column('pricing_plans', sa.Column('inference_weight', sa.Float(), server_default='1', nullable=False))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('pricing_plans', 'inference_weight')
+    op.drop_column('pricing_plans', 'max_concurrent_inferences')
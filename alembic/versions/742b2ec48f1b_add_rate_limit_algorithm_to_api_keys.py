@@ -0,0 +1,28 @@
+"""Add rate_limit_algorithm to api_keys
+
+Revision ID: 742b2ec48f1b
+Revises: 44fe2a4f59b4
+Create Date: 2026-10-18 09:12:31.402118
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '742b2ec48f1b'
+down_revision: Union[str, Sequence[str], None] = '44fe2a4f59b4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('api_keys', sa.Column('rate_limit_algorithm', sa.String(), server_default='sliding_window', nullable=False))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('api_keys', 'rate_limit_algorithm')
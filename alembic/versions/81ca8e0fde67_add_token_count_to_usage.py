@@ -0,0 +1,31 @@
+"""Add token_count to usage
+
+Revision ID: 81ca8e0fde67
+Revises: b399707cfd14
+Create Date: 2026-10-18 16:02:33.918240
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '81ca8e0fde67'
+down_revision: Union[str, Sequence[str], None] = 'b399707cfd14'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Added on the partitioned parent; Postgres adds it to every partition.
+    op.add_column('usage_logs', sa.Column('token_count', sa.Integer(), nullable=True))
+    op.add_column('usage_daily_rollups', sa.Column('token_count', sa.BigInteger(), server_default='0', nullable=False))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('usage_daily_rollups', 'token_count')
+    op.drop_column('usage_logs', 'token_count')
@@ -0,0 +1,112 @@
+"""Partition usage_logs by month
+
+Revision ID: 8e268b812028
+Revises: 97683b5cfe80
+Create Date: 2026-10-18 11:26:05.730914
+
+Rebuilds usage_logs as a table range-partitioned on "timestamp" with one
+partition per UTC month plus a default partition. Existing rows are copied
+over; partitions are created from the oldest row's month up to three months
+ahead. Later months are created by app.services.usage_partitions.
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8e268b812028'
+down_revision: Union[str, Sequence[str], None] = '97683b5cfe80'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute('ALTER TABLE usage_logs RENAME TO usage_logs_legacy')
+    op.execute('ALTER TABLE usage_logs_legacy RENAME CONSTRAINT usage_logs_pkey TO usage_logs_legacy_pkey')
+    op.execute('ALTER INDEX ix_usage_logs_id RENAME TO ix_usage_logs_legacy_id')
+    op.execute('ALTER INDEX ix_usage_logs_org_id RENAME TO ix_usage_logs_legacy_org_id')
+    op.execute('ALTER INDEX ix_usage_logs_timestamp RENAME TO ix_usage_logs_legacy_timestamp')
+    op.execute('ALTER SEQUENCE usage_logs_id_seq AS bigint')
+
+    # The partition key has to be part of the primary key.
+    op.execute("""
+        CREATE TABLE usage_logs (
+            id BIGINT NOT NULL DEFAULT nextval('usage_logs_id_seq'),
+            org_id UUID NOT NULL REFERENCES organizations (id),
+            api_key_id UUID NOT NULL REFERENCES api_keys (id),
+            endpoint VARCHAR NOT NULL,
+            method VARCHAR NOT NULL,
+            status_code INTEGER NOT NULL,
+            cost_multiplier DOUBLE PRECISION,
+            "timestamp" TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now(),
+            CONSTRAINT usage_logs_pkey PRIMARY KEY (id, "timestamp")
+        ) PARTITION BY RANGE ("timestamp")
+    """)
+    op.execute('ALTER SEQUENCE usage_logs_id_seq OWNED BY usage_logs.id')
+    op.create_index('ix_usage_logs_org_id_timestamp', 'usage_logs', ['org_id', 'timestamp'], unique=False)
+    op.create_index(op.f('ix_usage_logs_timestamp'), 'usage_logs', ['timestamp'], unique=False)
+
+    op.execute("""
+        DO $$
+        DECLARE
+            m date;
+        BEGIN
+            FOR m IN
+                SELECT generate_series(
+                    date_trunc('month', COALESCE((SELECT min("timestamp") FROM usage_logs_legacy), now()) AT TIME ZONE 'UTC'),
+                    date_trunc('month', now() AT TIME ZONE 'UTC') + interval '3 months',
+                    interval '1 month'
+                )::date
+            LOOP
+                EXECUTE format(
+                    'CREATE TABLE %I PARTITION OF usage_logs FOR VALUES FROM (%L) TO (%L)',
+                    'usage_logs_p' || to_char(m, 'YYYYMM'),
+                    m::timestamp AT TIME ZONE 'UTC',
+                    (m + interval '1 month')::timestamp AT TIME ZONE 'UTC'
+                );
+            END LOOP;
+        END $$
+    """)
+    op.execute('CREATE TABLE usage_logs_default PARTITION OF usage_logs DEFAULT')
+
+    op.execute("""
+        INSERT INTO usage_logs (id, org_id, api_key_id, endpoint, method, status_code, cost_multiplier, "timestamp")
+        SELECT id, org_id, api_key_id, endpoint, method, status_code, cost_multiplier, COALESCE("timestamp", now())
+        FROM usage_logs_legacy
+    """)
+    op.execute('DROP TABLE usage_logs_legacy')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute('ALTER TABLE usage_logs RENAME TO usage_logs_partitioned')
+    op.execute('ALTER TABLE usage_logs_partitioned RENAME CONSTRAINT usage_logs_pkey TO usage_logs_partitioned_pkey')
+    op.execute('ALTER INDEX ix_usage_logs_timestamp RENAME TO ix_usage_logs_partitioned_timestamp')
+    op.create_table('usage_logs',
+    sa.Column('id', sa.Integer(), server_default=sa.text("nextval('usage_logs_id_seq')"), nullable=False),
+    sa.Column('org_id', sa.UUID(), nullable=False),
+    sa.Column('api_key_id', sa.UUID(), nullable=False),
+    sa.Column('endpoint', sa.String(), nullable=False),
+    sa.Column('method', sa.String(), nullable=False),
+    sa.Column('status_code', sa.Integer(), nullable=False),
+    sa.Column('cost_multiplier', sa.Float(), nullable=True),
+    sa.Column('timestamp', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.ForeignKeyConstraint(['api_key_id'], ['api_keys.id'], ),
+    sa.ForeignKeyConstraint(['org_id'], ['organizations.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.execute("""
+        INSERT INTO usage_logs (id, org_id, api_key_id, endpoint, method, status_code, cost_multiplier, "timestamp")
+        SELECT id, org_id, api_key_id, endpoint, method, status_code, cost_multiplier, "timestamp"
+        FROM usage_logs_partitioned
+    """)
+    op.execute('ALTER SEQUENCE usage_logs_id_seq OWNED BY usage_logs.id')
+    op.execute('DROP TABLE usage_logs_partitioned')
+    op.execute('ALTER SEQUENCE usage_logs_id_seq AS integer')
+    op.create_index(op.f('ix_usage_logs_id'), 'usage_logs', ['id'], unique=False)
+    op.create_index(op.f('ix_usage_logs_org_id'), 'usage_logs', ['org_id'], unique=False)
+    op.create_index(op.f('ix_usage_logs_timestamp'), 'usage_logs', ['timestamp'], unique=False)
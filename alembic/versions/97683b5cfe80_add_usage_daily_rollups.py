@@ -0,0 +1,48 @@
+"""Add usage_daily_rollups and usage_counter_flushes
+
+Revision ID: 97683b5cfe80
+Revises: 742b2ec48f1b
+Create Date: 2026-10-18 10:03:47.118529
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '97683b5cfe80'
+down_revision: Union[str, Sequence[str], None] = '742b2ec48f1b'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('usage_daily_rollups',
+    sa.Column('org_id', sa.UUID(), nullable=False),
+    sa.Column('api_key_id', sa.UUID(), nullable=False),
+    sa.Column('endpoint', sa.String(), nullable=False),
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('request_count', sa.BigInteger(), nullable=False),
+    sa.Column('count_2xx', sa.BigInteger(), nullable=False),
+    sa.Column('count_4xx', sa.BigInteger(), nullable=False),
+    sa.Column('count_5xx', sa.BigInteger(), nullable=False),
+    sa.ForeignKeyConstraint(['api_key_id'], ['api_keys.id'], ),
+    sa.ForeignKeyConstraint(['org_id'], ['organizations.id'], ),
+    sa.PrimaryKeyConstraint('org_id', 'api_key_id', 'endpoint', 'day')
+    )
+    op.create_index(op.f('ix_usage_daily_rollups_day'), 'usage_daily_rollups', ['day'], unique=False)
+    op.create_table('usage_counter_flushes',
+    sa.Column('flush_key', sa.String(), nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.PrimaryKeyConstraint('flush_key')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('usage_counter_flushes')
+    op.drop_index(op.f('ix_usage_daily_rollups_day'), table_name='usage_daily_rollups')
+    op.drop_table('usage_daily_rollups')
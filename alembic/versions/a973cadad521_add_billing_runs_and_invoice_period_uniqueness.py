@@ -0,0 +1,44 @@
+"""Add billing_runs and invoice period uniqueness
+
+Revision ID: a973cadad521
+Revises: e5e1dd66e76f
+Create Date: 2026-10-18 13:52:41.208337
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a973cadad521'
+down_revision: Union[str, Sequence[str], None] = 'e5e1dd66e76f'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('billing_runs',
+    sa.Column('id', sa.UUID(), nullable=False),
+    sa.Column('start_date', sa.Date(), nullable=False),
+    sa.Column('end_date', sa.Date(), nullable=False),
+    sa.Column('status', sa.String(), nullable=False),
+    sa.Column('last_org_id', sa.UUID(), nullable=True),
+    sa.Column('invoice_count', sa.Integer(), nullable=False),
+    sa.Column('error', sa.String(), nullable=True),
+    sa.Column('started_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.Column('finished_at', sa.DateTime(timezone=True), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('start_date', 'end_date', name='uq_billing_runs_period')
+    )
+    op.create_unique_constraint('uq_invoices_org_period', 'invoices', ['org_id', 'start_date', 'end_date'])
+    op.create_index(op.f('ix_invoice_items_invoice_id'), 'invoice_items', ['invoice_id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_invoice_items_invoice_id'), table_name='invoice_items')
+    op.drop_constraint('uq_invoices_org_period', 'invoices', type_='unique')
+    op.drop_table('billing_runs')
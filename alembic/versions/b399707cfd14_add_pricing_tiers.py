@@ -0,0 +1,40 @@
+"""Add pricing tiers
+
+Revision ID: b399707cfd14
+Revises: cdef9e532d3c
+Create Date: 2026-10-18 15:08:52.317904
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b399707cfd14'
+down_revision: Union[str, Sequence[str], None] = 'cdef9e532d3c'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('pricing_rules', sa.Column('pricing_model', sa.String(), server_default='flat', nullable=False))
+    op.create_table('pricing_tiers',
+    sa.Column('id', sa.UUID(), nullable=False),
+    sa.Column('rule_id', sa.UUID(), nullable=False),
+    sa.Column('up_to', sa.BigInteger(), nullable=True),
+    sa.Column('unit_price', sa.Float(), nullable=False),
+    sa.Column('flat_fee', sa.Float(), nullable=False),
+    sa.ForeignKeyConstraint(['rule_id'], ['pricing_rules.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_pricing_tiers_rule_id'), 'pricing_tiers', ['rule_id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_pricing_tiers_rule_id'), table_name='pricing_tiers')
+    op.drop_table('pricing_tiers')
+    op.drop_column('pricing_rules', 'pricing_model')
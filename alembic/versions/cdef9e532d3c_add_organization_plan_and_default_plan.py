@@ -0,0 +1,37 @@
+"""Add organization plan and default plan
+
+Revision ID: cdef9e532d3c
+Revises: a973cadad521
+Create Date: 2026-10-18 14:31:07.644120
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'cdef9e532d3c'
+down_revision: Union[str, Sequence[str], None] = 'a973cadad521'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('pricing_plans', sa.Column('is_default', sa.Boolean(), server_default='false', nullable=False))
+    op.add_column('organizations', sa.Column('plan_id', sa.UUID(), nullable=True))
+    op.create_index(op.f('ix_organizations_plan_id'), 'organizations', ['plan_id'], unique=False)
+    op.create_foreign_key('organizations_plan_id_fkey', 'organizations', 'pricing_plans', ['plan_id'], ['id'])
+    # Invoicing used to bill everyone on whichever plan came back first; keep
+    # one plan as the default so existing organizations stay billed.
+    op.execute("UPDATE pricing_plans SET is_default = true WHERE id = (SELECT id FROM pricing_plans LIMIT 1)")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_constraint('organizations_plan_id_fkey', 'organizations', type_='foreignkey')
+    op.drop_index(op.f('ix_organizations_plan_id'), table_name='organizations')
+    op.drop_column('organizations', 'plan_id')
+    op.drop_column('pricing_plans', 'is_default')
@@ -0,0 +1,34 @@
+"""Add usage_rollup_state
+
+Revision ID: e5e1dd66e76f
+Revises: 8e268b812028
+Create Date: 2026-10-18 12:40:19.553271
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e5e1dd66e76f'
+down_revision: Union[str, Sequence[str], None] = '8e268b812028'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('usage_rollup_state',
+    sa.Column('name', sa.String(), nullable=False),
+    sa.Column('last_id', sa.BigInteger(), nullable=False),
+    sa.Column('covered_until', sa.DateTime(timezone=True), nullable=True),
+    sa.PrimaryKeyConstraint('name')
+    )
+    op.execute("INSERT INTO usage_rollup_state (name, last_id) VALUES ('usage_logs', 0)")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('usage_rollup_state')
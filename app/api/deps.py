@@ -1,14 +1,12 @@
 from typing import AsyncGenerator, Optional
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from jose import jwt, JWTError
+from jose import JWTError
 from sqlalchemy.ext.asyncio import AsyncSession
-from app.core import security
 from app.core.config import settings
-from app.db.session import get_db
-from app.models.user import User
+from app.db.session import get_db, get_read_db
 from app.schemas.token_schema import TokenPayload
-from app.crud.crud_user import get_user_by_email
+from app.services.auth_cache import OrgContext, UserPrincipal, token_verifier, user_principal_cache
 
 reusable_oauth2 = OAuth2PasswordBearer(
     tokenUrl=f"{settings.API_V1_STR}/auth/login/access-token"
@@ -17,19 +15,17 @@ reusable_oauth2 = OAuth2PasswordBearer(
 async def get_current_user(
     db: AsyncSession = Depends(get_db),
     token: str = Depends(reusable_oauth2)
-) -> User:
+) -> UserPrincipal:
+    # Warm path: memoized signature check and cached principal, no queries.
     try:
-        payload = jwt.decode(
-            token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM]
-        )
-        token_data = TokenPayload(**payload)
+        token_data = TokenPayload(sub=token_verifier.subject(token))
     except (JWTError, ValueError):
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Could not validate credentials",
         )
     
-    user = await get_user_by_email(db, email=token_data.sub)
+    user = await user_principal_cache.get(db, token_data.sub) if token_data.sub else None
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     if not user.is_active:
@@ -37,10 +33,18 @@ async def get_current_user(
     return user
 
 async def get_current_active_superuser(
-    current_user: User = Depends(get_current_user),
-) -> User:
+    current_user: UserPrincipal = Depends(get_current_user),
+) -> UserPrincipal:
     if not current_user.is_superuser:
         raise HTTPException(
             status_code=400, detail="The user doesn't have enough privileges"
         )
     return current_user
+
+async def get_current_org(
+    current_user: UserPrincipal = Depends(get_current_user),
+) -> OrgContext:
+    # Loaded and cached with the user principal; no query of its own.
+    if current_user.org is None:
+        raise HTTPException(status_code=400, detail="User not in any organization")
+    return current_user.org
@@ -1,39 +1,83 @@
 from typing import Any
-from fastapi import APIRouter, Depends
-from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.future import select
-from sqlalchemy import func
+from fastapi import APIRouter, Depends, Query
 from app.api import deps
-from app.models.user import User
-from app.models.usage import UsageLog
-from app.models.organization import Organization
+from app.db.session import engine, read_engine, replica_monitor
+from app.services.auth_cache import UserPrincipal
+from app.services.ai_service import generation_batcher
+from app.services.analytics import admin_analytics
+from app.services.generation_cache import generation_cache
+from app.services.heavy_hitters import heavy_hitters
+from app.services.inference_scheduler import inference_scheduler
 
 router = APIRouter()
 
 @router.get("/analytics")
 async def get_admin_analytics(
-    db: AsyncSession = Depends(deps.get_db),
-    current_user: User = Depends(deps.get_current_active_superuser),
+    current_user: UserPrincipal = Depends(deps.get_current_active_superuser),
 ) -> Any:
     """
     Get system-wide analytics (Admin only).
+
+    Served from counters maintained in Redis as organizations, users and
+    usage are recorded (see app.services.analytics), cached for
+    ANALYTICS_SNAPSHOT_TTL_SEC; active key/org counts are HyperLogLog
+    estimates.
+    """
+    return await admin_analytics.snapshot()
+
+@router.get("/heavy-hitters")
+async def get_heavy_hitters(
+    dimension: str = Query("orgs", pattern="^(orgs|keys|endpoints)$"),
+    window_minutes: int = Query(5, ge=1),
+    limit: int = Query(10, ge=1, le=100),
+    scope: str = Query("cluster", pattern="^(cluster|local)$"),
+    current_user: UserPrincipal = Depends(deps.get_current_active_superuser),
+) -> Any:
+    """
+    Hottest organizations, API keys or endpoints by request count over the
+    last `window_minutes` (Admin only). Counts are approximate: `cluster`
+    merges every worker's counts as of their last flush to Redis, `local`
+    is this worker alone, live, with each count's maximum over-estimate.
+    """
+    window_minutes = min(window_minutes, heavy_hitters.window_minutes)
+    if scope == "local":
+        items = heavy_hitters.top_local(dimension, window_minutes, limit)
+    else:
+        items = await heavy_hitters.top(dimension, window_minutes, limit)
+    return {"dimension": dimension, "window_minutes": window_minutes, "scope": scope, "items": items}
+
+@router.get("/ai/stats")
+async def get_ai_stats(
+    current_user: UserPrincipal = Depends(deps.get_current_active_superuser),
+) -> Any:
+    """
+    Generation cache, admission and batching statistics for this worker (Admin only).
     """
-    # Total Orgs
-    # Total Users
-    # Total Usage (Last 24h, 30d)
-    
-    org_count = await db.scalar(select(func.count(Organization.id)))
-    user_count = await db.scalar(select(func.count(User.id)))
-    
-    # Usage last 24h
-    usage_24h = await db.scalar(
-        select(func.count(UsageLog.id)).filter(
-            UsageLog.timestamp >= func.now() - func.interval('1 day')
-        )
-    )
-    
     return {
-        "total_organizations": org_count,
-        "total_users": user_count,
-        "usage_last_24h": usage_24h
+        "cache": generation_cache.stats(),
+        "scheduler": inference_scheduler.stats(),
+        "batcher": generation_batcher.stats(),
     }
+
+@router.get("/db/stats")
+async def get_db_stats(
+    current_user: UserPrincipal = Depends(deps.get_current_active_superuser),
+) -> Any:
+    """
+    Connection pool usage of this worker's engines and read replica status (Admin only).
+    """
+    return {
+        "primary_pool": engine.pool.status(),
+        "replica_pool": read_engine.pool.status() if read_engine is not None else None,
+        "replica": replica_monitor.stats(),
+    }
+
+@router.delete("/ai/cache")
+async def clear_ai_cache(
+    current_user: UserPrincipal = Depends(deps.get_current_active_superuser),
+) -> Any:
+    """
+    Drop this worker's in-memory generation cache (Admin only).
+    """
+    generation_cache.clear()
+    return {"status": "cleared"}
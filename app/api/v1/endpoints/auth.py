@@ -11,9 +11,18 @@ from app.crud import crud_user
 from app.models.user import User
 from app.schemas.token_schema import Token
 from app.schemas.user_schema import UserCreate, User as UserSchema
+from app.services.analytics import admin_analytics
+from app.services.auth_cache import user_principal_cache
 
 router = APIRouter()
 
+def _hashing_busy() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Too many authentication requests, try again shortly",
+        headers={"Retry-After": "1"},
+    )
+
 @router.post("/login/access-token", response_model=Token)
 async def login_access_token(
     db: AsyncSession = Depends(deps.get_db),
@@ -23,7 +32,14 @@ async def login_access_token(
     OAuth2 compatible token login, get an access token for future requests
     """
     user = await crud_user.get_user_by_email(db, email=form_data.username)
-    if not user or not security.verify_password(form_data.password, user.hashed_password):
+    try:
+        # Argon2 runs on the password hashing threads, not the event loop.
+        password_ok = user is not None and await security.verify_password_async(
+            form_data.password, user.hashed_password
+        )
+    except security.PasswordHashingBusy:
+        raise _hashing_busy()
+    if not password_ok:
         raise HTTPException(status_code=400, detail="Incorrect email or password")
     elif not user.is_active:
         raise HTTPException(status_code=400, detail="Inactive user")
@@ -51,7 +67,10 @@ async def signup(
             status_code=400,
             detail="The user with this email already exists in the system",
         )
-    user = await crud_user.create_user(db, user_in)
+    try:
+        user = await crud_user.create_user(db, user_in)
+    except security.PasswordHashingBusy:
+        raise _hashing_busy()
     
     # Create default organization
     from app.models.organization import Organization, OrganizationMember, OrgRole
@@ -70,5 +89,8 @@ async def signup(
     )
     db.add(member)
     await db.commit()
+    # The membership is cached with the user principal.
+    await user_principal_cache.invalidate(user.email)
+    await admin_analytics.increment_total("organizations")
     
     return user
@@ -1,10 +1,20 @@
 from typing import Any, List
 from datetime import date, timedelta
-from fastapi import APIRouter, Depends, Query
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query, Request
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from pydantic import TypeAdapter
 from app.api import deps
+from app.crud import crud_pricing
 from app.services import billing_service
-from app.models.user import User
+from app.models.billing import Invoice
+from app.models.organization import Organization
+from app.services.auth_cache import OrgContext, UserPrincipal
+from app.services.response_cache import json_response, response_cache
+from app.schemas import invoice_schema
+from app.schemas.pricing_schema import (
+    PricingPlan, PricingPlanCreate, PricingRule, PricingRuleCreate, OrganizationPlanUpdate
+)
 
 router = APIRouter()
 
@@ -14,7 +24,7 @@ async def generate_invoice(
     start_date: date = Query(...),
     end_date: date = Query(...),
     db: AsyncSession = Depends(deps.get_db),
-    current_user: User = Depends(deps.get_current_active_superuser), # Admin only
+    current_user: UserPrincipal = Depends(deps.get_current_active_superuser), # Admin only
 ) -> Any:
     """
     Trigger invoice generation for an organization manually.
@@ -22,20 +32,127 @@ async def generate_invoice(
     invoice = await billing_service.generate_invoice_for_org(db, org_id, start_date, end_date)
     return {"invoice_id": invoice.id, "total_amount": invoice.total_amount, "status": invoice.status}
 
-@router.get("/invoices")
+@router.post("/run-cycle", status_code=202)
+async def run_billing_cycle(
+    background_tasks: BackgroundTasks,
+    start_date: date = Query(...),
+    end_date: date = Query(...),
+    force: bool = False,
+    current_user: UserPrincipal = Depends(deps.get_current_active_superuser), # Admin only
+) -> Any:
+    """
+    Invoice every organization for the period in the background.
+    An interrupted run picks up where it stopped when triggered again;
+    `force` re-rates a period that already completed (paid invoices are kept).
+    """
+    background_tasks.add_task(billing_service.run_billing_cycle, start_date, end_date, force)
+    return {"status": "started", "start_date": start_date, "end_date": end_date}
+
+@router.get("/run-cycle")
+async def get_billing_cycle(
+    start_date: date = Query(...),
+    end_date: date = Query(...),
+    db: AsyncSession = Depends(deps.get_db),
+    current_user: UserPrincipal = Depends(deps.get_current_active_superuser), # Admin only
+) -> Any:
+    """
+    Progress of the billing cycle for a period.
+    """
+    run = await billing_service.get_billing_run(db, start_date, end_date)
+    if not run:
+        raise HTTPException(status_code=404, detail="No billing cycle for this period")
+    return {
+        "status": run.status,
+        "invoice_count": run.invoice_count,
+        "last_org_id": run.last_org_id,
+        "error": run.error,
+        "started_at": run.started_at,
+        "finished_at": run.finished_at,
+    }
+
+@router.get("/plans", response_model=List[PricingPlan])
+async def read_plans(
+    db: AsyncSession = Depends(deps.get_db),
+    current_user: UserPrincipal = Depends(deps.get_current_active_superuser), # Admin only
+) -> Any:
+    """
+    List pricing plans.
+    """
+    return await crud_pricing.get_plans(db)
+
+@router.post("/plans", response_model=PricingPlan)
+async def create_plan(
+    *,
+    db: AsyncSession = Depends(deps.get_db),
+    plan_in: PricingPlanCreate,
+    current_user: UserPrincipal = Depends(deps.get_current_active_superuser), # Admin only
+) -> Any:
+    """
+    Create a pricing plan, optionally with its rules.
+    """
+    return await crud_pricing.create_plan(db, plan_in)
+
+@router.put("/plans/{plan_id}/rules", response_model=PricingRule)
+async def set_plan_rule(
+    *,
+    plan_id: str,
+    db: AsyncSession = Depends(deps.get_db),
+    rule_in: PricingRuleCreate,
+    current_user: UserPrincipal = Depends(deps.get_current_active_superuser), # Admin only
+) -> Any:
+    """
+    Create or replace the plan's price for a resource.
+    """
+    if not await crud_pricing.get_plan(db, plan_id):
+        raise HTTPException(status_code=404, detail="Plan not found")
+    return await crud_pricing.set_rule(db, plan_id, rule_in)
+
+@router.delete("/plans/{plan_id}/rules/{resource_name}")
+async def delete_plan_rule(
+    plan_id: str,
+    resource_name: str,
+    db: AsyncSession = Depends(deps.get_db),
+    current_user: UserPrincipal = Depends(deps.get_current_active_superuser), # Admin only
+) -> Any:
+    await crud_pricing.delete_rule(db, plan_id, resource_name)
+    return {"status": "deleted"}
+
+@router.put("/organizations/{org_id}/plan")
+async def assign_org_plan(
+    *,
+    org_id: str,
+    db: AsyncSession = Depends(deps.get_db),
+    plan_in: OrganizationPlanUpdate,
+    current_user: UserPrincipal = Depends(deps.get_current_active_superuser), # Admin only
+) -> Any:
+    """
+    Move an organization to a plan (null for the default plan).
+    """
+    if not await db.scalar(select(Organization.id).filter(Organization.id == org_id)):
+        raise HTTPException(status_code=404, detail="Organization not found")
+    if plan_in.plan_id and not await crud_pricing.get_plan(db, str(plan_in.plan_id)):
+        raise HTTPException(status_code=404, detail="Plan not found")
+    await crud_pricing.assign_plan(db, org_id, plan_in.plan_id)
+    return {"org_id": org_id, "plan_id": plan_in.plan_id}
+
+@router.get("/invoices", response_model=List[invoice_schema.Invoice])
 async def get_my_invoices(
+    request: Request,
+    # Not the read replica: a lagging replica read right after invoicing
+    # would cache the old list under the new version.
     db: AsyncSession = Depends(deps.get_db),
-    current_user: User = Depends(deps.get_current_user),
+    org: OrgContext = Depends(deps.get_current_org),
 ) -> Any:
     """
-    List invoices for the current user's organization.
+    List invoices for the current user's organization. The list only
+    changes when invoices are (re)generated, so it is cached until then and
+    carries an ETag for If-None-Match revalidation.
     """
-    from app.models.organization import OrganizationMember
-    result = await db.execute(select(OrganizationMember).filter(OrganizationMember.user_id == current_user.id))
-    member = result.scalars().first()
-    if not member:
-         raise HTTPException(status_code=400, detail="User not in any organization")
-         
-    result = await db.execute(select(Invoice).filter(Invoice.org_id == member.org_id).order_by(Invoice.created_at.desc()))
-    invoices = result.scalars().all()
-    return invoices
+    key = await response_cache.key("invoices", org.org_id)
+    body = await response_cache.get(key)
+    if body is None:
+        result = await db.execute(select(Invoice).filter(Invoice.org_id == org.org_id).order_by(Invoice.created_at.desc()))
+        invoices = [invoice_schema.Invoice.model_validate(invoice) for invoice in result.scalars().all()]
+        body = TypeAdapter(List[invoice_schema.Invoice]).dump_json(invoices)
+        await response_cache.set(key, body)
+    return json_response(request, body)
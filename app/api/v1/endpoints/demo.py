@@ -3,10 +3,16 @@ from typing import Any
 
 router = APIRouter()
 
-from fastapi import APIRouter, Depends, HTTPException
+import contextlib
+import json
+import anyio
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from typing import Any
+from typing import Any, Optional
+from app.core.config import settings
 from app.services import ai_service
+from app.services.inference_scheduler import InferenceRejected, InferenceTenant, inference_scheduler
 from app.api import deps
 from app.models.user import User
 
@@ -15,10 +21,30 @@ router = APIRouter()
 class GenerationRequest(BaseModel):
     prompt: str
     max_length: int = 50
+    # Greedy (do_sample=false) or seeded requests are deterministic, and
+    # their results can be served from the generation cache.
+    do_sample: bool = True
+    temperature: float = 0.7
+    seed: Optional[int] = None
+
+    def params(self) -> ai_service.GenerationParams:
+        return ai_service.GenerationParams(do_sample=self.do_sample, temperature=self.temperature, seed=self.seed)
+
+def _tenant(request: Request) -> InferenceTenant:
+    # Resolved by RateLimitMiddleware; requests without a key share one queue.
+    api_key = getattr(request.state, "api_key", None)
+    if api_key is None:
+        return InferenceTenant(key=None, max_concurrent=settings.AI_ORG_MAX_CONCURRENT)
+    return InferenceTenant(
+        key=api_key.org_id,
+        max_concurrent=api_key.max_concurrent_inferences or settings.AI_ORG_MAX_CONCURRENT,
+        weight=api_key.inference_weight,
+    )
 
 @router.post("/generate")
 async def generate_ai_text(
-    request: GenerationRequest,
+    request_body: GenerationRequest,
+    request: Request,
     # Valid API Key required via middleware (already enforced globally or we can add dependency if we want strict user context)
     # The RateLimit middleware handles the key check.
     # But often we want to know WHO is calling to bill them properly?
@@ -30,9 +56,70 @@ async def generate_ai_text(
 ) -> Any:
     """
     Generate text using a local AI model (DistilGPT-2).
+
+    Requests queue fairly per organization; 429 or 503 with Retry-After
+    when the wait for a model slot would exceed the queue deadline.
     """
     try:
-        generated_text = await ai_service.generate_text(request.prompt, request.max_length)
+        generated_text = await ai_service.generate_text(
+            request_body.prompt, request_body.max_length, request_body.params(), tenant=_tenant(request)
+        )
         return {"generated_text": generated_text}
+    except InferenceRejected as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail, headers=e.headers())
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+class _SlotStreamingResponse(StreamingResponse):
+    """StreamingResponse that releases the stream's inference slot once sending ends, however it ends."""
+
+    def __init__(self, content, slot: contextlib.AsyncExitStack, **kwargs):
+        super().__init__(content, **kwargs)
+        self.slot = slot
+
+    async def __call__(self, scope, receive, send) -> None:
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            with anyio.CancelScope(shield=True):
+                await self.slot.aclose()
+
+@router.post("/generate/stream")
+async def generate_ai_text_stream(request_body: GenerationRequest, request: Request) -> Any:
+    """
+    Generate text as Server-Sent Events: one `data: {"text": ...}` event per
+    decoded chunk, then `event: done` with the generated token count.
+    Generation stops as soon as the client disconnects.
+
+    Streams are admitted by the inference scheduler like /generate, and
+    hold their slot until the response ends.
+    """
+    slot = contextlib.AsyncExitStack()
+    try:
+        await slot.enter_async_context(inference_scheduler.slot(_tenant(request), cost=request_body.max_length))
+    except InferenceRejected as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail, headers=e.headers())
+    stream = ai_service.GenerationStream(request_body.prompt, request_body.max_length, request_body.params())
+
+    async def events():
+        try:
+            async for chunk in stream:
+                yield f"data: {json.dumps({'text': chunk})}\n\n"
+            yield f"event: done\ndata: {json.dumps({'tokens': stream.token_count})}\n\n"
+        except Exception as e:
+            yield f"event: error\ndata: {json.dumps({'detail': str(e)})}\n\n"
+        finally:
+            # Also runs when the response is cancelled on disconnect; the
+            # shield lets the generation stop and report its token count
+            # inside the cancelled scope.
+            with anyio.CancelScope(shield=True):
+                await stream.aclose()
+            # Picked up by UsageTrackingMiddleware once the response is done.
+            request.state.generated_tokens = stream.token_count
+
+    return _SlotStreamingResponse(
+        events(),
+        slot,
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
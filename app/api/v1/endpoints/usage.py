@@ -1,52 +1,185 @@
-from typing import Any, List
-from datetime import date
-from fastapi import APIRouter, Depends, Query, HTTPException
+import base64
+import csv
+import io
+import json
+from typing import Any, AsyncIterator, Iterable, List, Optional
+from datetime import date, datetime, timedelta
+from fastapi import APIRouter, Depends, Query, HTTPException, Request, Response
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.future import select
-from sqlalchemy import func
 from app.api import deps
-from app.models.user import User
-from app.models.usage import UsageLog
-from app.models.organization import OrganizationMember
+from app.services.auth_cache import OrgContext
+from app.services import usage_service
+from app.services.response_cache import json_response, response_cache
 
 router = APIRouter()
 
+# Paginated listings return a plain JSON array; the opaque cursor of the
+# next page, when there is one, comes back in the X-Next-Cursor header.
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+EVENT_FIELDS = ["id", "timestamp", "api_key_id", "endpoint", "method", "status_code", "token_count"]
+SUMMARY_FIELDS = ["endpoint", "count", "date"]
+
+def _encode_cursor(*parts: Any) -> str:
+    raw = json.dumps([part.isoformat() if isinstance(part, (date, datetime)) else part for part in parts])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def _decode_cursor(cursor: str) -> list:
+    try:
+        return json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def _summary_after(cursor: Optional[str]) -> Optional[usage_service.SummaryKey]:
+    if cursor is None:
+        return None
+    try:
+        day, endpoint = _decode_cursor(cursor)
+        return date.fromisoformat(day), str(endpoint)
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def _events_after(cursor: Optional[str]) -> Optional[usage_service.EventKey]:
+    if cursor is None:
+        return None
+    try:
+        timestamp, event_id = _decode_cursor(cursor)
+        return datetime.fromisoformat(timestamp), int(event_id)
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def _summary_item(endpoint: str, count: int, day: date) -> dict:
+    return {"endpoint": endpoint, "count": count, "date": day}
+
+def _event_item(row) -> dict:
+    return dict(zip(EVENT_FIELDS, row))
+
+def _json_array(items: List[dict]) -> bytes:
+    return json.dumps(items, default=str, separators=(",", ":")).encode()
+
+def _join_arrays(*arrays: bytes) -> bytes:
+    """Concatenate serialized JSON arrays without parsing them."""
+    return b"[" + b",".join(array[1:-1] for array in arrays if array != b"[]") + b"]"
+
 @router.get("/summary")
 async def get_usage_summary(
+    request: Request,
+    response: Response,
     start_date: date = Query(...),
     end_date: date = Query(...),
-    db: AsyncSession = Depends(deps.get_db),
-    current_user: User = Depends(deps.get_current_user),
+    limit: Optional[int] = Query(None, ge=1, le=10000),
+    cursor: Optional[str] = Query(None),
+    db: AsyncSession = Depends(deps.get_read_db),
+    org: OrgContext = Depends(deps.get_current_org),
 ) -> Any:
     """
-    Get usage summary for the current user's organization.
+    Get usage summary for the current user's organization, ordered by date
+    and endpoint. Pass `limit` to page through long ranges: follow the
+    X-Next-Cursor response header with `cursor` until it is absent.
+
+    Unpaginated responses carry an ETag and honour If-None-Match. Days that
+    can no longer change are served from the response cache; only the
+    still-open days are aggregated on each request.
     """
-    # Get User's Org
-    result = await db.execute(select(OrganizationMember).filter(OrganizationMember.user_id == current_user.id))
-    member = result.scalars().first()
-    if not member:
-        raise HTTPException(status_code=400, detail="User not in any organization")
-    
-    # Query aggregated usage
-    usage_query = select(
-        UsageLog.endpoint,
-        func.count(UsageLog.id).label("count"),
-        func.date(UsageLog.timestamp).label("date")
-    ).filter(
-        UsageLog.org_id == member.org_id,
-        func.date(UsageLog.timestamp) >= start_date,
-        func.date(UsageLog.timestamp) <= end_date
-    ).group_by(UsageLog.endpoint, func.date(UsageLog.timestamp))
-    
-    result = await db.execute(usage_query)
-    data = result.all()
-    
-    # Format response
-    summary = []
-    for endpoint, count, day in data:
-        summary.append({
-            "endpoint": endpoint,
-            "count": count,
-            "date": day
-        })
-    return summary
+    if limit is not None or cursor is not None:
+        data = await usage_service.usage_by_endpoint_and_day(
+            db, org.org_id, start_date, end_date, after=_summary_after(cursor), limit=limit
+        )
+        if limit is not None and len(data) == limit:
+            endpoint, _, day = data[-1]
+            response.headers[NEXT_CURSOR_HEADER] = _encode_cursor(day, endpoint)
+        return [_summary_item(endpoint, count, day) for endpoint, count, day in data]
+
+    # date.min until the rollup job has covered anything: nothing is closed.
+    open_from = await usage_service.closed_before(db)
+    closed = current = b"[]"
+
+    if start_date < open_from:
+        closed_end = min(end_date, open_from - timedelta(days=1))
+        key = await response_cache.key("usage-summary", org.org_id, start_date, closed_end)
+        closed = await response_cache.get(key)
+        if closed is None:
+            data = await usage_service.usage_by_endpoint_and_day(db, org.org_id, start_date, closed_end)
+            closed = _json_array([_summary_item(endpoint, count, day) for endpoint, count, day in data])
+            await response_cache.set(key, closed)
+
+    open_start = max(start_date, open_from)
+    if open_start <= end_date:
+        data = await usage_service.usage_by_endpoint_and_day(db, org.org_id, open_start, end_date)
+        current = _json_array([_summary_item(endpoint, count, day) for endpoint, count, day in data])
+
+    return json_response(request, _join_arrays(closed, current))
+
+@router.get("/events")
+async def get_usage_events(
+    response: Response,
+    start_date: date = Query(...),
+    end_date: date = Query(...),
+    limit: int = Query(1000, ge=1, le=10000),
+    cursor: Optional[str] = Query(None),
+    db: AsyncSession = Depends(deps.get_read_db),
+    org: OrgContext = Depends(deps.get_current_org),
+) -> Any:
+    """
+    Raw usage events of the current user's organization ("log" metering
+    mode), oldest first, one page at a time; see X-Next-Cursor.
+    """
+    rows = await usage_service.usage_events(
+        db, org.org_id, start_date, end_date, after=_events_after(cursor), limit=limit
+    )
+    if len(rows) == limit:
+        last = rows[-1]
+        response.headers[NEXT_CURSOR_HEADER] = _encode_cursor(last.timestamp, last.id)
+    return [_event_item(row) for row in rows]
+
+def _ndjson(batch: Iterable[dict]) -> str:
+    return "".join(json.dumps(item, default=str) + "\n" for item in batch)
+
+def _csv(batch: Iterable[dict], fields: List[str], header: bool) -> str:
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=fields)
+    if header:
+        writer.writeheader()
+    writer.writerows(batch)
+    return buffer.getvalue()
+
+@router.get("/export")
+async def export_usage(
+    start_date: date = Query(...),
+    end_date: date = Query(...),
+    kind: str = Query("summary", pattern="^(summary|events)$"),
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    org: OrgContext = Depends(deps.get_current_org),
+) -> Any:
+    """
+    Export the organization's usage summary or raw events for a date range
+    as NDJSON or CSV. Rows are streamed from a server-side cursor as they
+    are read, so any range can be exported in constant memory.
+    """
+    if kind == "summary":
+        fields = SUMMARY_FIELDS
+        batches = (
+            [_summary_item(*row) for row in rows]
+            async for rows in usage_service.stream_usage_by_endpoint_and_day(org.org_id, start_date, end_date)
+        )
+    else:
+        fields = EVENT_FIELDS
+        batches = (
+            [_event_item(row) for row in rows]
+            async for rows in usage_service.stream_usage_events(org.org_id, start_date, end_date)
+        )
+
+    async def body() -> AsyncIterator[str]:
+        if format == "csv":
+            # Header even when the range is empty.
+            yield _csv([], fields, header=True)
+        async for batch in batches:
+            yield _csv(batch, fields, header=False) if format == "csv" else _ndjson(batch)
+
+    filename = f"usage-{kind}-{start_date}-{end_date}.{'csv' if format == 'csv' else 'ndjson'}"
+    return StreamingResponse(
+        body(),
+        media_type="text/csv" if format == "csv" else "application/x-ndjson",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
@@ -11,6 +11,18 @@ class Settings(BaseSettings):
     POSTGRES_SERVER: str
     POSTGRES_PORT: str = "5432"
     POSTGRES_DB: str
+    # Connections kept per worker, and how many more may be opened at peaks.
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 10
+    # Optional streaming replica for read-only endpoints (same credentials
+    # and database name). Reads fall back to the primary while its replay
+    # lag exceeds DB_REPLICA_MAX_LAG_SEC, checked every DB_REPLICA_LAG_CHECK_SEC.
+    POSTGRES_REPLICA_SERVER: Optional[str] = None
+    POSTGRES_REPLICA_PORT: str = "5432"
+    DB_REPLICA_POOL_SIZE: int = 10
+    DB_REPLICA_MAX_OVERFLOW: int = 20
+    DB_REPLICA_MAX_LAG_SEC: float = 5.0
+    DB_REPLICA_LAG_CHECK_SEC: float = 2.0
     
     # Redis
     REDIS_HOST: str
@@ -20,11 +32,113 @@ class Settings(BaseSettings):
     SECRET_KEY: str
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
+    # Verified tokens are remembered until they expire; user principals are
+    # cached per worker for AUTH_USER_CACHE_TTL_SEC (changes are pushed to
+    # every worker over Redis pub/sub; the TTL covers missed messages).
+    AUTH_TOKEN_CACHE_MAX_ENTRIES: int = 10000
+    AUTH_USER_CACHE_MAX_ENTRIES: int = 10000
+    AUTH_USER_CACHE_TTL_SEC: float = 30.0
+    # Argon2 hashing/verification threads, and how many calls may be running
+    # or queued for them before logins/signups are turned away with 503.
+    PASSWORD_HASH_WORKERS: int = 2
+    PASSWORD_HASH_MAX_PENDING: int = 64
+
+    # Usage ingestion (batched writes to usage_logs)
+    USAGE_QUEUE_MAX_SIZE: int = 10000
+    USAGE_FLUSH_BATCH_SIZE: int = 500
+    USAGE_FLUSH_INTERVAL_SEC: float = 1.0
+    USAGE_QUEUE_PUT_TIMEOUT_SEC: float = 0.5
+    # "log": one usage_logs row per request (batched).
+    # "counters": Redis counters rolled up into usage_daily_rollups; the
+    # request path never touches Postgres and no raw rows are kept.
+    USAGE_METERING_MODE: str = "log"
+    USAGE_COUNTER_FLUSH_INTERVAL_SEC: float = 10.0
+    # usage_logs monthly partitions: created this many months ahead, dropped
+    # once older than USAGE_RETENTION_MONTHS (0 keeps them forever).
+    USAGE_PARTITION_MONTHS_AHEAD: int = 3
+    USAGE_RETENTION_MONTHS: int = 0
+    USAGE_PARTITION_MAINTENANCE_INTERVAL_SEC: float = 3600.0
+    # usage_daily_rollups maintenance from usage_logs ("log" mode). The lag
+    # must exceed the longest time a row can take to commit after its
+    # timestamp (usage queue flush interval plus slack).
+    USAGE_ROLLUP_INTERVAL_SEC: float = 60.0
+    USAGE_ROLLUP_BATCH_ROWS: int = 500000
+    USAGE_ROLLUP_SAFETY_LAG_SEC: float = 300.0
+
+    # Billing cycle: organizations invoiced per transaction, and how many of
+    # those chunks run at once (each holds a DB connection).
+    BILLING_CYCLE_CHUNK_SIZE: int = 500
+    BILLING_CYCLE_CONCURRENCY: int = 4
+    # How often each worker checks Redis for a newer pricing version.
+    PRICING_VERSION_CHECK_SEC: float = 5.0
+
+    # Admin analytics snapshot, cached per worker.
+    ANALYTICS_SNAPSHOT_TTL_SEC: float = 30.0
+    # Heavy hitters (hottest orgs/keys/endpoints): Space-Saving counters per
+    # dimension and minute, minutes kept, and how often each worker adds its
+    # counts to the shared Redis sorted sets (trimmed to REDIS_CAPACITY).
+    HEAVY_HITTERS_CAPACITY: int = 200
+    HEAVY_HITTERS_WINDOW_MINUTES: int = 15
+    HEAVY_HITTERS_FLUSH_INTERVAL_SEC: float = 10.0
+    HEAVY_HITTERS_REDIS_CAPACITY: int = 1000
+
+    # Cached JSON of closed-period usage summaries and invoice lists, in Redis.
+    RESPONSE_CACHE_TTL_SEC: int = 86400
+
+    # API key resolution cache (in-process LRU in front of Redis/Postgres)
+    API_KEY_CACHE_MAX_ENTRIES: int = 10000
+    API_KEY_CACHE_TTL_SEC: float = 30.0
+    API_KEY_NEGATIVE_CACHE_TTL_SEC: float = 10.0
+    API_KEY_REDIS_TTL_SEC: int = 300
+
+    # Rate limiting (limit is APIKey.rate_limit_per_sec per window)
+    RATE_LIMIT_WINDOW_MS: int = 1000
+    # Hybrid mode: high-volume keys are admitted from per-worker token leases.
+    # Over-admission is bounded by about limit * LEASE_TTL_MS / WINDOW_MS.
+    RATE_LIMIT_LOCAL_LEASES: bool = False
+    RATE_LIMIT_LEASE_MIN_RATE: int = 50
+    RATE_LIMIT_LEASE_FRACTION: float = 0.1
+    RATE_LIMIT_LEASE_MAX: int = 100
+    RATE_LIMIT_LEASE_TTL_MS: int = 100
+    RATE_LIMIT_LEASE_RECONCILE_MS: int = 250
+
+    # Text generation micro-batching: a batch closes this long after its
+    # first request or when full.
+    AI_BATCH_WINDOW_MS: float = 10.0
+    AI_BATCH_MAX_SIZE: int = 8
+    # Inference worker processes, forked at startup with the model loaded and
+    # sharing its weights. 0 runs inference on a thread in the API process.
+    INFERENCE_WORKERS: int = 0
+    # "fp32", or "int8" for dynamically quantized linear layers (CPU).
+    AI_INFERENCE_BACKEND: str = "fp32"
+    # torch intra-op threads per inference process; 0 = torch's default
+    # in-process, cpu_count // INFERENCE_WORKERS in worker processes.
+    AI_TORCH_THREADS: int = 0
+    # Concurrent /demo/generate/stream generations (threads in the API process).
+    AI_STREAM_MAX_CONCURRENT: int = 2
+    # Result cache for deterministic generations (greedy or seeded); opt-in.
+    # The Redis tier is shared by all workers and off when its TTL is 0.
+    AI_CACHE_ENABLED: bool = False
+    AI_CACHE_MAX_BYTES: int = 64 * 1024 * 1024
+    AI_CACHE_MAX_ENTRY_BYTES: int = 64 * 1024
+    AI_CACHE_REDIS_TTL_SEC: int = 0
+    # Inference admission: generations admitted at once across all orgs
+    # (0 = enough to fill every batch in flight), the per-org cap for plans
+    # that don't set one, and the longest a request may wait for a slot.
+    AI_SCHEDULER_CAPACITY: int = 0
+    AI_ORG_MAX_CONCURRENT: int = 4
+    AI_QUEUE_DEADLINE_MS: float = 5000.0
     
     @property
     def SQLALCHEMY_DATABASE_URI(self) -> str:
         return f"postgresql+asyncpg://{self.POSTGRES_USER}:{self.POSTGRES_PASSWORD}@{self.POSTGRES_SERVER}:{self.POSTGRES_PORT}/{self.POSTGRES_DB}"
     
+    @property
+    def SQLALCHEMY_REPLICA_DATABASE_URI(self) -> Optional[str]:
+        if not self.POSTGRES_REPLICA_SERVER:
+            return None
+        return f"postgresql+asyncpg://{self.POSTGRES_USER}:{self.POSTGRES_PASSWORD}@{self.POSTGRES_REPLICA_SERVER}:{self.POSTGRES_REPLICA_PORT}/{self.POSTGRES_DB}"
+    
     @property
     def REDIS_URL(self) -> str:
         return f"redis://{self.REDIS_HOST}:{self.REDIS_PORT}/0"
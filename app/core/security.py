@@ -1,11 +1,29 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import Any, Union, Optional
+from typing import Any, Callable, TypeVar, Union, Optional
 from jose import jwt
 from passlib.context import CryptContext
 from app.core.config import settings
 
 pwd_context = CryptContext(schemes=["argon2"], deprecated="auto")
 
+T = TypeVar("T")
+
+# Argon2 takes tens of milliseconds of CPU per call (argon2-cffi releases the
+# GIL while hashing), so async code runs it on these threads instead of the
+# event loop. At most PASSWORD_HASH_MAX_PENDING calls run or wait for them;
+# past that a login burst is turned away rather than queueing without bound.
+_hash_executor = ThreadPoolExecutor(max_workers=settings.PASSWORD_HASH_WORKERS, thread_name_prefix="argon2")
+# Counted until the job itself finishes (it can't be stopped once running),
+# not until its caller stops waiting; released from the executor thread.
+_hash_pending = 0
+_hash_pending_lock = threading.Lock()
+
+class PasswordHashingBusy(Exception):
+    """Too many password hashes already running or queued."""
+
 def create_access_token(subject: Union[str, Any], expires_delta: timedelta = None) -> str:
     if expires_delta:
         expire = datetime.utcnow() + expires_delta
@@ -21,3 +39,31 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
 
 def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
+
+def _hash_done(_) -> None:
+    global _hash_pending
+    with _hash_pending_lock:
+        _hash_pending -= 1
+
+async def _run_hash(fn: Callable[..., T], *args: Any) -> T:
+    global _hash_pending
+    with _hash_pending_lock:
+        if _hash_pending >= settings.PASSWORD_HASH_MAX_PENDING:
+            raise PasswordHashingBusy()
+        _hash_pending += 1
+    try:
+        job = _hash_executor.submit(fn, *args)
+    except BaseException:
+        _hash_done(None)
+        raise
+    job.add_done_callback(_hash_done)
+    # A cancelled caller cancels the job only if it hasn't started yet.
+    return await asyncio.wrap_future(job)
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """verify_password() off the event loop; raises PasswordHashingBusy when saturated."""
+    return await _run_hash(verify_password, plain_password, hashed_password)
+
+async def get_password_hash_async(password: str) -> str:
+    """get_password_hash() off the event loop; raises PasswordHashingBusy when saturated."""
+    return await _run_hash(get_password_hash, password)
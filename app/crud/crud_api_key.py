@@ -6,12 +6,15 @@ from sqlalchemy.future import select
 from app.models.organization import APIKey
 from app.schemas.api_key_schema import APIKeyCreate, APIKeyUpdate
 
+def hash_api_key(key: str) -> str:
+    return hashlib.sha256(key.encode()).hexdigest()
+
 def generate_api_key() -> Tuple[str, str, str]:
     """Returns (full_key, prefix, key_hash)"""
     prefix = "sk_live_"
     secret = secrets.token_urlsafe(32)
     full_key = f"{prefix}{secret}"
-    key_hash = hashlib.sha256(full_key.encode()).hexdigest()
+    key_hash = hash_api_key(full_key)
     return full_key, prefix, key_hash
 
 async def create_api_key(db: AsyncSession, obj_in: APIKeyCreate, org_id: str) -> Tuple[APIKey, str]:
@@ -22,6 +25,7 @@ async def create_api_key(db: AsyncSession, obj_in: APIKeyCreate, org_id: str) ->
         key_hash=key_hash,
         name=obj_in.name,
         rate_limit_per_sec=obj_in.rate_limit_per_sec,
+        rate_limit_algorithm=obj_in.rate_limit_algorithm,
     )
     db.add(db_obj)
     await db.commit()
@@ -0,0 +1,98 @@
+from typing import List, Optional
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from sqlalchemy import delete, update
+from app.models.billing import PricingPlan, PricingRule, PricingTier
+from app.models.organization import APIKey, Organization
+from app.schemas.pricing_schema import PricingPlanCreate, PricingRuleCreate
+from app.services.api_key_resolver import api_key_resolver
+from app.services.pricing import pricing_engine
+
+# Every write to plans or rules invalidates the compiled rate table. Plan
+# assignments also invalidate the orgs' cached API keys, which carry the
+# plan's inference limits.
+
+async def _invalidate_api_keys(db: AsyncSession, *criteria) -> None:
+    result = await db.execute(
+        select(APIKey.key_hash).join(Organization, Organization.id == APIKey.org_id).filter(*criteria)
+    )
+    await api_key_resolver.invalidate_many(result.scalars().all())
+
+async def get_plans(db: AsyncSession) -> List[PricingPlan]:
+    result = await db.execute(select(PricingPlan).order_by(PricingPlan.name))
+    return result.scalars().all()
+
+async def get_plan(db: AsyncSession, plan_id: str) -> Optional[PricingPlan]:
+    result = await db.execute(select(PricingPlan).filter(PricingPlan.id == plan_id))
+    return result.scalars().first()
+
+def _apply_rule(db_obj: PricingRule, obj_in: PricingRuleCreate) -> None:
+    db_obj.resource_name = obj_in.resource_name
+    db_obj.unit_price = obj_in.unit_price
+    db_obj.free_tier_limit = obj_in.free_tier_limit
+    db_obj.pricing_model = obj_in.pricing_model.value
+
+def _add_tiers(db: AsyncSession, db_obj: PricingRule, obj_in: PricingRuleCreate) -> None:
+    for tier_in in obj_in.tiers:
+        db.add(PricingTier(rule_id=db_obj.id, **tier_in.model_dump()))
+
+async def create_plan(db: AsyncSession, obj_in: PricingPlanCreate) -> PricingPlan:
+    if obj_in.is_default:
+        await db.execute(update(PricingPlan).values(is_default=False))
+    db_obj = PricingPlan(
+        name=obj_in.name,
+        base_cost=obj_in.base_cost,
+        currency=obj_in.currency,
+        is_default=bool(obj_in.is_default),
+        max_concurrent_inferences=obj_in.max_concurrent_inferences,
+        inference_weight=obj_in.inference_weight,
+    )
+    db.add(db_obj)
+    await db.flush()
+    for rule_in in obj_in.rules:
+        rule = PricingRule(plan_id=db_obj.id)
+        _apply_rule(rule, rule_in)
+        db.add(rule)
+        await db.flush()
+        _add_tiers(db, rule, rule_in)
+    await db.commit()
+    await db.refresh(db_obj)
+    await pricing_engine.invalidate()
+    if db_obj.is_default:
+        # Orgs without a plan of their own now get this one.
+        await _invalidate_api_keys(db, Organization.plan_id.is_(None))
+    return db_obj
+
+async def set_rule(db: AsyncSession, plan_id: str, obj_in: PricingRuleCreate) -> PricingRule:
+    """Create or replace the plan's rule for obj_in.resource_name."""
+    result = await db.execute(
+        select(PricingRule).filter(PricingRule.plan_id == plan_id, PricingRule.resource_name == obj_in.resource_name)
+    )
+    db_obj = result.scalars().first()
+    if db_obj is None:
+        db_obj = PricingRule(plan_id=plan_id)
+        db.add(db_obj)
+    else:
+        await db.execute(delete(PricingTier).where(PricingTier.rule_id == db_obj.id))
+    _apply_rule(db_obj, obj_in)
+    await db.flush()
+    _add_tiers(db, db_obj, obj_in)
+    await db.commit()
+    await db.refresh(db_obj, ["tiers"])
+    await pricing_engine.invalidate()
+    return db_obj
+
+async def delete_rule(db: AsyncSession, plan_id: str, resource_name: str) -> None:
+    # Tiers go with it (ON DELETE CASCADE).
+    await db.execute(
+        delete(PricingRule).where(PricingRule.plan_id == plan_id, PricingRule.resource_name == resource_name)
+    )
+    await db.commit()
+    await pricing_engine.invalidate()
+
+async def assign_plan(db: AsyncSession, org_id: str, plan_id: Optional[str]) -> None:
+    # The org -> plan link is read from Postgres when invoicing, so the rate
+    # table doesn't need invalidating here; the org's resolved API keys do.
+    await db.execute(update(Organization).where(Organization.id == org_id).values(plan_id=plan_id))
+    await db.commit()
+    await _invalidate_api_keys(db, Organization.id == org_id)
@@ -3,7 +3,8 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 from app.models.user import User
 from app.schemas.user_schema import UserCreate
-from app.core.security import get_password_hash
+from app.core.security import get_password_hash_async
+from app.services.analytics import admin_analytics
 
 async def get_user_by_email(db: AsyncSession, email: str) -> Optional[User]:
     result = await db.execute(select(User).filter(User.email == email))
@@ -12,7 +13,7 @@ async def get_user_by_email(db: AsyncSession, email: str) -> Optional[User]:
 async def create_user(db: AsyncSession, user: UserCreate) -> User:
     db_user = User(
         email=user.email,
-        hashed_password=get_password_hash(user.password),
+        hashed_password=await get_password_hash_async(user.password),
         full_name=user.full_name,
         is_active=True,
         is_superuser=user.is_superuser,
@@ -20,4 +21,5 @@ async def create_user(db: AsyncSession, user: UserCreate) -> User:
     db.add(db_user)
     await db.commit()
     await db.refresh(db_user)
+    await admin_analytics.increment_total("users")
     return db_user
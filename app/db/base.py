@@ -1,5 +1,5 @@
 from app.db.base_class import Base
 from app.models.user import User
 from app.models.organization import Organization, OrganizationMember, APIKey
-from app.models.usage import UsageLog
-from app.models.billing import PricingPlan, PricingRule, Invoice, InvoiceItem
+from app.models.usage import UsageLog, UsageDailyRollup, UsageCounterFlush, UsageRollupState
+from app.models.billing import PricingPlan, PricingRule, PricingTier, Invoice, InvoiceItem, BillingRun
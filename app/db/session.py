@@ -1,13 +1,122 @@
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+import asyncio
+import logging
+import time
+from typing import Optional
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine, AsyncSession
 from sqlalchemy.orm import sessionmaker
 from app.core.config import settings
 
-engine = create_async_engine(settings.SQLALCHEMY_DATABASE_URI, future=True, echo=False)
+logger = logging.getLogger(__name__)
+
+engine = create_async_engine(
+    settings.SQLALCHEMY_DATABASE_URI,
+    future=True,
+    echo=False,
+    pool_size=settings.DB_POOL_SIZE,
+    max_overflow=settings.DB_MAX_OVERFLOW,
+)
 
 AsyncSessionLocal = sessionmaker(
     engine, class_=AsyncSession, expire_on_commit=False
 )
 
+# Optional streaming replica for read-only queries (reporting endpoints,
+# exports), with a pool of its own so they don't compete with ingestion for
+# primary connections.
+read_engine: Optional[AsyncEngine] = None
+ReadSessionLocal = None
+if settings.SQLALCHEMY_REPLICA_DATABASE_URI:
+    read_engine = create_async_engine(
+        settings.SQLALCHEMY_REPLICA_DATABASE_URI,
+        future=True,
+        echo=False,
+        pool_size=settings.DB_REPLICA_POOL_SIZE,
+        max_overflow=settings.DB_REPLICA_MAX_OVERFLOW,
+        pool_pre_ping=True,
+    )
+    ReadSessionLocal = sessionmaker(
+        read_engine, class_=AsyncSession, expire_on_commit=False
+    )
+
+# Seconds since the last replayed transaction, 0 when the replica has
+# replayed everything it received. NULL (counted as 0) on a server that
+# isn't a standby.
+_REPLICA_LAG_SQL = text("""
+    SELECT CASE
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())
+    END
+""")
+
+
+class ReplicaLagMonitor:
+    """
+    Decides whether reads may go to the replica. Its replay lag is measured
+    at most every `check_interval` seconds, when a read asks; while it
+    exceeds `max_lag` or the replica can't be reached, reads go to the
+    primary.
+    """
+
+    def __init__(self, engine: Optional[AsyncEngine], max_lag: float, check_interval: float):
+        self.engine = engine
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self.lag: Optional[float] = None
+        self._healthy = False
+        self._checked_at: Optional[float] = None
+        self._lock = asyncio.Lock()
+
+    async def use_replica(self) -> bool:
+        if self.engine is None:
+            return False
+        due = self._checked_at is None or time.monotonic() - self._checked_at >= self.check_interval
+        # One request measures; the others go by the last measurement.
+        if due and not self._lock.locked():
+            async with self._lock:
+                await self._check()
+        return self._healthy
+
+    def stats(self) -> dict:
+        return {"configured": self.engine is not None, "healthy": self._healthy, "lag_sec": self.lag}
+
+    async def _measure(self) -> float:
+        async with self.engine.connect() as conn:
+            return float(await conn.scalar(_REPLICA_LAG_SQL) or 0)
+
+    async def _check(self) -> None:
+        try:
+            self.lag = await asyncio.wait_for(self._measure(), max(self.check_interval, 1.0))
+            healthy = self.lag <= self.max_lag
+        except Exception:
+            logger.warning("Read replica unavailable, reading from the primary", exc_info=True)
+            self.lag = None
+            healthy = False
+        if healthy != self._healthy:
+            logger.info("Read replica %s (lag %s s)", "in use" if healthy else "bypassed", self.lag)
+        self._healthy = healthy
+        self._checked_at = time.monotonic()
+
+
+replica_monitor = ReplicaLagMonitor(
+    read_engine,
+    max_lag=settings.DB_REPLICA_MAX_LAG_SEC,
+    check_interval=settings.DB_REPLICA_LAG_CHECK_SEC,
+)
+
+async def read_sessionmaker() -> sessionmaker:
+    """Session factory for read-only work: the replica while it keeps up, else the primary."""
+    if await replica_monitor.use_replica():
+        return ReadSessionLocal
+    return AsyncSessionLocal
+
 async def get_db():
     async with AsyncSessionLocal() as session:
         yield session
+
+async def get_read_db():
+    """get_db() for read-only endpoints; reads may be up to DB_REPLICA_MAX_LAG_SEC stale."""
+    session_factory = await read_sessionmaker()
+    async with session_factory() as session:
+        yield session
@@ -1,12 +1,50 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from app.core.config import settings
 from app.api.v1.api import api_router
 from app.middleware.usage_tracker import UsageTrackingMiddleware
 from app.middleware.rate_limit import RateLimitMiddleware
+from app.services.ai_service import generation_batcher, start_inference_workers, stop_inference_workers
+from app.services.auth_cache import user_principal_cache
+from app.services.heavy_hitters import heavy_hitters
+from app.services.rate_limiter import rate_limiter
+from app.services.usage_counters import usage_counters
+from app.services.usage_ingest import usage_ingest_queue
+from app.services.usage_partitions import usage_partition_maintainer
+from app.services.usage_rollups import usage_rollup_worker
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Fork inference workers first, before anything else holds sockets or threads.
+    await start_inference_workers(settings.INFERENCE_WORKERS)
+    await usage_partition_maintainer.start()
+    await usage_ingest_queue.start()
+    await rate_limiter.start()
+    await user_principal_cache.start()
+    await heavy_hitters.start()
+    if settings.USAGE_METERING_MODE == "counters":
+        await usage_counters.start()
+    else:
+        await usage_rollup_worker.start()
+    await generation_batcher.start()
+    yield
+    await generation_batcher.stop()
+    if settings.USAGE_METERING_MODE == "counters":
+        await usage_counters.stop()
+    else:
+        await usage_rollup_worker.stop()
+    await heavy_hitters.stop()
+    await user_principal_cache.stop()
+    await rate_limiter.stop()
+    # Drain buffered usage events before the worker exits.
+    await usage_ingest_queue.stop()
+    await usage_partition_maintainer.stop()
+    await stop_inference_workers()
 
 app = FastAPI(
     title=settings.PROJECT_NAME,
-    openapi_url=f"{settings.API_V1_STR}/openapi.json"
+    openapi_url=f"{settings.API_V1_STR}/openapi.json",
+    lifespan=lifespan
 )
 
 app.add_middleware(UsageTrackingMiddleware)
@@ -1,72 +1,71 @@
-import time
-from fastapi import Request
-from starlette.middleware.base import BaseHTTPMiddleware
-from sqlalchemy.future import select
-from app.db.session import AsyncSessionLocal
-from app.models.organization import APIKey
-from app.models.usage import UsageLog
+from typing import Optional
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from app.core.config import settings
+from app.services.api_key_resolver import ResolvedAPIKey, api_key_resolver
+from app.services.heavy_hitters import heavy_hitters
+from app.services.usage_counters import usage_counters
+from app.services.usage_ingest import UsageEvent, usage_ingest_queue
+
+class UsageTrackingMiddleware:
+    # Plain ASGI middleware. The status code is captured from
+    # `http.response.start` and the usage event is emitted once the inner app
+    # has finished sending the response, so nothing has to be attached to
+    # `response.background` and streaming responses are not buffered.
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
 
-class UsageTrackingMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next):
-        start_time = time.time()
-        
         # Extract API Key
-        api_key_header = request.headers.get("X-API-KEY")
-        
-        response = await call_next(request)
-        
-        if api_key_header:
-            from starlette.background import BackgroundTask
-            
-            # If the response already has a background task, we need to chain them or handle it.
-            # For simplicity, we wrap the existing task if any.
-            # But usually, middleware is the outer layer.
-            
-            # We can also use FASTAPI's BackgroundTasks if we inject it, but middleware is lower level.
-            # Starlette Response object has a .background attribute.
-            
-            existing_task = response.background
-            
-            async def task_wrapper():
-                if existing_task:
-                    await existing_task()
-                await self.log_usage(api_key_header, request.url.path, request.method, response.status_code)
-            
-            response.background = BackgroundTask(task_wrapper)
-                
-        return response
+        api_key_header = Headers(scope=scope).get("X-API-KEY")
+        if not api_key_header:
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+
+        async def send_wrapper(message: Message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
 
-    async def log_usage(self, api_key_value: str, endpoint: str, method: str, status_code: int):
-        async with AsyncSessionLocal() as db:
-            # Find API Key
-            # In production, cache this lookup!
-            result = await db.execute(select(APIKey).filter(APIKey.key_hash == self.hash_key(api_key_value)))
-            # Wait, we store hash. Client sends full key. We need to hash it to look it up?
-            # Or we store prefix? 
-            # In `crud_api_key.py`, we generated `full_key` (prefix + secret) and stored `key_hash` (sha256 of full_key).
-            # So we must hash the incoming key to find it.
-            
-            # Correction: The validation logic is:
-            # 1. Provide X-API-KEY: sk_live_...
-            # 2. Hash it.
-            # 3. Look up in DB.
-            
-            hashed_key = self.hash_key(api_key_value)
-            result = await db.execute(select(APIKey).filter(APIKey.key_hash == hashed_key))
-            api_key_obj = result.scalars().first()
-            
-            if api_key_obj:
-                usage = UsageLog(
-                    org_id=api_key_obj.org_id,
-                    api_key_id=api_key_obj.id,
-                    endpoint=endpoint,
-                    method=method,
-                    status_code=status_code,
-                    cost_multiplier=1.0 # Logic to determine cost could be here
-                )
-                db.add(usage)
-                await db.commit()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            # RateLimitMiddleware normally resolved the key already.
+            state = scope.get("state", {})
+            if "api_key" in state:
+                api_key = state["api_key"]
+            else:
+                api_key = await api_key_resolver.resolve(api_key_header)
+            # Streaming endpoints report generated tokens once they finish.
+            await self.log_usage(api_key, scope["path"], scope["method"], status_code, state.get("generated_tokens"))
 
-    def hash_key(self, key: str) -> str:
-        import hashlib
-        return hashlib.sha256(key.encode()).hexdigest()
+    async def log_usage(
+        self, api_key: ResolvedAPIKey, endpoint: str, method: str, status_code: int, token_count: Optional[int] = None
+    ):
+        if not api_key:
+            return
+        # In-memory only; shared through Redis by the tracker's flusher.
+        heavy_hitters.record(api_key.org_id, api_key.id, endpoint)
+        event = UsageEvent(
+            org_id=api_key.org_id,
+            api_key_id=api_key.id,
+            endpoint=endpoint,
+            method=method,
+            status_code=status_code,
+            cost_multiplier=1.0, # Logic to determine cost could be here
+            token_count=token_count,
+        )
+        if settings.USAGE_METERING_MODE == "counters":
+            # One pipelined HINCRBY; flushed to usage_daily_rollups later.
+            await usage_counters.record(event)
+        else:
+            # The insert itself is buffered and written in bulk by the ingest
+            # queue instead of one transaction per request.
+            await usage_ingest_queue.enqueue(event)
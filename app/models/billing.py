@@ -1,4 +1,4 @@
-from sqlalchemy import Boolean, Column, String, DateTime, ForeignKey, Integer, Float, Date, Enum
+from sqlalchemy import Boolean, Column, String, DateTime, ForeignKey, Integer, Float, Date, Enum, UniqueConstraint, BigInteger
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
@@ -12,6 +12,16 @@ class InvoiceStatus(str, enum.Enum):
     PAID = "paid"
     VOID = "void"
 
+class PricingModel(str, enum.Enum):
+    FLAT = "flat"             # unit_price past free_tier_limit
+    GRADUATED = "graduated"   # each unit priced by the tier it falls in
+    VOLUME = "volume"         # all units priced by the tier the total falls in
+
+class BillingRunStatus(str, enum.Enum):
+    RUNNING = "running"
+    COMPLETED = "completed"
+    FAILED = "failed"
+
 class PricingPlan(Base):
     __tablename__ = "pricing_plans"
 
@@ -19,6 +29,12 @@ class PricingPlan(Base):
     name = Column(String, nullable=False)
     base_cost = Column(Float, default=0.0)
     currency = Column(String, default="USD")
+    # Plan for organizations without one assigned.
+    is_default = Column(Boolean, default=False, server_default="false", nullable=False)
+    # Inference admission: concurrent generations per org (NULL = the
+    # AI_ORG_MAX_CONCURRENT default) and the org's weight in fair queueing.
+    max_concurrent_inferences = Column(Integer, nullable=True)
+    inference_weight = Column(Float, default=1.0, server_default="1", nullable=False)
     
     rules = relationship("PricingRule", back_populates="plan")
 
@@ -30,11 +46,28 @@ class PricingRule(Base):
     resource_name = Column(String, nullable=False) # e.g. "api_call_gpt4"
     unit_price = Column(Float, default=0.0)
     free_tier_limit = Column(Integer, default=0)
+    # Graduated and volume rules are priced by their tiers; unit_price and
+    # free_tier_limit only apply to flat rules.
+    pricing_model = Column(String, default=PricingModel.FLAT, server_default=PricingModel.FLAT.value, nullable=False)
 
     plan = relationship("PricingPlan", back_populates="rules")
+    tiers = relationship("PricingTier", back_populates="rule", order_by="PricingTier.up_to", cascade="all, delete-orphan")
+
+class PricingTier(Base):
+    __tablename__ = "pricing_tiers"
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    rule_id = Column(UUID(as_uuid=True), ForeignKey("pricing_rules.id", ondelete="CASCADE"), nullable=False, index=True)
+    up_to = Column(BigInteger, nullable=True) # NULL = unbounded; the last tier is always treated as unbounded
+    unit_price = Column(Float, default=0.0, nullable=False)
+    flat_fee = Column(Float, default=0.0, nullable=False)
+
+    rule = relationship("PricingRule", back_populates="tiers")
 
 class Invoice(Base):
     __tablename__ = "invoices"
+    # One invoice per org and billing period; invoice writes upsert on this.
+    __table_args__ = (UniqueConstraint("org_id", "start_date", "end_date", name="uq_invoices_org_period"),)
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     org_id = Column(UUID(as_uuid=True), ForeignKey("organizations.id"), nullable=False)
@@ -52,10 +85,26 @@ class InvoiceItem(Base):
     __tablename__ = "invoice_items"
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
-    invoice_id = Column(UUID(as_uuid=True), ForeignKey("invoices.id"), nullable=False)
+    invoice_id = Column(UUID(as_uuid=True), ForeignKey("invoices.id"), nullable=False, index=True)
     description = Column(String, nullable=False)
     units = Column(Integer, default=0)
     unit_price = Column(Float, default=0.0)
     amount = Column(Float, default=0.0)
 
     invoice = relationship("Invoice", back_populates="items")
+
+class BillingRun(Base):
+    """Progress of a billing cycle over all organizations for one period."""
+    __tablename__ = "billing_runs"
+    __table_args__ = (UniqueConstraint("start_date", "end_date", name="uq_billing_runs_period"),)
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    start_date = Column(Date, nullable=False)
+    end_date = Column(Date, nullable=False)
+    status = Column(String, default=BillingRunStatus.RUNNING, nullable=False)
+    # Every organization with an id up to and including this one is invoiced.
+    last_org_id = Column(UUID(as_uuid=True), nullable=True)
+    invoice_count = Column(Integer, default=0, nullable=False)
+    error = Column(String, nullable=True)
+    started_at = Column(DateTime(timezone=True), server_default=func.now())
+    finished_at = Column(DateTime(timezone=True), nullable=True)
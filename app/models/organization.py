@@ -10,6 +10,11 @@ class OrgRole(str, enum.Enum):
     ADMIN = "admin"
     MEMBER = "member"
 
+class RateLimitAlgorithm(str, enum.Enum):
+    SLIDING_LOG = "sliding_log"
+    SLIDING_WINDOW = "sliding_window"
+    TOKEN_BUCKET = "token_bucket"
+
 class Organization(Base):
     __tablename__ = "organizations"
 
@@ -17,6 +22,8 @@ class Organization(Base):
     name = Column(String, nullable=False)
     billing_email = Column(String, nullable=False)
     stripe_customer_id = Column(String, nullable=True)
+    # NULL means the default pricing plan.
+    plan_id = Column(UUID(as_uuid=True), ForeignKey("pricing_plans.id"), nullable=True, index=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     
     users = relationship("OrganizationMember", back_populates="organization")
@@ -43,6 +50,7 @@ class APIKey(Base):
     name = Column(String)
     is_active = Column(Boolean, default=True)
     rate_limit_per_sec = Column(Integer, default=5)
+    rate_limit_algorithm = Column(String, default=RateLimitAlgorithm.SLIDING_WINDOW, server_default=RateLimitAlgorithm.SLIDING_WINDOW.value, nullable=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
     organization = relationship("Organization", back_populates="api_keys")
@@ -1,16 +1,54 @@
-from sqlalchemy import Boolean, Column, String, DateTime, ForeignKey, Integer, Float
+from sqlalchemy import Boolean, Column, String, DateTime, ForeignKey, Integer, Float, Date, BigInteger, Index, Sequence
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.sql import func
 from app.db.base_class import Base
 
 class UsageLog(Base):
+    # Range-partitioned by month on `timestamp` (see migration 8e268b812028
+    # and app.services.usage_partitions). Filter on `timestamp` ranges, not
+    # on expressions of it, so the planner can prune partitions.
     __tablename__ = "usage_logs"
+    __table_args__ = (
+        Index("ix_usage_logs_org_id_timestamp", "org_id", "timestamp"),
+        {"postgresql_partition_by": "RANGE (timestamp)"},
+    )
 
-    id = Column(Integer, primary_key=True, index=True)
-    org_id = Column(UUID(as_uuid=True), ForeignKey("organizations.id"), index=True, nullable=False)
+    id = Column(BigInteger, Sequence("usage_logs_id_seq"), primary_key=True)
+    org_id = Column(UUID(as_uuid=True), ForeignKey("organizations.id"), nullable=False)
     api_key_id = Column(UUID(as_uuid=True), ForeignKey("api_keys.id"), nullable=False)
     endpoint = Column(String, nullable=False)
     method = Column(String, nullable=False)
     status_code = Column(Integer, nullable=False)
     cost_multiplier = Column(Float, default=1.0)
-    timestamp = Column(DateTime(timezone=True), server_default=func.now(), index=True)
+    token_count = Column(Integer, nullable=True)
+    timestamp = Column(DateTime(timezone=True), primary_key=True, server_default=func.now(), index=True, nullable=False)
+
+class UsageDailyRollup(Base):
+    """Request counts per (org, API key, endpoint, UTC day)."""
+    __tablename__ = "usage_daily_rollups"
+
+    org_id = Column(UUID(as_uuid=True), ForeignKey("organizations.id"), primary_key=True)
+    api_key_id = Column(UUID(as_uuid=True), ForeignKey("api_keys.id"), primary_key=True)
+    endpoint = Column(String, primary_key=True)
+    day = Column(Date, primary_key=True, index=True)
+    request_count = Column(BigInteger, default=0, nullable=False)
+    count_2xx = Column(BigInteger, default=0, nullable=False)
+    count_4xx = Column(BigInteger, default=0, nullable=False)
+    count_5xx = Column(BigInteger, default=0, nullable=False)
+    token_count = Column(BigInteger, default=0, server_default="0", nullable=False)
+
+class UsageCounterFlush(Base):
+    """Redis counter snapshots already applied to usage_daily_rollups."""
+    __tablename__ = "usage_counter_flushes"
+
+    flush_key = Column(String, primary_key=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+
+class UsageRollupState(Base):
+    """High-water mark of usage_logs rows already added to usage_daily_rollups."""
+    __tablename__ = "usage_rollup_state"
+
+    name = Column(String, primary_key=True)
+    last_id = Column(BigInteger, default=0, nullable=False)
+    # Every usage_logs row with a timestamp before this is in the rollups.
+    covered_until = Column(DateTime(timezone=True), nullable=True)
@@ -2,10 +2,12 @@ from typing import Optional
 from pydantic import BaseModel
 from uuid import UUID
 from datetime import datetime
+from app.models.organization import RateLimitAlgorithm
 
 class APIKeyBase(BaseModel):
     name: Optional[str] = None
     rate_limit_per_sec: Optional[int] = 5
+    rate_limit_algorithm: Optional[RateLimitAlgorithm] = RateLimitAlgorithm.SLIDING_WINDOW
     is_active: Optional[bool] = True
 
 class APIKeyCreate(APIKeyBase):
@@ -0,0 +1,17 @@
+from typing import Optional
+from pydantic import BaseModel
+from uuid import UUID
+from datetime import date, datetime
+
+class Invoice(BaseModel):
+    id: UUID
+    org_id: UUID
+    start_date: date
+    end_date: date
+    total_amount: float = 0.0
+    status: str
+    due_date: Optional[date] = None
+    created_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
@@ -0,0 +1,50 @@
+from typing import List, Optional
+from pydantic import BaseModel, Field
+from uuid import UUID
+from app.models.billing import PricingModel
+
+class PricingTierBase(BaseModel):
+    up_to: Optional[int] = None # None = unbounded
+    unit_price: float = 0.0
+    flat_fee: float = 0.0
+
+class PricingTier(PricingTierBase):
+    class Config:
+        from_attributes = True
+
+class PricingRuleBase(BaseModel):
+    resource_name: str
+    unit_price: float = 0.0 # flat rules only
+    free_tier_limit: int = 0 # flat rules only
+    pricing_model: PricingModel = PricingModel.FLAT
+
+class PricingRuleCreate(PricingRuleBase):
+    tiers: List[PricingTierBase] = [] # graduated/volume rules
+
+class PricingRule(PricingRuleBase):
+    id: UUID
+    plan_id: UUID
+    tiers: List[PricingTier] = []
+
+    class Config:
+        from_attributes = True
+
+class PricingPlanBase(BaseModel):
+    name: str
+    base_cost: Optional[float] = 0.0
+    currency: Optional[str] = "USD"
+    is_default: Optional[bool] = False
+    max_concurrent_inferences: Optional[int] = Field(None, ge=1) # None = server default
+    inference_weight: float = Field(1.0, gt=0)
+
+class PricingPlanCreate(PricingPlanBase):
+    rules: List[PricingRuleCreate] = []
+
+class PricingPlan(PricingPlanBase):
+    id: UUID
+
+    class Config:
+        from_attributes = True
+
+class OrganizationPlanUpdate(BaseModel):
+    plan_id: Optional[UUID] = None # None puts the org back on the default plan
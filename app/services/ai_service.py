@@ -1,48 +1,543 @@
-from typing import Any, List
+from typing import Any, AsyncIterator, Callable, Deque, List, Optional
 import asyncio
-from concurrent.futures import ThreadPoolExecutor
+import contextlib
+import logging
+import multiprocessing
+import threading
+from collections import deque
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass
+
+from app.core.config import settings
+from app.services.generation_cache import cache_key, generation_cache
+from app.services.inference_scheduler import InferenceTenant, inference_scheduler
+
+logger = logging.getLogger(__name__)
 
 # We will use lazy loading to avoid loading model at startup if not needed.
 # This prevents huge memory usage if the endpoint isn't hit.
 _model = None
 _tokenizer = None
 _executor = ThreadPoolExecutor(max_workers=1)
+# Streams generate one sequence each, token by token, in the API process.
+_stream_executor = ThreadPoolExecutor(max_workers=settings.AI_STREAM_MAX_CONCURRENT)
+_load_lock = threading.Lock()
+# Set when inference runs in worker processes (INFERENCE_WORKERS > 0).
+_process_pool: Optional[ProcessPoolExecutor] = None
+_process_pool_workers = 0
 
 import os
 
+MODEL_NAME = "distilgpt2"
+
+@dataclass(frozen=True)
+class GenerationParams:
+    do_sample: bool = True
+    temperature: float = 0.7
+    seed: Optional[int] = None
+
+    @property
+    def deterministic(self) -> bool:
+        """Greedy decoding, or sampling from a fixed seed."""
+        return not self.do_sample or self.seed is not None
+
+    def generate_kwargs(self) -> dict:
+        """`generate` arguments for these parameters; build them once per call."""
+        if not self.do_sample:
+            return {"do_sample": False}
+        if self.seed is None:
+            return {"do_sample": True, "temperature": self.temperature}
+        # Seeded sampling draws from a generator of its own: torch's global
+        # RNG is shared with every other generation running in the process.
+        # The processor leaves only the sampled token, which greedy decoding
+        # then picks.
+        from transformers import LogitsProcessorList
+        return {
+            "do_sample": False,
+            "logits_processor": LogitsProcessorList([_SeededSampler(self.seed, self.temperature)]),
+        }
+
+# transformers' default top_k when sampling.
+_SAMPLING_TOP_K = 50
+
+class _SeededSampler:
+    """Logits processor sampling with temperature and top-k from a private, seeded generator."""
+
+    def __init__(self, seed: int, temperature: float):
+        import torch
+        self.generator = torch.Generator().manual_seed(seed)
+        self.temperature = temperature
+
+    def __call__(self, input_ids, scores):
+        import torch
+        top = torch.topk(scores / self.temperature, min(_SAMPLING_TOP_K, scores.shape[-1]), dim=-1)
+        choice = torch.multinomial(torch.softmax(top.values, dim=-1), 1, generator=self.generator)
+        tokens = top.indices.gather(-1, choice)
+        return torch.full_like(scores, float("-inf")).scatter(-1, tokens, 0.0)
+
+DEFAULT_PARAMS = GenerationParams()
+
+def mock_enabled() -> bool:
+    return os.getenv("MOCK_AI_MODEL", "false").lower() == "true"
+
+def configure_threads(threads: int) -> None:
+    """Set torch's intra-op thread count; 0 leaves torch's default."""
+    if threads > 0 and not mock_enabled():
+        import torch
+        torch.set_num_threads(threads)
+
+def _conv1d_to_linear(model) -> None:
+    # GPT-2 implements its projections as transformers' Conv1D (weight stored
+    # as in x out), which quantize_dynamic doesn't recognise. Swap each one
+    # for the equivalent nn.Linear so they get quantized too.
+    import torch
+    from transformers.pytorch_utils import Conv1D
+
+    for parent in model.modules():
+        for name, child in list(parent.named_children()):
+            if isinstance(child, Conv1D):
+                in_features, out_features = child.weight.shape
+                linear = torch.nn.Linear(in_features, out_features)
+                linear.weight.data = child.weight.data.t().contiguous()
+                linear.bias.data = child.bias.data
+                setattr(parent, name, linear)
+
+def build_model(backend: str = "fp32"):
+    """
+    Load the model and tokenizer for an inference backend.
+
+    fp32: the checkpoint as is.
+    int8: linear layers dynamically quantized to int8 (weights stored int8,
+          activations quantized on the fly), for CPU-only nodes.
+    """
+    from transformers import AutoModelForCausalLM, AutoTokenizer
+    tokenizer = AutoTokenizer.from_pretrained(MODEL_NAME)
+    # GPT-2 has no pad token. Batches are padded on the left so every
+    # row's generated tokens start at the same position.
+    tokenizer.pad_token = tokenizer.eos_token
+    tokenizer.padding_side = "left"
+    model = AutoModelForCausalLM.from_pretrained(MODEL_NAME)
+    model.eval()
+    if backend == "int8":
+        import torch
+        _conv1d_to_linear(model)
+        model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    elif backend != "fp32":
+        raise ValueError(f"Unknown inference backend: {backend}")
+    return model, tokenizer
+
+def inference_context():
+    """torch.inference_mode() around generation (no autograd bookkeeping at all)."""
+    if mock_enabled():
+        return contextlib.nullcontext()
+    import torch
+    return torch.inference_mode()
+
 def load_model():
     global _model, _tokenizer
-    if os.getenv("MOCK_AI_MODEL", "false").lower() == "true":
+    if mock_enabled():
         print("Mock AI Model Enabled. Skipping load.")
         return
 
-    if _model is None:
-        print("Loading AI Model (distilgpt2)...")
-        from transformers import AutoModelForCausalLM, AutoTokenizer
+    if _model is not None:
+        return
+    with _load_lock:
+        if _model is not None:
+            return
+        print(f"Loading AI Model ({MODEL_NAME}, {settings.AI_INFERENCE_BACKEND})...")
+        if not _process_pool_workers:
+            # In-process inference; worker processes set theirs on start.
+            configure_threads(settings.AI_TORCH_THREADS)
         # Use a small model for local testing
-        model_name = "distilgpt2" 
-        _tokenizer = AutoTokenizer.from_pretrained(model_name)
-        _model = AutoModelForCausalLM.from_pretrained(model_name)
+        model, tokenizer = build_model(settings.AI_INFERENCE_BACKEND)
+        _tokenizer = tokenizer
+        _model = model
         print("AI Model Loaded.")
 
-def generate_text_sync(prompt: str, max_length: int = 50) -> str:
+def generate_batch_sync(
+    prompts: List[str], max_lengths: List[int], params: GenerationParams = DEFAULT_PARAMS
+) -> List[str]:
+    """
+    Generate for several prompts in one `generate` call.
+
+    max_lengths[i] counts prompt tokens, as `max_length` does for a single
+    prompt. The batch decodes as many new tokens as its longest request
+    needs and each row is cut back to its own limit. A seeded batch must
+    hold a single prompt, or the rows would share one random stream.
+    """
     load_model()
-    
-    if os.getenv("MOCK_AI_MODEL", "false").lower() == "true":
-        return f"[MOCK AI] Generated text for: {prompt}"
-
-    inputs = _tokenizer.encode(prompt, return_tensors="pt")
-    outputs = _model.generate(
-        inputs, 
-        max_length=max_length, 
-        num_return_sequences=1,
-        pad_token_id=_tokenizer.eos_token_id,
-        do_sample=True,
-        temperature=0.7
+
+    if mock_enabled():
+        return [f"[MOCK AI] Generated text for: {prompt}" for prompt in prompts]
+
+    inputs = _tokenizer(prompts, return_tensors="pt", padding=True)
+    padded_length = inputs["input_ids"].shape[1]
+    prompt_lengths = inputs["attention_mask"].sum(dim=1).tolist()
+    new_tokens = [max(max_length - length, 0) for max_length, length in zip(max_lengths, prompt_lengths)]
+
+    outputs = inputs["input_ids"]
+    if max(new_tokens) > 0:
+        with inference_context():
+            outputs = _model.generate(
+                **inputs,
+                max_new_tokens=max(new_tokens),
+                num_return_sequences=1,
+                pad_token_id=_tokenizer.eos_token_id,
+                **params.generate_kwargs()
+            )
+
+    results = []
+    for row, length, new in zip(outputs, prompt_lengths, new_tokens):
+        tokens = row[padded_length - length:padded_length + new]
+        results.append(_tokenizer.decode(tokens, skip_special_tokens=True))
+    return results
+
+def generate_text_sync(prompt: str, max_length: int = 50, params: GenerationParams = DEFAULT_PARAMS) -> str:
+    return generate_batch_sync([prompt], [max_length], params)[0]
+
+@dataclass
+class _PendingGeneration:
+    prompt: str
+    max_length: int
+    params: GenerationParams
+    future: asyncio.Future
+
+    def batches_with(self, other: "_PendingGeneration") -> bool:
+        return self.params == other.params and self.params.seed is None
+
+class GenerationBatcher:
+    """
+    Collects concurrent generate_text() calls into batched `generate` calls.
+
+    A batch closes `window_ms` after its first request or once it holds
+    `max_batch_size` requests, and runs on the inference executor. Up to
+    `concurrency` batches run at once (one per inference worker); requests
+    arriving while all of them are busy queue up and form the next batch, so
+    under load batches fill without waiting for the window. Only requests
+    with the same decoding parameters share a batch (seeded ones run alone);
+    others are held back, in order, for the following batches.
+    """
+
+    def __init__(self, window_ms: float, max_batch_size: int, executor: Executor, concurrency: int = 1):
+        self.window = window_ms / 1000
+        self.max_batch_size = max_batch_size
+        self.executor = executor
+        self.concurrency = concurrency
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._in_flight: set = set()
+        self._deferred: Deque[_PendingGeneration] = deque()
+        self.batches = 0
+        self.requests = 0
+
+    def use_executor(self, executor: Executor, concurrency: int) -> None:
+        """Switch executors; only before start()."""
+        self.executor = executor
+        self.concurrency = concurrency
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._queue = asyncio.Queue()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+            # Let batches already handed to the executor finish.
+            if self._in_flight:
+                await asyncio.gather(*self._in_flight, return_exceptions=True)
+            while self._deferred or not self._queue.empty():
+                pending = self._deferred.popleft() if self._deferred else self._queue.get_nowait()
+                if not pending.future.done():
+                    pending.future.set_exception(RuntimeError("Text generation is shutting down"))
+
+    async def submit(self, prompt: str, max_length: int, params: GenerationParams = DEFAULT_PARAMS) -> str:
+        # Started lazily too, so the service works without the app lifespan.
+        await self.start()
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait(_PendingGeneration(prompt, max_length, params, future))
+        return await future
+
+    def stats(self) -> dict:
+        return {
+            "batches": self.batches,
+            "requests": self.requests,
+            "avg_batch_size": self.requests / self.batches if self.batches else 0.0,
+            "queued": (self._queue.qsize() if self._queue is not None else 0) + len(self._deferred),
+            "in_flight": len(self._in_flight),
+        }
+
+    async def _collect(self) -> List[_PendingGeneration]:
+        loop = asyncio.get_running_loop()
+        # Requests held back from earlier batches go first.
+        held, self._deferred = self._deferred, deque()
+        first = held.popleft() if held else await self._queue.get()
+        batch = [first]
+        for pending in held:
+            if len(batch) < self.max_batch_size and first.batches_with(pending):
+                batch.append(pending)
+            else:
+                self._deferred.append(pending)
+
+        deadline = loop.time() + self.window
+        while len(batch) < self.max_batch_size and first.params.seed is None:
+            if not self._queue.empty():
+                pending = self._queue.get_nowait()
+            else:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    pending = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+            if first.batches_with(pending):
+                batch.append(pending)
+            else:
+                self._deferred.append(pending)
+        # Callers that went away (client disconnects) don't need a slot.
+        return [pending for pending in batch if not pending.future.done()]
+
+    async def _run(self) -> None:
+        slots = asyncio.Semaphore(self.concurrency)
+        while True:
+            await slots.acquire()
+            batch = await self._collect()
+            if not batch:
+                slots.release()
+                continue
+            self.batches += 1
+            self.requests += len(batch)
+            task = asyncio.create_task(self._dispatch(batch))
+            self._in_flight.add(task)
+            task.add_done_callback(self._in_flight.discard)
+            task.add_done_callback(lambda _: slots.release())
+
+    async def _dispatch(self, batch: List[_PendingGeneration]) -> None:
+        loop = asyncio.get_running_loop()
+        try:
+            results = await loop.run_in_executor(
+                self.executor,
+                generate_batch_sync,
+                [pending.prompt for pending in batch],
+                [pending.max_length for pending in batch],
+                batch[0].params,
+            )
+        except Exception as e:
+            logger.exception("Batched generation failed (%d requests)", len(batch))
+            if isinstance(e, BrokenProcessPool):
+                # A worker died (e.g. OOM-killed); later batches get a fresh pool.
+                self.executor = _respawn_process_pool()
+            for pending in batch:
+                if not pending.future.done():
+                    pending.future.set_exception(e)
+            return
+        for pending, text in zip(batch, results):
+            if not pending.future.done():
+                pending.future.set_result(text)
+
+generation_batcher = GenerationBatcher(
+    window_ms=settings.AI_BATCH_WINDOW_MS,
+    max_batch_size=settings.AI_BATCH_MAX_SIZE,
+    executor=_executor,
+)
+
+# Worker-process inference.
+#
+# The model is loaded once in the API process and the workers are forked
+# from it, so they share its weights copy-on-write (inference never writes
+# to them) instead of each loading its own copy. Each worker gets an equal
+# share of the CPU cores for torch's intra-op threads. Prompts and results
+# travel over the executor's IPC queues.
+
+def _init_worker(torch_threads: int) -> None:
+    configure_threads(torch_threads)
+
+def _worker_ready() -> int:
+    return os.getpid()
+
+def _new_process_pool(workers: int) -> ProcessPoolExecutor:
+    torch_threads = settings.AI_TORCH_THREADS or max(1, (os.cpu_count() or 1) // workers)
+    return ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context("fork"),
+        initializer=_init_worker,
+        initargs=(torch_threads,),
     )
-    return _tokenizer.decode(outputs[0], skip_special_tokens=True)
 
-async def generate_text(prompt: str, max_length: int = 50) -> str:
-    # Run blocking CPU-bound model inference in a thread
+def _use_executor(executor: Executor, concurrency: int) -> None:
+    generation_batcher.use_executor(executor, concurrency)
+    if not settings.AI_SCHEDULER_CAPACITY:
+        # Admit just enough to fill every batch; the rest wait their fair turn.
+        inference_scheduler.capacity = concurrency * settings.AI_BATCH_MAX_SIZE
+
+def _respawn_process_pool() -> ProcessPoolExecutor:
+    global _process_pool
+    old = _process_pool
+    _process_pool = _new_process_pool(_process_pool_workers)
+    if old is not None:
+        old.shutdown(wait=False)
+    return _process_pool
+
+async def start_inference_workers(workers: int) -> None:
+    """Fork `workers` inference processes with the model preloaded; 0 keeps inference in-process."""
+    global _process_pool, _process_pool_workers
+    if workers <= 0 or _process_pool is not None:
+        return
+    if not mock_enabled():
+        # Only streams still run inference in the API process. Keeping
+        # torch single-threaded here means no OpenMP thread pool exists to
+        # be inherited in a broken state by the forked workers.
+        import torch
+        torch.set_num_threads(1)
+    _process_pool_workers = workers
+    # Load before forking so every worker inherits the weights.
+    load_model()
+    _process_pool = _new_process_pool(workers)
+    # Fork now rather than on the first request.
     loop = asyncio.get_running_loop()
-    return await loop.run_in_executor(_executor, generate_text_sync, prompt, max_length)
+    pids = await asyncio.gather(*(loop.run_in_executor(_process_pool, _worker_ready) for _ in range(workers)))
+    _use_executor(_process_pool, concurrency=workers)
+    logger.info("Started %d inference workers: %s", workers, sorted(set(pids)))
+
+async def stop_inference_workers() -> None:
+    global _process_pool
+    if _process_pool is None:
+        return
+    pool, _process_pool = _process_pool, None
+    _use_executor(_executor, concurrency=1)
+    await asyncio.get_running_loop().run_in_executor(None, pool.shutdown)
+
+def stream_text_sync(
+    prompt: str,
+    max_length: int,
+    emit: Callable[[str], None],
+    cancelled: threading.Event,
+    params: GenerationParams = DEFAULT_PARAMS,
+) -> int:
+    """
+    Generate for one prompt, calling emit() with each piece of decoded text
+    as it is produced. Stops early once `cancelled` is set. Returns the
+    number of generated tokens.
+    """
+    load_model()
+
+    if mock_enabled():
+        count = 0
+        for word in f"[MOCK AI] Generated text for: {prompt}".split(" "):
+            if cancelled.is_set():
+                break
+            emit(word + " ")
+            count += 1
+        return count
+
+    from transformers import StoppingCriteria, StoppingCriteriaList, TextStreamer
+
+    class _Streamer(TextStreamer):
+        token_count = 0
+
+        def put(self, value):
+            if not (self.skip_prompt and self.next_tokens_are_prompt):
+                self.token_count += value.numel()
+            super().put(value)
+
+        def on_finalized_text(self, text: str, stream_end: bool = False):
+            if text:
+                emit(text)
+
+    class _StopWhenCancelled(StoppingCriteria):
+        def __call__(self, input_ids, scores, **kwargs) -> bool:
+            return cancelled.is_set()
+
+    inputs = _tokenizer(prompt, return_tensors="pt")
+    streamer = _Streamer(_tokenizer, skip_prompt=True, skip_special_tokens=True)
+    with inference_context():
+        _model.generate(
+            **inputs,
+            max_length=max_length,
+            num_return_sequences=1,
+            pad_token_id=_tokenizer.eos_token_id,
+            streamer=streamer,
+            **params.generate_kwargs(),
+            stopping_criteria=StoppingCriteriaList([_StopWhenCancelled()]),
+        )
+    return streamer.token_count
+
+class GenerationStream:
+    """
+    Async iterator over the text of one generation as it is produced.
+
+    Generation runs on the stream executor and is cancelled, freeing its
+    thread at the next token, when iteration stops early (aclose(), or the
+    consuming task being cancelled on client disconnect). `token_count` is
+    final once iteration has finished.
+    """
+
+    _END = object()
+
+    def __init__(self, prompt: str, max_length: int = 50, params: GenerationParams = DEFAULT_PARAMS):
+        self.prompt = prompt
+        self.max_length = max_length
+        self.params = params
+        self.token_count = 0
+        self._cancelled = threading.Event()
+        self._future: Optional[asyncio.Future] = None
+
+    async def __aiter__(self) -> AsyncIterator[str]:
+        loop = asyncio.get_running_loop()
+        chunks: asyncio.Queue = asyncio.Queue()
+
+        def emit(text: str) -> None:
+            loop.call_soon_threadsafe(chunks.put_nowait, text)
+
+        self._future = loop.run_in_executor(
+            _stream_executor, stream_text_sync, self.prompt, self.max_length, emit, self._cancelled, self.params
+        )
+        # Runs on the loop after every emit() callback already queued.
+        self._future.add_done_callback(lambda _: chunks.put_nowait(self._END))
+        try:
+            while True:
+                chunk = await chunks.get()
+                if chunk is self._END:
+                    break
+                yield chunk
+            self.token_count = self._future.result()
+        finally:
+            self._cancelled.set()
+
+    async def aclose(self) -> None:
+        """Stop generation and wait for it to release its thread."""
+        self._cancelled.set()
+        if self._future is not None:
+            try:
+                self.token_count = await self._future
+            except Exception:
+                pass
+
+async def generate_text(
+    prompt: str,
+    max_length: int = 50,
+    params: GenerationParams = DEFAULT_PARAMS,
+    tenant: Optional[InferenceTenant] = None,
+) -> str:
+    # Blocking CPU-bound model inference runs batched on the executor
+    # (a thread, or worker processes when INFERENCE_WORKERS > 0), once the
+    # scheduler admits it for `tenant`. Cache hits skip the queue.
+    async def run() -> str:
+        if tenant is None:
+            return await generation_batcher.submit(prompt, max_length, params)
+        async with inference_scheduler.slot(tenant, cost=max_length):
+            return await generation_batcher.submit(prompt, max_length, params)
+
+    if not (settings.AI_CACHE_ENABLED and params.deterministic):
+        return await run()
+    key = cache_key(
+        MODEL_NAME, settings.AI_INFERENCE_BACKEND, prompt, max_length, params.do_sample, params.temperature, params.seed
+    )
+    return await generation_cache.get_or_generate(key, run)
@@ -0,0 +1,163 @@
+import asyncio
+import logging
+import time
+from datetime import datetime, timezone
+from typing import TYPE_CHECKING, Iterable, Optional
+
+from sqlalchemy import func
+from sqlalchemy.future import select
+
+from app.core.config import settings
+from app.core.redis import get_redis_client
+from app.db.session import read_sessionmaker
+from app.models.organization import Organization
+from app.models.user import User
+
+if TYPE_CHECKING:
+    from app.services.usage_ingest import UsageEvent
+
+logger = logging.getLogger(__name__)
+
+# Admin dashboard figures kept in Redis as they happen, so reading them
+# costs the same however large the tables get:
+#
+#   analytics:total:{organizations|users}   running totals (INCR on create)
+#   analytics:usage:m:{epoch minute}        requests per minute, kept 25h
+#   analytics:hll:{keys|orgs}:d:{day}       HyperLogLogs of active API keys
+#   analytics:hll:{keys|orgs}:mo:{month}    and orgs per UTC day / month
+#
+# Totals are seeded from a COUNT when missing and expire daily, which also
+# corrects any drift (e.g. a create that raced the seeding).
+
+_TOTAL_MODELS = {"organizations": Organization, "users": User}
+_TOTAL_TTL_SEC = 24 * 3600
+_MINUTE_TTL_SEC = 25 * 3600
+_DAY_HLL_TTL_SEC = 3 * 24 * 3600
+_MONTH_HLL_TTL_SEC = 62 * 24 * 3600
+
+# INCR only once the total has been seeded; a bare INCR on a missing key
+# would start it from zero.
+_INCR_IF_EXISTS_LUA = """
+if redis.call('EXISTS', KEYS[1]) == 1 then
+    return redis.call('INCR', KEYS[1])
+end
+return nil
+"""
+
+
+def _total_key(name: str) -> str:
+    return f"analytics:total:{name}"
+
+
+def _minute_key(minute: int) -> str:
+    return f"analytics:usage:m:{minute}"
+
+
+def _hll_key(kind: str, period: str) -> str:
+    return f"analytics:hll:{kind}:{period}"
+
+
+class AdminAnalytics:
+    """
+    Incrementally maintained admin analytics, read as a snapshot that each
+    worker caches for `snapshot_ttl` seconds.
+    """
+
+    def __init__(self, snapshot_ttl: float):
+        self.snapshot_ttl = snapshot_ttl
+        self._snapshot: Optional[dict] = None
+        self._snapshot_at = 0.0
+        self._lock = asyncio.Lock()
+        self._incr_script = None
+
+    async def increment_total(self, name: str) -> None:
+        """Call after committing a new organization or user."""
+        try:
+            client = await get_redis_client()
+            if self._incr_script is None:
+                self._incr_script = client.register_script(_INCR_IF_EXISTS_LUA)
+            await self._incr_script(keys=[_total_key(name)], client=client)
+        except Exception:
+            logger.warning("Could not update the %s total", name, exc_info=True)
+
+    def add_usage(self, pipe, events: Iterable["UsageEvent"]) -> None:
+        """Queue the analytics updates for `events` on a Redis pipeline."""
+        per_minute = {}
+        members = {}
+        for event in events:
+            timestamp = event.timestamp
+            minute = int(timestamp.timestamp()) // 60
+            per_minute[minute] = per_minute.get(minute, 0) + 1
+            for period, ttl in ((f"d:{timestamp:%Y-%m-%d}", _DAY_HLL_TTL_SEC), (f"mo:{timestamp:%Y-%m}", _MONTH_HLL_TTL_SEC)):
+                members.setdefault((_hll_key("keys", period), ttl), set()).add(str(event.api_key_id))
+                members.setdefault((_hll_key("orgs", period), ttl), set()).add(str(event.org_id))
+        for minute, count in per_minute.items():
+            pipe.incrby(_minute_key(minute), count)
+            pipe.expire(_minute_key(minute), _MINUTE_TTL_SEC)
+        for (key, ttl), values in members.items():
+            pipe.pfadd(key, *values)
+            pipe.expire(key, ttl)
+
+    async def record_usage(self, events: Iterable["UsageEvent"]) -> None:
+        """add_usage() in a pipeline of its own; failures are only logged."""
+        try:
+            client = await get_redis_client()
+            async with client.pipeline(transaction=False) as pipe:
+                self.add_usage(pipe, events)
+                await pipe.execute()
+        except Exception:
+            logger.warning("Could not record usage analytics", exc_info=True)
+
+    async def snapshot(self) -> dict:
+        snapshot = self._snapshot
+        if snapshot is not None and time.monotonic() - self._snapshot_at < self.snapshot_ttl:
+            return snapshot
+        async with self._lock:
+            if self._snapshot is not None and time.monotonic() - self._snapshot_at < self.snapshot_ttl:
+                return self._snapshot
+            self._snapshot = await self._compute()
+            self._snapshot_at = time.monotonic()
+            return self._snapshot
+
+    async def _compute(self) -> dict:
+        client = await get_redis_client()
+        now = datetime.now(timezone.utc)
+        current_minute = int(now.timestamp()) // 60
+        minutes = [_minute_key(m) for m in range(current_minute - 24 * 60 + 1, current_minute + 1)]
+        day, month = f"d:{now:%Y-%m-%d}", f"mo:{now:%Y-%m}"
+
+        async with client.pipeline(transaction=False) as pipe:
+            pipe.mget([_total_key(name) for name in _TOTAL_MODELS])
+            pipe.mget(minutes)
+            for kind in ("keys", "orgs"):
+                pipe.pfcount(_hll_key(kind, day))
+                pipe.pfcount(_hll_key(kind, month))
+            totals, buckets, keys_day, keys_month, orgs_day, orgs_month = await pipe.execute()
+
+        counts = [int(value) if value is not None else 0 for value in buckets]
+        result = {}
+        for name, value in zip(_TOTAL_MODELS, totals):
+            result[f"total_{name}"] = int(value) if value is not None else await self._seed_total(client, name)
+        result.update({
+            "usage_last_24h": sum(counts),
+            "usage_last_hour": sum(counts[-60:]),
+            # HyperLogLog estimates (about 0.8% standard error).
+            "active_api_keys_today": keys_day,
+            "active_api_keys_this_month": keys_month,
+            "active_orgs_today": orgs_day,
+            "active_orgs_this_month": orgs_month,
+            "generated_at": now.isoformat(),
+        })
+        return result
+
+    async def _seed_total(self, client, name: str) -> int:
+        model = _TOTAL_MODELS[name]
+        session_factory = await read_sessionmaker()
+        async with session_factory() as db:
+            count = await db.scalar(select(func.count()).select_from(model))
+        # NX: another worker may have seeded it meanwhile.
+        await client.set(_total_key(name), count, ex=_TOTAL_TTL_SEC, nx=True)
+        return int(count)
+
+
+admin_analytics = AdminAnalytics(snapshot_ttl=settings.ANALYTICS_SNAPSHOT_TTL_SEC)
@@ -0,0 +1,207 @@
+import asyncio
+import json
+import logging
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import asdict, dataclass
+from typing import Dict, Iterable, Optional, Tuple
+
+from sqlalchemy import func
+from sqlalchemy.future import select
+from sqlalchemy.orm import aliased
+
+from app.core.config import settings
+from app.core.redis import get_redis_client
+from app.crud.crud_api_key import hash_api_key
+from app.db.session import AsyncSessionLocal
+from app.models.billing import PricingPlan
+from app.models.organization import APIKey, Organization, RateLimitAlgorithm
+
+logger = logging.getLogger(__name__)
+
+# Stored in Redis for hashes that matched no API key.
+_NEGATIVE_MARKER = "null"
+
+
+@dataclass(frozen=True)
+class ResolvedAPIKey:
+    """The subset of an APIKey row needed on the request path."""
+    id: uuid.UUID
+    org_id: uuid.UUID
+    key_hash: str
+    is_active: bool
+    rate_limit_per_sec: int
+    rate_limit_algorithm: str
+    # From the org's pricing plan (the default plan when it has none);
+    # None means settings.AI_ORG_MAX_CONCURRENT.
+    max_concurrent_inferences: Optional[int] = None
+    inference_weight: float = 1.0
+
+    @classmethod
+    def from_model(cls, obj: APIKey, plan: Optional[PricingPlan] = None) -> "ResolvedAPIKey":
+        return cls(
+            id=obj.id,
+            org_id=obj.org_id,
+            key_hash=obj.key_hash,
+            is_active=bool(obj.is_active),
+            rate_limit_per_sec=obj.rate_limit_per_sec,
+            rate_limit_algorithm=RateLimitAlgorithm(obj.rate_limit_algorithm).value,
+            max_concurrent_inferences=plan.max_concurrent_inferences if plan is not None else None,
+            inference_weight=plan.inference_weight if plan is not None and plan.inference_weight else 1.0,
+        )
+
+    def to_json(self) -> str:
+        data = asdict(self)
+        data["id"] = str(self.id)
+        data["org_id"] = str(self.org_id)
+        return json.dumps(data)
+
+    @classmethod
+    def from_json(cls, raw: str) -> "ResolvedAPIKey":
+        data = json.loads(raw)
+        data["id"] = uuid.UUID(data["id"])
+        data["org_id"] = uuid.UUID(data["org_id"])
+        # Entries cached before the field existed.
+        data.setdefault("rate_limit_algorithm", RateLimitAlgorithm.SLIDING_WINDOW.value)
+        data.setdefault("max_concurrent_inferences", None)
+        data.setdefault("inference_weight", 1.0)
+        return cls(**data)
+
+
+class APIKeyResolver:
+    """
+    Resolves an X-API-KEY value to its key metadata.
+
+    Lookups go through an in-process LRU (with TTL) first, then Redis, then
+    Postgres. Unknown keys are cached too, with a shorter TTL, so random keys
+    can't be used to hammer the database. Concurrent misses for the same hash
+    share a single load instead of each querying Redis/Postgres.
+    """
+
+    def __init__(self, max_entries: int, ttl: float, negative_ttl: float, redis_ttl: int):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.redis_ttl = redis_ttl
+
+        # key_hash -> (expires_at, resolved or None)
+        self._cache: "OrderedDict[str, Tuple[float, Optional[ResolvedAPIKey]]]" = OrderedDict()
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+    async def resolve(self, api_key_value: str) -> Optional[ResolvedAPIKey]:
+        return await self.resolve_hash(hash_api_key(api_key_value))
+
+    async def resolve_hash(self, key_hash: str) -> Optional[ResolvedAPIKey]:
+        entry = self._cache.get(key_hash)
+        if entry is not None:
+            expires_at, resolved = entry
+            if expires_at > time.monotonic():
+                self._cache.move_to_end(key_hash)
+                return resolved
+            del self._cache[key_hash]
+
+        pending = self._inflight.get(key_hash)
+        if pending is not None:
+            # shield() so one waiter being cancelled doesn't cancel the load
+            # for everyone else.
+            return await asyncio.shield(pending)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key_hash] = future
+        try:
+            resolved = await self._load(key_hash)
+        except Exception as exc:
+            future.set_exception(exc)
+            # Mark the exception as retrieved when nobody else was waiting.
+            future.exception()
+            raise
+        else:
+            self._store(key_hash, resolved)
+            future.set_result(resolved)
+            return resolved
+        finally:
+            del self._inflight[key_hash]
+
+    async def invalidate(self, key_hash: str) -> None:
+        """Forget a key locally and in Redis, e.g. after it is revoked or edited."""
+        self._cache.pop(key_hash, None)
+        client = await get_redis_client()
+        await client.delete(self._redis_key(key_hash))
+
+    async def invalidate_many(self, key_hashes: Iterable[str]) -> None:
+        """
+        invalidate() for many keys, e.g. every key of an org whose plan (and
+        so inference limits) changed. Other workers' in-process entries
+        still live out their TTL.
+        """
+        key_hashes = list(key_hashes)
+        for key_hash in key_hashes:
+            self._cache.pop(key_hash, None)
+        try:
+            client = await get_redis_client()
+            for i in range(0, len(key_hashes), 1000):
+                await client.delete(*(self._redis_key(key_hash) for key_hash in key_hashes[i:i + 1000]))
+        except Exception:
+            logger.warning("Could not invalidate %d cached API keys", len(key_hashes), exc_info=True)
+
+    def _store(self, key_hash: str, resolved: Optional[ResolvedAPIKey]) -> None:
+        ttl = self.ttl if resolved is not None else self.negative_ttl
+        self._cache[key_hash] = (time.monotonic() + ttl, resolved)
+        self._cache.move_to_end(key_hash)
+        while len(self._cache) > self.max_entries:
+            self._cache.popitem(last=False)
+
+    def _redis_key(self, key_hash: str) -> str:
+        return f"apikey:v2:{key_hash}"
+
+    async def _load(self, key_hash: str) -> Optional[ResolvedAPIKey]:
+        client = await get_redis_client()
+        redis_key = self._redis_key(key_hash)
+
+        try:
+            cached = await client.get(redis_key)
+        except Exception:
+            logger.warning("Redis unavailable for API key lookup, using Postgres", exc_info=True)
+            cached = None
+        if cached is not None:
+            cached = cached.decode() if isinstance(cached, bytes) else cached
+            if cached == _NEGATIVE_MARKER:
+                return None
+            return ResolvedAPIKey.from_json(cached)
+
+        # The key with its org's plan, falling back to the default plan.
+        default_plan = aliased(PricingPlan)
+        default_plan_id = (
+            select(default_plan.id)
+            .filter(default_plan.is_default.is_(True))
+            .order_by(default_plan.id)
+            .limit(1)
+            .scalar_subquery()
+        )
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                select(APIKey, PricingPlan)
+                .outerjoin(Organization, Organization.id == APIKey.org_id)
+                .outerjoin(PricingPlan, PricingPlan.id == func.coalesce(Organization.plan_id, default_plan_id))
+                .filter(APIKey.key_hash == key_hash)
+            )
+            row = result.first()
+
+        resolved = ResolvedAPIKey.from_model(row[0], row[1]) if row else None
+        try:
+            if resolved is not None:
+                await client.setex(redis_key, self.redis_ttl, resolved.to_json())
+            else:
+                await client.setex(redis_key, max(1, int(self.negative_ttl)), _NEGATIVE_MARKER)
+        except Exception:
+            logger.warning("Failed to cache API key metadata in Redis", exc_info=True)
+        return resolved
+
+
+api_key_resolver = APIKeyResolver(
+    max_entries=settings.API_KEY_CACHE_MAX_ENTRIES,
+    ttl=settings.API_KEY_CACHE_TTL_SEC,
+    negative_ttl=settings.API_KEY_NEGATIVE_CACHE_TTL_SEC,
+    redis_ttl=settings.API_KEY_REDIS_TTL_SEC,
+)
@@ -0,0 +1,192 @@
+import asyncio
+import logging
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+from jose import jwt
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from app.core.config import settings
+from app.core.redis import get_redis_client
+from app.models.organization import OrganizationMember
+from app.models.user import User
+
+logger = logging.getLogger(__name__)
+
+# Subjects (emails) whose cached principal must be dropped, from any worker.
+_INVALIDATION_CHANNEL = "auth:user-invalidations"
+
+
+@dataclass(frozen=True)
+class OrgContext:
+    """The organization a request acts on, and the caller's role in it."""
+    org_id: uuid.UUID
+    role: str
+
+
+@dataclass(frozen=True)
+class UserPrincipal:
+    """The subset of a User row needed to authorize a request, with its organization."""
+    id: uuid.UUID
+    email: str
+    full_name: Optional[str]
+    is_active: bool
+    is_superuser: bool
+    org: Optional[OrgContext] = None
+
+    @classmethod
+    def from_model(cls, obj: User, org: Optional[OrgContext] = None) -> "UserPrincipal":
+        return cls(
+            id=obj.id,
+            email=obj.email,
+            full_name=obj.full_name,
+            is_active=bool(obj.is_active),
+            is_superuser=bool(obj.is_superuser),
+            org=org,
+        )
+
+
+class TokenVerifier:
+    """
+    Decodes access tokens, remembering each verified token's subject until
+    the token expires so its signature is checked once, not on every
+    request. Failed verifications aren't remembered.
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        # token -> (exp as unix time, subject)
+        self._verified: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+
+    def subject(self, token: str) -> Optional[str]:
+        """The token's `sub` claim; raises JWTError for invalid or expired tokens."""
+        entry = self._verified.get(token)
+        if entry is not None:
+            expires_at, subject = entry
+            if expires_at > time.time():
+                self._verified.move_to_end(token)
+                return subject
+            del self._verified[token]
+
+        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+        subject = payload.get("sub")
+        expires_at = payload.get("exp")
+        if subject is not None and isinstance(expires_at, (int, float)):
+            self._verified[token] = (float(expires_at), subject)
+            while len(self._verified) > self.max_entries:
+                self._verified.popitem(last=False)
+        return subject
+
+
+class UserPrincipalCache:
+    """
+    UserPrincipals by token subject, in a per-worker LRU with a short TTL.
+    The user's organization membership is loaded in the same query, so
+    org-scoped endpoints need no lookup of their own.
+
+    invalidate() drops a subject here and, through Redis pub/sub, in every
+    other worker listening (start()). The TTL bounds staleness should an
+    invalidation message be missed; the local cache is also cleared whenever
+    the subscription is (re)established.
+    """
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        # subject -> (expires_at, principal)
+        self._cache: "OrderedDict[str, Tuple[float, UserPrincipal]]" = OrderedDict()
+        # Bumped on every invalidation so loads racing one aren't stored.
+        self._generation = 0
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._listen())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def get(self, db: AsyncSession, subject: str) -> Optional[UserPrincipal]:
+        entry = self._cache.get(subject)
+        if entry is not None:
+            expires_at, principal = entry
+            if expires_at > time.monotonic():
+                self._cache.move_to_end(subject)
+                return principal
+            del self._cache[subject]
+
+        generation = self._generation
+        # Users are assumed to act in a single organization; with several
+        # memberships the lowest org id wins.
+        result = await db.execute(
+            select(User, OrganizationMember.org_id, OrganizationMember.role)
+            .outerjoin(OrganizationMember, OrganizationMember.user_id == User.id)
+            .filter(User.email == subject)
+            .order_by(OrganizationMember.org_id)
+            .limit(1)
+        )
+        row = result.first()
+        if row is None:
+            return None
+        user, org_id, role = row
+        org = OrgContext(org_id=org_id, role=role) if org_id is not None else None
+        principal = UserPrincipal.from_model(user, org)
+        if generation == self._generation:
+            self._cache[subject] = (time.monotonic() + self.ttl, principal)
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+        return principal
+
+    async def invalidate(self, *subjects: str) -> None:
+        """Call after committing a change to these users or their memberships."""
+        self._forget(subjects)
+        try:
+            client = await get_redis_client()
+            for subject in subjects:
+                await client.publish(_INVALIDATION_CHANNEL, subject)
+        except Exception:
+            logger.warning("Could not publish user cache invalidation", exc_info=True)
+
+    def _forget(self, subjects) -> None:
+        self._generation += 1
+        for subject in subjects:
+            self._cache.pop(subject, None)
+
+    async def _listen(self) -> None:
+        while True:
+            pubsub = None
+            try:
+                client = await get_redis_client()
+                pubsub = client.pubsub(ignore_subscribe_messages=True)
+                await pubsub.subscribe(_INVALIDATION_CHANNEL)
+                # Anything published while unsubscribed was missed.
+                self._generation += 1
+                self._cache.clear()
+                async for message in pubsub.listen():
+                    data = message["data"]
+                    self._forget([data.decode() if isinstance(data, bytes) else data])
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.warning("User cache invalidation listener failed, resubscribing", exc_info=True)
+                await asyncio.sleep(1.0)
+            finally:
+                if pubsub is not None:
+                    await pubsub.aclose()
+
+
+token_verifier = TokenVerifier(max_entries=settings.AUTH_TOKEN_CACHE_MAX_ENTRIES)
+user_principal_cache = UserPrincipalCache(
+    max_entries=settings.AUTH_USER_CACHE_MAX_ENTRIES,
+    ttl=settings.AUTH_USER_CACHE_TTL_SEC,
+)
@@ -1,14 +1,87 @@
-from datetime import date, datetime, timedelta
-from typing import List, Optional
+import asyncio
+import logging
+import uuid
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from sqlalchemy import func
-from app.models.billing import Invoice, InvoiceItem, PricingPlan, PricingRule, InvoiceStatus
-from app.models.usage import UsageLog
+from sqlalchemy import delete, text, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from app.core.config import settings
+from app.db.session import AsyncSessionLocal, engine
+from app.models.billing import Invoice, InvoiceItem, InvoiceStatus, BillingRun, BillingRunStatus
+from app.services import usage_service
+from app.services.pricing import RatedUsage, pricing_engine
+from app.services.response_cache import response_cache
 from app.models.organization import Organization
 
+logger = logging.getLogger(__name__)
+
+# Shares the advisory lock namespace with usage_partitions (727001).
+_BILLING_LOCK_ID = 727_002
+
+async def write_invoices(
+    db: AsyncSession, start_date: date, end_date: date, rated: Dict[uuid.UUID, RatedUsage]
+) -> Dict[uuid.UUID, uuid.UUID]:
+    """
+    Upsert one invoice per org for the period and replace its items.
+
+    Paid invoices are left untouched. Returns {org_id: invoice_id} for the
+    invoices that were written. Does not commit.
+    """
+    if not rated:
+        return {}
+
+    rows = [
+        {
+            "id": uuid.uuid4(),
+            "org_id": org_id,
+            "start_date": start_date,
+            "end_date": end_date,
+            "total_amount": total_amount,
+            "status": InvoiceStatus.DRAFT.value,
+            "due_date": end_date + timedelta(days=7),
+        }
+        for org_id, (total_amount, _) in rated.items()
+    ]
+    written: Dict[uuid.UUID, uuid.UUID] = {}
+    # Chunked to stay under the bind-parameter limit per statement.
+    for i in range(0, len(rows), 1000):
+        stmt = pg_insert(Invoice).values(rows[i:i + 1000])
+        stmt = stmt.on_conflict_do_update(
+            constraint="uq_invoices_org_period",
+            set_={"total_amount": stmt.excluded.total_amount, "due_date": stmt.excluded.due_date},
+            where=Invoice.status != InvoiceStatus.PAID.value,
+        ).returning(Invoice.org_id, Invoice.id)
+        written.update((await db.execute(stmt)).all())
+
+    if not written:
+        return written
+
+    invoice_ids = list(written.values())
+    for i in range(0, len(invoice_ids), 1000):
+        await db.execute(delete(InvoiceItem).where(InvoiceItem.invoice_id.in_(invoice_ids[i:i + 1000])))
+
+    items = [
+        {"id": uuid.uuid4(), "invoice_id": written[org_id], **item}
+        for org_id, (_, org_items) in rated.items()
+        if org_id in written
+        for item in org_items
+    ]
+    for i in range(0, len(items), 1000):
+        await db.execute(pg_insert(InvoiceItem).values(items[i:i + 1000]))
+    return written
+
 async def generate_invoice_for_org(db: AsyncSession, org_id: str, start_date: date, end_date: date) -> Invoice:
-    # Check if invoice already exists
+    org_id = uuid.UUID(str(org_id))
+    usage_data = await usage_service.usage_by_endpoint(db, org_id, start_date, end_date) # list of (endpoint, count)
+    plan_id = await db.scalar(select(Organization.plan_id).filter(Organization.id == org_id))
+    rate_table = await pricing_engine.get_rate_table(db)
+
+    await write_invoices(db, start_date, end_date, {org_id: rate_table.rate(plan_id, usage_data)})
+    await db.commit()
+    await response_cache.invalidate_orgs([org_id])
+
     result = await db.execute(
         select(Invoice).filter(
             Invoice.org_id == org_id,
@@ -16,99 +89,132 @@ async def generate_invoice_for_org(db: AsyncSession, org_id: str, start_date: da
             Invoice.end_date == end_date
         )
     )
-    existing_invoice = result.scalars().first()
-    if existing_invoice and existing_invoice.status == InvoiceStatus.PAID:
-        return existing_invoice
-
-    # Fetch Usage
-    # Group by endpoint or we need a way to map endpoints to resources.
-    # For simplicity, let's assume PricingRules map "endpoint" (resource_name) to cost.
-    
-    # Get Organization's Plan (Assuming org has plan_id, but current model links via PricingPlan? 
-    # Wait, Organization model has `plan_id`? Let's check model.)
-    # I didn't add `plan_id` to Organization in Step 2 schema implementation (I missed it or it wasn't there in my code).
-    # Let's check `app/models/organization.py`.
-    
-    # If it's missing, I'll default to a "Free" plan or add it.
-    # For now, let's just fetch ALL pricing rules and apply matching ones.
-    # Ideally, we should fetch the plan associated with the org.
-    
-    # Let's fetch usage aggregated by endpoint
-    usage_query = select(
-        UsageLog.endpoint,
-        func.count(UsageLog.id).label("count")
-    ).filter(
-        UsageLog.org_id == org_id,
-        func.date(UsageLog.timestamp) >= start_date,
-        func.date(UsageLog.timestamp) <= end_date
-    ).group_by(UsageLog.endpoint)
-    
-    usage_result = await db.execute(usage_query)
-    usage_data = usage_result.all() # list of (endpoint, count)
-    
-    total_amount = 0.0
-    invoice_items = []
-    
-    # Fetch Pricing Rules (assuming 1 global plan for now if org logic is missing)
-    # Or just hardcode some rules for demo if Schema is hard to change now.
-    # But I should verify Schema.
-    
-    # Let's assume we have a default plan.
-    plan_result = await db.execute(select(PricingPlan))
-    default_plan = plan_result.scalars().first()
-    
-    rules_map = {}
-    if default_plan:
-        rule_result = await db.execute(select(PricingRule).filter(PricingRule.plan_id == default_plan.id))
-        rules = rule_result.scalars().all()
-        for r in rules:
-            rules_map[r.resource_name] = r
-
-    for endpoint, count in usage_data:
-        # Match endpoint to resource_name (exact match for now)
-        rule = rules_map.get(endpoint)
-        cost = 0.0
-        if rule:
-            # Apply free tier
-            billable_units = max(0, count - rule.free_tier_limit)
-            cost = billable_units * rule.unit_price
-            
-            item = InvoiceItem(
-                description=f"Usage for {endpoint}",
-                units=count,
-                unit_price=rule.unit_price,
-                amount=cost
-            )
-            invoice_items.append(item)
-            total_amount += cost
-        else:
-             # Unknown resource, maybe log it or charge default?
-             # Let's skip for now or add as 0 cost.
-             pass
-             
-    # Create Invoice
-    if existing_invoice:
-        # Update existing draft
-        invoice = existing_invoice
-        invoice.total_amount = total_amount
-        # Remove old items? Or updating is complex. 
-        # Easier to delete old items and re-add.
-        # For MVP, let's just update total. logic for items needs specific handling.
-    else:
-        invoice = Invoice(
-            org_id=org_id,
-            start_date=start_date,
-            end_date=end_date,
-            total_amount=total_amount,
-            status=InvoiceStatus.DRAFT,
-            due_date=end_date + timedelta(days=7)
+    return result.scalars().first()
+
+async def get_billing_run(db: AsyncSession, start_date: date, end_date: date) -> Optional[BillingRun]:
+    result = await db.execute(
+        select(BillingRun).filter(BillingRun.start_date == start_date, BillingRun.end_date == end_date)
+    )
+    return result.scalars().first()
+
+async def run_billing_cycle(
+    start_date: date,
+    end_date: date,
+    force: bool = False,
+    chunk_size: int = settings.BILLING_CYCLE_CHUNK_SIZE,
+    concurrency: int = settings.BILLING_CYCLE_CONCURRENCY,
+) -> Optional[BillingRun]:
+    """
+    Invoice every organization for start_date..end_date.
+
+    Usage for all orgs is aggregated once and rated in one vectorized pass
+    against the cached pricing RateTable.
+    Organizations are then invoiced in id order, `chunk_size` per
+    transaction with up to `concurrency` chunks in flight. The billing_runs
+    row records the last org of the contiguous prefix of finished chunks, so
+    a run that died part-way resumes after it when called again; chunks past
+    the checkpoint that did finish are simply rewritten, which the invoice
+    upsert makes harmless.
+
+    A completed run is returned as is unless `force` is set. Returns None if
+    another worker is running this period.
+    """
+    lock_args = {"id": _BILLING_LOCK_ID, "period": f"{start_date}:{end_date}"}
+    # Session-level advisory lock, held on a dedicated autocommit connection
+    # for the whole run.
+    async with engine.connect() as conn:
+        conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+        locked = await conn.scalar(text("SELECT pg_try_advisory_lock(:id, hashtext(:period))"), lock_args)
+        if not locked:
+            logger.info("Billing cycle %s..%s is already running elsewhere", start_date, end_date)
+            return None
+        try:
+            return await _run_billing_cycle(start_date, end_date, force, chunk_size, concurrency)
+        finally:
+            await conn.execute(text("SELECT pg_advisory_unlock(:id, hashtext(:period))"), lock_args)
+
+async def _run_billing_cycle(
+    start_date: date, end_date: date, force: bool, chunk_size: int, concurrency: int
+) -> BillingRun:
+    async with AsyncSessionLocal() as db:
+        await db.execute(
+            pg_insert(BillingRun)
+            .values(id=uuid.uuid4(), start_date=start_date, end_date=end_date,
+                    status=BillingRunStatus.RUNNING.value, invoice_count=0)
+            .on_conflict_do_nothing(constraint="uq_billing_runs_period")
         )
-        db.add(invoice)
-        await db.flush() # get ID
-        
-        for item in invoice_items:
-            item.invoice_id = invoice.id
-            db.add(item)
-            
-    await db.commit()
-    return invoice
+        run = await get_billing_run(db, start_date, end_date)
+        if run.status == BillingRunStatus.COMPLETED and not force:
+            await db.commit()
+            return run
+        if run.status == BillingRunStatus.COMPLETED:
+            run.last_org_id = None
+            run.invoice_count = 0
+        run.status = BillingRunStatus.RUNNING.value
+        run.error = None
+        run.finished_at = None
+        await db.commit()
+        run_id, checkpoint = run.id, run.last_org_id
+
+        usage = await usage_service.usage_by_org_and_endpoint(db, start_date, end_date)
+        rate_table = await pricing_engine.get_rate_table(db)
+
+        org_query = select(Organization.id, Organization.plan_id).order_by(Organization.id)
+        if checkpoint is not None:
+            org_query = org_query.filter(Organization.id > checkpoint)
+        orgs = (await db.execute(org_query)).all()
+
+    # One vectorized rating pass for every org.
+    rated_all = rate_table.rate_orgs({org_id: (plan_id, usage.get(org_id, [])) for org_id, plan_id in orgs})
+
+    chunks = [orgs[i:i + chunk_size] for i in range(0, len(orgs), chunk_size)]
+    semaphore = asyncio.Semaphore(concurrency)
+    checkpoint_lock = asyncio.Lock()
+    finished: Dict[int, int] = {}
+    next_chunk = 0
+
+    async def bill_chunk(index: int, chunk: List[Tuple[uuid.UUID, Optional[uuid.UUID]]]) -> None:
+        nonlocal next_chunk
+        async with semaphore:
+            rated = {org_id: rated_all[org_id] for org_id, _ in chunk}
+            async with AsyncSessionLocal() as db:
+                written = await write_invoices(db, start_date, end_date, rated)
+                await db.commit()
+            await response_cache.invalidate_orgs(written)
+
+        async with checkpoint_lock:
+            finished[index] = len(written)
+            previous, advanced = next_chunk, 0
+            while next_chunk in finished:
+                advanced += finished.pop(next_chunk)
+                next_chunk += 1
+            if next_chunk > previous:
+                async with AsyncSessionLocal() as db:
+                    await db.execute(
+                        update(BillingRun).where(BillingRun.id == run_id).values(
+                            last_org_id=chunks[next_chunk - 1][-1][0],
+                            invoice_count=BillingRun.invoice_count + advanced,
+                        )
+                    )
+                    await db.commit()
+
+    results = await asyncio.gather(
+        *(bill_chunk(index, chunk) for index, chunk in enumerate(chunks)), return_exceptions=True
+    )
+    errors = [result for result in results if isinstance(result, Exception)]
+
+    async with AsyncSessionLocal() as db:
+        run = await db.get(BillingRun, run_id)
+        run.finished_at = datetime.now(timezone.utc)
+        if errors:
+            run.status = BillingRunStatus.FAILED.value
+            run.error = repr(errors[0])
+        else:
+            run.status = BillingRunStatus.COMPLETED.value
+        await db.commit()
+
+    if errors:
+        logger.error("Billing cycle %s..%s failed in %d chunk(s)", start_date, end_date, len(errors))
+        raise errors[0]
+    logger.info("Billing cycle %s..%s invoiced %d organizations", start_date, end_date, len(orgs))
+    return run
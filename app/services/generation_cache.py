@@ -0,0 +1,150 @@
+import asyncio
+import hashlib
+import json
+import logging
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Optional
+
+from app.core.config import settings
+from app.core.redis import get_redis_client
+
+logger = logging.getLogger(__name__)
+
+
+def cache_key(
+    model: str, backend: str, prompt: str, max_length: int, do_sample: bool, temperature: float, seed: Optional[int]
+) -> str:
+    raw = json.dumps(
+        {
+            "model": model,
+            # fp32 and int8 weights decode differently, even greedily.
+            "backend": backend,
+            "prompt": prompt,
+            "max_length": max_length,
+            "do_sample": do_sample,
+            # Greedy decoding ignores temperature, so it must not split the key.
+            "temperature": temperature if do_sample else None,
+            "seed": seed,
+        },
+        sort_keys=True,
+    )
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+class GenerationCache:
+    """
+    Results of deterministic generations (greedy, or sampled from a fixed
+    seed), keyed by cache_key().
+
+    An in-process LRU bounded by the UTF-8 size of the cached texts sits in
+    front of an optional Redis tier shared by all workers (`redis_ttl` > 0).
+    Concurrent misses for the same key share one generation.
+    """
+
+    def __init__(self, max_bytes: int, max_entry_bytes: int, redis_ttl: int):
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_entry_bytes
+        self.redis_ttl = redis_ttl
+
+        self._entries: "OrderedDict[str, str]" = OrderedDict()
+        self._bytes = 0
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._stats = {"memory_hits": 0, "redis_hits": 0, "misses": 0, "coalesced": 0, "evictions": 0, "too_large": 0}
+
+    async def get_or_generate(self, key: str, generate: Callable[[], Awaitable[str]]) -> str:
+        text = self._entries.get(key)
+        if text is not None:
+            self._entries.move_to_end(key)
+            self._stats["memory_hits"] += 1
+            return text
+
+        pending = self._inflight.get(key)
+        if pending is None:
+            # A task of its own, so the caller that started it going away
+            # (client disconnect) doesn't cancel it for everyone else.
+            pending = asyncio.ensure_future(self._load(key, generate))
+            self._inflight[key] = pending
+            pending.add_done_callback(lambda task: self._finished(key, task))
+        else:
+            self._stats["coalesced"] += 1
+        return await asyncio.shield(pending)
+
+    def _finished(self, key: str, task: asyncio.Future) -> None:
+        del self._inflight[key]
+        if not task.cancelled():
+            # Mark the exception as retrieved when nobody was left waiting.
+            task.exception()
+
+    async def _load(self, key: str, generate: Callable[[], Awaitable[str]]) -> str:
+        text = await self._redis_get(key)
+        if text is not None:
+            self._stats["redis_hits"] += 1
+        else:
+            self._stats["misses"] += 1
+            text = await generate()
+            await self._redis_set(key, text)
+        self._store(key, text)
+        return text
+
+    def stats(self) -> dict:
+        lookups = self._stats["memory_hits"] + self._stats["redis_hits"] + self._stats["misses"]
+        hits = lookups - self._stats["misses"]
+        return {
+            **self._stats,
+            "hit_rate": hits / lookups if lookups else 0.0,
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "redis_enabled": self.redis_ttl > 0,
+        }
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._bytes = 0
+
+    def _store(self, key: str, text: str) -> None:
+        size = len(text.encode())
+        if size > self.max_entry_bytes:
+            self._stats["too_large"] += 1
+            return
+        previous = self._entries.pop(key, None)
+        if previous is not None:
+            self._bytes -= len(previous.encode())
+        self._entries[key] = text
+        self._bytes += size
+        while self._bytes > self.max_bytes and self._entries:
+            _, evicted = self._entries.popitem(last=False)
+            self._bytes -= len(evicted.encode())
+            self._stats["evictions"] += 1
+
+    def _redis_key(self, key: str) -> str:
+        return f"gencache:{key}"
+
+    async def _redis_get(self, key: str) -> Optional[str]:
+        if self.redis_ttl <= 0:
+            return None
+        try:
+            client = await get_redis_client()
+            cached = await client.get(self._redis_key(key))
+        except Exception:
+            logger.warning("Redis unavailable for generation cache lookup", exc_info=True)
+            return None
+        if cached is None:
+            return None
+        return cached.decode() if isinstance(cached, bytes) else cached
+
+    async def _redis_set(self, key: str, text: str) -> None:
+        if self.redis_ttl <= 0 or len(text.encode()) > self.max_entry_bytes:
+            return
+        try:
+            client = await get_redis_client()
+            await client.setex(self._redis_key(key), self.redis_ttl, text)
+        except Exception:
+            logger.warning("Failed to store generation result in Redis", exc_info=True)
+
+
+generation_cache = GenerationCache(
+    max_bytes=settings.AI_CACHE_MAX_BYTES,
+    max_entry_bytes=settings.AI_CACHE_MAX_ENTRY_BYTES,
+    redis_ttl=settings.AI_CACHE_REDIS_TTL_SEC,
+)
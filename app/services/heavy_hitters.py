@@ -0,0 +1,224 @@
+import asyncio
+import heapq
+import logging
+import time
+import uuid
+from collections import deque
+from typing import Deque, Dict, Hashable, List, Optional, Tuple
+
+from app.core.config import settings
+from app.core.redis import get_redis_client
+
+logger = logging.getLogger(__name__)
+
+DIMENSIONS = ("orgs", "keys", "endpoints")
+
+# Cluster-wide counts: one sorted set per dimension and minute,
+# hh:{dimension}:{epoch minute}, fed by every worker's flushes.
+_BUCKET_SEC = 60
+
+
+def _redis_key(dimension: str, minute: int) -> str:
+    return f"hh:{dimension}:{minute}"
+
+
+class SpaceSaving:
+    """
+    Space-Saving top-k summary over a stream of items, in O(capacity) memory.
+
+    Each tracked item has a count that over-estimates its true frequency by
+    at most its `error`. When an untracked item arrives and the summary is
+    full, it takes over the slot of the item with the smallest count,
+    inheriting that count as its error. Every item whose true count exceeds
+    total / capacity is guaranteed to be tracked.
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.total = 0
+        # item -> [count, error]
+        self._counters: Dict[Hashable, List[int]] = {}
+        # (count when pushed, item), one entry per tracked item. Counts only
+        # grow, so a stale entry is refreshed when it reaches the top.
+        self._heap: List[Tuple[int, Hashable]] = []
+
+    def add(self, item: Hashable, count: int = 1) -> None:
+        self.total += count
+        counter = self._counters.get(item)
+        if counter is not None:
+            counter[0] += count
+            return
+        if len(self._counters) < self.capacity:
+            self._counters[item] = [count, 0]
+            heapq.heappush(self._heap, (count, item))
+            return
+        while True:
+            recorded, victim = self._heap[0]
+            current = self._counters[victim][0]
+            if recorded == current:
+                break
+            heapq.heapreplace(self._heap, (current, victim))
+        del self._counters[victim]
+        self._counters[item] = [current + count, current]
+        heapq.heapreplace(self._heap, (current + count, item))
+
+    def items(self) -> Dict[Hashable, Tuple[int, int]]:
+        """{item: (count, error)}"""
+        return {item: (count, error) for item, (count, error) in self._counters.items()}
+
+    def __len__(self) -> int:
+        return len(self._counters)
+
+
+def merge_top(summaries: List[SpaceSaving], limit: int) -> List[Tuple[Hashable, int, int]]:
+    """Top `limit` (item, count, error) across summaries, adding counts and errors."""
+    merged: Dict[Hashable, List[int]] = {}
+    for summary in summaries:
+        for item, (count, error) in summary.items().items():
+            entry = merged.setdefault(item, [0, 0])
+            entry[0] += count
+            entry[1] += error
+    top = heapq.nlargest(limit, merged.items(), key=lambda entry: entry[1][0])
+    return [(item, count, error) for item, (count, error) in top]
+
+
+class _Bucket:
+    def __init__(self, minute: int, capacity: int):
+        self.minute = minute
+        self.summaries = {dimension: SpaceSaving(capacity) for dimension in DIMENSIONS}
+
+
+class HeavyHitterTracker:
+    """
+    Hottest orgs, API keys and endpoints over sliding windows.
+
+    Every tracked request updates a Space-Saving summary per dimension in the
+    current one-minute bucket of an in-process ring covering `window_minutes`;
+    windows are answered by merging the buckets they span. Memory is bounded
+    by capacity x dimensions x buckets, however many tenants there are.
+
+    A flusher task adds each worker's counts since its last flush (their own
+    Space-Saving summaries) to per-minute Redis sorted sets, trimmed to
+    `redis_capacity` members, so top() can also answer for all workers.
+    """
+
+    def __init__(self, capacity: int, window_minutes: int, flush_interval: float, redis_capacity: int):
+        self.capacity = capacity
+        self.window_minutes = window_minutes
+        self.flush_interval = flush_interval
+        self.redis_capacity = redis_capacity
+        self._ring: Deque[_Bucket] = deque()
+        # Counts not yet flushed to Redis, per minute.
+        self._pending: Dict[int, _Bucket] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+            await self.flush()
+
+    def record(self, org_id: uuid.UUID, api_key_id: uuid.UUID, endpoint: str) -> None:
+        """Count one request; no I/O, called from the request path."""
+        minute = int(time.time()) // _BUCKET_SEC
+        values = {"orgs": str(org_id), "keys": str(api_key_id), "endpoints": endpoint}
+        bucket = self._current_bucket(minute)
+        pending = self._pending.get(minute)
+        if pending is None:
+            pending = self._pending[minute] = _Bucket(minute, self.capacity)
+        for dimension, value in values.items():
+            bucket.summaries[dimension].add(value)
+            pending.summaries[dimension].add(value)
+
+    def top_local(self, dimension: str, window_minutes: int, limit: int) -> List[dict]:
+        """This worker's top items: count over-estimates the true count by at most error."""
+        oldest = int(time.time()) // _BUCKET_SEC - window_minutes + 1
+        summaries = [bucket.summaries[dimension] for bucket in self._ring if bucket.minute >= oldest]
+        return [
+            {"item": item, "count": count, "error": error}
+            for item, count, error in merge_top(summaries, limit)
+        ]
+
+    async def top(self, dimension: str, window_minutes: int, limit: int) -> List[dict]:
+        """Top items across all workers, from Redis (as of each worker's last flush)."""
+        now = int(time.time()) // _BUCKET_SEC
+        keys = [_redis_key(dimension, minute) for minute in range(now - window_minutes + 1, now + 1)]
+        scratch = f"hh:merge:{uuid.uuid4().hex}"
+        client = await get_redis_client()
+        async with client.pipeline(transaction=False) as pipe:
+            pipe.zunionstore(scratch, keys)
+            pipe.zrevrange(scratch, 0, limit - 1, withscores=True)
+            pipe.delete(scratch)
+            _, top, _ = await pipe.execute()
+        return [
+            {"item": item.decode() if isinstance(item, bytes) else item, "count": int(score)}
+            for item, score in top
+        ]
+
+    async def flush(self) -> None:
+        pending, self._pending = self._pending, {}
+        if not pending:
+            return
+        ttl = (self.window_minutes + 2) * _BUCKET_SEC
+        try:
+            client = await get_redis_client()
+            async with client.pipeline(transaction=False) as pipe:
+                for minute, bucket in pending.items():
+                    for dimension, summary in bucket.summaries.items():
+                        if not len(summary):
+                            continue
+                        key = _redis_key(dimension, minute)
+                        for item, (count, _) in summary.items().items():
+                            pipe.zincrby(key, count, item)
+                        # Keep only the largest members.
+                        pipe.zremrangebyrank(key, 0, -self.redis_capacity - 1)
+                        pipe.expire(key, ttl)
+                await pipe.execute()
+        except Exception:
+            logger.warning("Could not flush heavy hitter counts to Redis", exc_info=True)
+            self._restore(pending)
+
+    def _restore(self, pending: Dict[int, _Bucket]) -> None:
+        """Put counts that failed to flush back for the next flush, unless they're out of the window."""
+        oldest = int(time.time()) // _BUCKET_SEC - self.window_minutes + 1
+        for minute, bucket in pending.items():
+            if minute < oldest:
+                continue
+            current = self._pending.get(minute)
+            if current is None:
+                self._pending[minute] = bucket
+                continue
+            # Counted again while the flush was running.
+            for dimension, summary in bucket.summaries.items():
+                for item, (count, _) in summary.items().items():
+                    current.summaries[dimension].add(item, count)
+
+    def _current_bucket(self, minute: int) -> _Bucket:
+        if self._ring and self._ring[-1].minute == minute:
+            return self._ring[-1]
+        bucket = _Bucket(minute, self.capacity)
+        self._ring.append(bucket)
+        while self._ring[0].minute <= minute - self.window_minutes:
+            self._ring.popleft()
+        return bucket
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+
+heavy_hitters = HeavyHitterTracker(
+    capacity=settings.HEAVY_HITTERS_CAPACITY,
+    window_minutes=settings.HEAVY_HITTERS_WINDOW_MINUTES,
+    flush_interval=settings.HEAVY_HITTERS_FLUSH_INTERVAL_SEC,
+    redis_capacity=settings.HEAVY_HITTERS_REDIS_CAPACITY,
+)
@@ -0,0 +1,227 @@
+import asyncio
+import contextlib
+import heapq
+import itertools
+import math
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Deque, Dict, Hashable, List, Optional, Tuple
+
+from app.core.config import settings
+
+# Weight given to each new service time sample in the moving average.
+_EWMA_ALPHA = 0.2
+
+
+@dataclass(frozen=True)
+class InferenceTenant:
+    """Who an inference request is charged to, and that org's share of the model."""
+    key: Hashable  # org id; None for requests without an API key
+    max_concurrent: int
+    weight: float = 1.0
+
+
+class InferenceRejected(Exception):
+    """Admission refused; `status_code` is 429 (the org's own backlog) or 503 (overall overload)."""
+
+    def __init__(self, status_code: int, detail: str, retry_after: float):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+        self.retry_after = retry_after
+
+    def headers(self) -> Dict[str, str]:
+        return {"Retry-After": str(max(1, math.ceil(self.retry_after)))}
+
+
+@dataclass
+class _Waiter:
+    tag: float
+    cost: float
+    future: asyncio.Future
+
+
+@dataclass
+class _OrgQueue:
+    tenant: InferenceTenant
+    waiters: Deque[_Waiter] = field(default_factory=deque)
+    in_flight: int = 0
+    # Virtual finish tag of this org's last queued request.
+    last_tag: float = 0.0
+    scheduled: bool = False
+
+
+class InferenceScheduler:
+    """
+    Admission control in front of text generation.
+
+    At most `capacity` generations are admitted at once (enough to keep
+    every batch of the generation batcher full), and at most
+    `tenant.max_concurrent` of them per org. Requests beyond that wait in a
+    queue per org, and free slots go to the org whose head request has the
+    smallest virtual finish tag (weighted fair queueing: a request's tag is
+    its cost, the requested max_length, divided by the org's weight, added
+    on top of the org's previous tag or the current virtual time, whichever
+    is later). An org flooding the service only lengthens its own queue.
+
+    Requests whose expected wait exceeds `deadline_ms` are rejected up
+    front instead of queueing: 429 when the org's own concurrency cap is
+    the limit, 503 when its fair share of a busy service is. Anything still
+    queued at the deadline is rejected with 503 too. Expected waits come
+    from the org's backlog and a moving average of how long admitted
+    requests hold their slot.
+    """
+
+    def __init__(self, capacity: int, deadline_ms: float):
+        self.capacity = capacity
+        self.deadline = deadline_ms / 1000
+        self._orgs: Dict[Hashable, _OrgQueue] = {}
+        # (head tag, sequence, org key) for orgs with waiters and a free slot.
+        self._ready: List[Tuple[float, int, Hashable]] = []
+        self._sequence = itertools.count()
+        self._virtual_time = 0.0
+        self._in_flight = 0
+        self._waiting = 0
+        self._service_time: Optional[float] = None
+        self._stats = {"admitted": 0, "queued": 0, "rejected_org": 0, "rejected_overload": 0, "timed_out": 0}
+
+    @contextlib.asynccontextmanager
+    async def slot(self, tenant: InferenceTenant, cost: float = 1.0) -> AsyncIterator[None]:
+        """Hold one inference slot for `tenant` for the duration of the block."""
+        await self._acquire(tenant, cost)
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self._record(time.monotonic() - started)
+            self._release(tenant.key)
+
+    def stats(self) -> dict:
+        return {
+            **self._stats,
+            "capacity": self.capacity,
+            "in_flight": self._in_flight,
+            "waiting": self._waiting,
+            "orgs_waiting": sum(1 for org in self._orgs.values() if org.waiters),
+            "avg_service_ms": self._service_time * 1000 if self._service_time is not None else None,
+        }
+
+    async def _acquire(self, tenant: InferenceTenant, cost: float) -> None:
+        org = self._orgs.get(tenant.key)
+        if org is None:
+            org = self._orgs[tenant.key] = _OrgQueue(tenant)
+        else:
+            # Limits come from the (cached) API key and may have changed.
+            org.tenant = tenant
+        cap = max(1, tenant.max_concurrent)
+
+        if not org.waiters and org.in_flight < cap and self._in_flight < self.capacity:
+            org.last_tag = max(self._virtual_time, org.last_tag) + cost / tenant.weight
+            self._admit(org)
+            return
+
+        self._check_deadline(org, cap)
+        tag = max(self._virtual_time, org.last_tag) + cost / tenant.weight
+        org.last_tag = tag
+        waiter = _Waiter(tag, cost, asyncio.get_running_loop().create_future())
+        org.waiters.append(waiter)
+        self._waiting += 1
+        self._stats["queued"] += 1
+        self._schedule(org)
+        self._dispatch()
+
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter.future), self.deadline)
+        except asyncio.TimeoutError:
+            if waiter.future.done():
+                return  # admitted as the wait ran out
+            self._abandon(org, waiter)
+            self._stats["timed_out"] += 1
+            raise InferenceRejected(503, "Inference queue wait exceeded the deadline", self.deadline) from None
+        except BaseException:
+            # Caller cancelled (client disconnect).
+            if waiter.future.done():
+                self._release(tenant.key)
+            else:
+                self._abandon(org, waiter)
+            raise
+
+    def _check_deadline(self, org: _OrgQueue, cap: int) -> None:
+        service = self._service_time
+        if service is None:
+            return
+        # Under fair queueing the org gets its weighted share of the slots
+        # while others are busy, and never more than its cap.
+        active = [o for o in self._orgs.values() if o.waiters or o.in_flight]
+        if org not in active:
+            active.append(org)
+        share = self.capacity * org.tenant.weight / sum(o.tenant.weight for o in active)
+        wait = (len(org.waiters) + 1) / max(min(cap, share), 1e-9) * service
+        if wait <= self.deadline:
+            return
+        self._forget_if_idle(org)
+        if cap <= share:
+            self._stats["rejected_org"] += 1
+            raise InferenceRejected(429, "Too many concurrent inference requests for this organization", wait)
+        self._stats["rejected_overload"] += 1
+        raise InferenceRejected(503, "Inference service is overloaded", wait)
+
+    def _admit(self, org: _OrgQueue) -> None:
+        org.in_flight += 1
+        self._in_flight += 1
+        self._stats["admitted"] += 1
+
+    def _schedule(self, org: _OrgQueue) -> None:
+        """Put the org in the ready heap if it has a waiter and a free slot."""
+        if org.scheduled or not org.waiters or org.in_flight >= max(1, org.tenant.max_concurrent):
+            return
+        org.scheduled = True
+        heapq.heappush(self._ready, (org.waiters[0].tag, next(self._sequence), org.tenant.key))
+
+    def _dispatch(self) -> None:
+        while self._in_flight < self.capacity and self._ready:
+            _, _, key = heapq.heappop(self._ready)
+            org = self._orgs.get(key)
+            if org is None or not org.scheduled:
+                continue  # gone idle since it was pushed
+            org.scheduled = False
+            if not org.waiters or org.in_flight >= max(1, org.tenant.max_concurrent):
+                continue
+            waiter = org.waiters.popleft()
+            self._waiting -= 1
+            # Start-time fair queueing: virtual time is the start tag of the
+            # request last put into service.
+            self._virtual_time = max(self._virtual_time, waiter.tag - waiter.cost / org.tenant.weight)
+            self._admit(org)
+            waiter.future.set_result(None)
+            self._schedule(org)
+
+    def _abandon(self, org: _OrgQueue, waiter: _Waiter) -> None:
+        org.waiters.remove(waiter)
+        self._waiting -= 1
+        self._forget_if_idle(org)
+
+    def _release(self, key: Hashable) -> None:
+        org = self._orgs[key]
+        org.in_flight -= 1
+        self._in_flight -= 1
+        self._schedule(org)
+        self._forget_if_idle(org)
+        self._dispatch()
+
+    def _forget_if_idle(self, org: _OrgQueue) -> None:
+        if not org.waiters and org.in_flight == 0:
+            self._orgs.pop(org.tenant.key, None)
+
+    def _record(self, elapsed: float) -> None:
+        if self._service_time is None:
+            self._service_time = elapsed
+        else:
+            self._service_time += _EWMA_ALPHA * (elapsed - self._service_time)
+
+
+inference_scheduler = InferenceScheduler(
+    capacity=settings.AI_SCHEDULER_CAPACITY or settings.AI_BATCH_MAX_SIZE,
+    deadline_ms=settings.AI_QUEUE_DEADLINE_MS,
+)
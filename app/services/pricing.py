@@ -0,0 +1,181 @@
+import asyncio
+import logging
+import time
+import uuid
+from collections import defaultdict
+from dataclasses import dataclass
+from decimal import Decimal
+from types import MappingProxyType
+from typing import Any, Dict, List, Mapping, Optional, Tuple
+
+import numpy as np
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from sqlalchemy.orm import selectinload
+
+from app.core.config import settings
+from app.core.redis import get_redis_client
+from app.db.session import AsyncSessionLocal
+from app.models.billing import PricingModel, PricingPlan, PricingRule
+from app.services.rating import GRADUATED, VOLUME, ScheduleSet, Tier, TierSchedule, to_money
+
+logger = logging.getLogger(__name__)
+
+_VERSION_KEY = "pricing:version"
+# Blended unit prices of tiered invoice lines are rounded to this many places.
+_BLENDED_PRICE_DECIMALS = 6
+
+# (total_amount, [invoice item values])
+RatedUsage = Tuple[float, List[Dict]]
+
+
+@dataclass(frozen=True)
+class RateTable:
+    """
+    Every pricing rule compiled into a TierSchedule, looked up by
+    (plan_id, resource_name). Rating is a dictionary lookup per usage
+    aggregate plus one vectorized ScheduleSet.rate() call for the batch.
+    """
+
+    version: int
+    default_plan_id: Optional[uuid.UUID]
+    schedule_ids: Mapping[Tuple[uuid.UUID, str], int]
+    schedules: ScheduleSet
+    # The rule's unit_price for flat rules, None for tiered ones; by schedule id.
+    list_prices: Tuple[Optional[float], ...]
+
+    def plan_for(self, plan_id: Optional[uuid.UUID]) -> Optional[uuid.UUID]:
+        return plan_id if plan_id is not None else self.default_plan_id
+
+    def rate_orgs(
+        self, usage: Mapping[Any, Tuple[Optional[uuid.UUID], List[Tuple[str, int]]]]
+    ) -> Dict[Any, RatedUsage]:
+        """Rate {org_id: (plan_id, [(endpoint, count), ...])}; NULL plan_id means the default plan."""
+        owners, endpoints, schedule_ids, quantities = [], [], [], []
+        for org_id, (plan_id, usage_data) in usage.items():
+            plan_id = self.plan_for(plan_id)
+            for endpoint, count in usage_data:
+                # Match endpoint to resource_name (exact match for now);
+                # usage without a rule isn't billed.
+                schedule_id = self.schedule_ids.get((plan_id, endpoint))
+                if schedule_id is None:
+                    continue
+                owners.append(org_id)
+                endpoints.append(endpoint)
+                schedule_ids.append(schedule_id)
+                quantities.append(count)
+
+        amounts = self.schedules.rate(
+            np.array(schedule_ids, dtype=np.intp), np.array(quantities, dtype=np.float64)
+        ).tolist()
+
+        totals: Dict[Any, Decimal] = defaultdict(Decimal)
+        items: Dict[Any, List[Dict]] = defaultdict(list)
+        for org_id, endpoint, schedule_id, count, amount in zip(owners, endpoints, schedule_ids, quantities, amounts):
+            line_amount = to_money(amount)
+            unit_price = self.list_prices[schedule_id]
+            if unit_price is None:
+                # Tiered lines show the blended price per unit.
+                unit_price = round(amount / count, _BLENDED_PRICE_DECIMALS) if count else 0.0
+            items[org_id].append({
+                "description": f"Usage for {endpoint}",
+                "units": count,
+                "unit_price": unit_price,
+                "amount": float(line_amount),
+            })
+            totals[org_id] += line_amount
+        return {org_id: (float(totals[org_id]), items[org_id]) for org_id in usage}
+
+    def rate(self, plan_id: Optional[uuid.UUID], usage_data: List[Tuple[str, int]]) -> RatedUsage:
+        return self.rate_orgs({None: (plan_id, usage_data)})[None]
+
+
+def _is_tiered(rule: PricingRule) -> bool:
+    return rule.pricing_model in (PricingModel.GRADUATED, PricingModel.VOLUME) and bool(rule.tiers)
+
+
+def _schedule_for(rule: PricingRule) -> TierSchedule:
+    if _is_tiered(rule):
+        # Unbounded (NULL) tiers sort last.
+        tiers = sorted(rule.tiers, key=lambda tier: (tier.up_to is None, tier.up_to or 0))
+        mode = VOLUME if rule.pricing_model == PricingModel.VOLUME else GRADUATED
+        return TierSchedule(mode, tuple(Tier(t.up_to, t.unit_price or 0.0, t.flat_fee or 0.0) for t in tiers))
+    return TierSchedule.flat(rule.unit_price or 0.0, rule.free_tier_limit or 0)
+
+
+async def compile_rate_table(db: AsyncSession, version: int) -> RateTable:
+    default_plan_id = await db.scalar(
+        select(PricingPlan.id).filter(PricingPlan.is_default.is_(True)).order_by(PricingPlan.id).limit(1)
+    )
+    result = await db.execute(select(PricingRule).options(selectinload(PricingRule.tiers)))
+    schedule_ids = {}
+    schedules = []
+    list_prices = []
+    for rule in result.scalars().all():
+        schedule_ids[(rule.plan_id, rule.resource_name)] = len(schedules)
+        schedules.append(_schedule_for(rule))
+        list_prices.append(None if _is_tiered(rule) else rule.unit_price or 0.0)
+    return RateTable(
+        version=version,
+        default_plan_id=default_plan_id,
+        schedule_ids=MappingProxyType(schedule_ids),
+        schedules=ScheduleSet(schedules),
+        list_prices=tuple(list_prices),
+    )
+
+
+class PricingEngine:
+    """
+    Process-wide cache of the compiled RateTable.
+
+    The version lives in Redis (`pricing:version`) and is bumped by
+    invalidate() whenever plans or rules change. Each worker checks it at
+    most every `check_interval` seconds and recompiles only when it moved,
+    so a change made through any worker is picked up everywhere within that
+    interval and immediately in the worker that made it.
+    """
+
+    def __init__(self, check_interval: float):
+        self.check_interval = check_interval
+        self._table: Optional[RateTable] = None
+        self._checked_at = 0.0
+        self._lock = asyncio.Lock()
+
+    async def _remote_version(self) -> int:
+        try:
+            client = await get_redis_client()
+            value = await client.get(_VERSION_KEY)
+            return int(value) if value is not None else 0
+        except Exception:
+            logger.warning("Pricing version check failed, keeping the cached rate table", exc_info=True)
+            return self._table.version if self._table is not None else 0
+
+    async def get_rate_table(self, db: Optional[AsyncSession] = None) -> RateTable:
+        table = self._table
+        if table is not None and time.monotonic() - self._checked_at < self.check_interval:
+            return table
+
+        async with self._lock:
+            if self._table is not None and time.monotonic() - self._checked_at < self.check_interval:
+                return self._table
+            version = await self._remote_version()
+            if self._table is None or self._table.version != version:
+                if db is not None:
+                    self._table = await compile_rate_table(db, version)
+                else:
+                    async with AsyncSessionLocal() as session:
+                        self._table = await compile_rate_table(session, version)
+            self._checked_at = time.monotonic()
+            return self._table
+
+    async def invalidate(self) -> None:
+        """Call after committing a change to pricing plans or rules."""
+        self._table = None
+        try:
+            client = await get_redis_client()
+            await client.incr(_VERSION_KEY)
+        except Exception:
+            logger.warning("Could not publish pricing invalidation", exc_info=True)
+
+
+pricing_engine = PricingEngine(check_interval=settings.PRICING_VERSION_CHECK_SEC)
@@ -0,0 +1,361 @@
+import asyncio
+import logging
+import math
+import time
+import uuid
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+from app.core.config import settings
+from app.core.redis import get_redis_client
+from app.models.organization import RateLimitAlgorithm
+from app.services.api_key_resolver import ResolvedAPIKey
+
+logger = logging.getLogger(__name__)
+
+# One script for all algorithms so every check is a single EVALSHA round trip.
+# Time comes from the Redis server so all API workers agree on window edges.
+#
+# KEYS[1] - per-key limiter state
+# ARGV    - algorithm, limit, window_ms, request id, cost
+# Returns {allowed (0/1), remaining, reset_ms}
+_RATE_LIMIT_LUA = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+local algorithm = ARGV[1]
+local limit = tonumber(ARGV[2])
+local window = tonumber(ARGV[3])
+local cost = tonumber(ARGV[5])
+local allowed = 0
+local remaining = 0
+local reset = window
+
+if algorithm == 'sliding_log' then
+    redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now - window)
+    local count = redis.call('ZCARD', KEYS[1])
+    if count + cost <= limit then
+        for i = 1, cost do
+            redis.call('ZADD', KEYS[1], now, ARGV[4] .. ':' .. i)
+        end
+        count = count + cost
+        allowed = 1
+    end
+    redis.call('PEXPIRE', KEYS[1], window)
+    remaining = limit - count
+    local oldest = redis.call('ZRANGE', KEYS[1], 0, 0, 'WITHSCORES')
+    if oldest[2] then
+        reset = tonumber(oldest[2]) + window - now
+    end
+
+elseif algorithm == 'token_bucket' then
+    local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+    local tokens = tonumber(state[1]) or limit
+    local ts = tonumber(state[2]) or now
+    local rate = limit / window
+    tokens = math.min(limit, tokens + math.max(0, now - ts) * rate)
+    if tokens >= cost then
+        tokens = tokens - cost
+        allowed = 1
+    end
+    redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+    redis.call('PEXPIRE', KEYS[1], window * 2)
+    remaining = math.floor(tokens)
+    if allowed == 1 then
+        reset = math.ceil((limit - tokens) / rate)
+    else
+        reset = math.ceil((cost - tokens) / rate)
+    end
+
+else -- sliding_window (weighted counter over the current and previous window)
+    local current_start = now - (now % window)
+    local state = redis.call('HMGET', KEYS[1], 'start', 'current', 'previous')
+    local start = tonumber(state[1]) or current_start
+    local current = tonumber(state[2]) or 0
+    local previous = tonumber(state[3]) or 0
+    if start ~= current_start then
+        if start == current_start - window then
+            previous = current
+        else
+            previous = 0
+        end
+        current = 0
+    end
+    local weight = (window - (now - current_start)) / window
+    local estimated = previous * weight + current
+    if estimated + cost <= limit then
+        current = current + cost
+        estimated = estimated + cost
+        allowed = 1
+    end
+    redis.call('HSET', KEYS[1], 'start', current_start, 'current', current, 'previous', previous)
+    redis.call('PEXPIRE', KEYS[1], window * 2)
+    remaining = math.floor(limit - estimated)
+    reset = current_start + window - now
+end
+
+if remaining < 0 then
+    remaining = 0
+end
+return {allowed, remaining, reset}
+"""
+
+# Token bucket used by LocalLeaseLimiter to hand out chunks of tokens.
+#
+# KEYS[1] - per-key lease bucket
+# ARGV    - limit, window_ms, tokens requested, unused tokens returned
+# Returns {granted, tokens left in Redis, ms until one token is available}
+_LEASE_LUA = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+local limit = tonumber(ARGV[1])
+local window = tonumber(ARGV[2])
+local requested = tonumber(ARGV[3])
+local refund = tonumber(ARGV[4])
+local rate = limit / window
+
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or limit
+local ts = tonumber(state[2]) or now
+tokens = math.min(limit, tokens + math.max(0, now - ts) * rate + refund)
+
+local granted = math.min(requested, math.floor(tokens))
+tokens = tokens - granted
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+redis.call('PEXPIRE', KEYS[1], window * 2)
+
+local reset = 0
+if tokens < 1 then
+    reset = math.ceil((1 - tokens) / rate)
+end
+return {granted, math.floor(tokens), reset}
+"""
+
+
+@dataclass(frozen=True)
+class RateLimitResult:
+    allowed: bool
+    limit: int
+    remaining: int
+    reset_ms: int
+
+    def headers(self) -> Dict[str, str]:
+        reset_sec = max(0, math.ceil(self.reset_ms / 1000))
+        headers = {
+            "X-RateLimit-Limit": str(self.limit),
+            "X-RateLimit-Remaining": str(self.remaining),
+            "X-RateLimit-Reset": str(reset_sec),
+        }
+        if not self.allowed:
+            headers["Retry-After"] = str(max(1, reset_sec))
+        return headers
+
+
+class RedisRateLimiter:
+    """
+    Atomic check-and-increment against Redis in one round trip.
+
+    The algorithm is chosen per API key (`APIKey.rate_limit_algorithm`); the
+    limit is `rate_limit_per_sec` requests per `window_ms`.
+    """
+
+    def __init__(self, window_ms: int = 1000):
+        self.window_ms = window_ms
+        self._script = None
+
+    async def hit(self, api_key: ResolvedAPIKey, cost: int = 1) -> RateLimitResult:
+        client = await get_redis_client()
+        if self._script is None:
+            # register_script computes the SHA once; calls go through EVALSHA
+            # and only fall back to loading the script on NOSCRIPT.
+            self._script = client.register_script(_RATE_LIMIT_LUA)
+
+        algorithm = api_key.rate_limit_algorithm or RateLimitAlgorithm.SLIDING_WINDOW.value
+        allowed, remaining, reset_ms = await self._script(
+            keys=[self.state_key(api_key.key_hash, algorithm)],
+            args=[algorithm, api_key.rate_limit_per_sec, self.window_ms, uuid.uuid4().hex, cost],
+            client=client,
+        )
+        return RateLimitResult(
+            allowed=bool(allowed),
+            limit=api_key.rate_limit_per_sec,
+            remaining=int(remaining),
+            reset_ms=int(reset_ms),
+        )
+
+    def state_key(self, key_hash: str, algorithm: Optional[str]) -> str:
+        # Per-algorithm state so switching a key's algorithm never reads
+        # another algorithm's layout.
+        return f"rate:{key_hash}:{algorithm}"
+
+    async def start(self) -> None:
+        pass
+
+    async def stop(self) -> None:
+        pass
+
+
+@dataclass
+class _Lease:
+    limit: int = 0
+    tokens: int = 0
+    expires_at: float = 0.0
+    remote_remaining: int = 0
+    reset_ms: int = 0
+    last_used: float = 0.0
+    pending: Optional[asyncio.Task] = None
+
+
+class LocalLeaseLimiter:
+    """
+    Hybrid limiter: admit from a per-worker token lease, refill it from Redis.
+
+    Keys whose `rate_limit_per_sec` is at least `min_rate` are limited by a
+    token bucket held in Redis, but each worker takes tokens from it in chunks
+    of `lease_size` and admits requests locally until the chunk is used up or
+    `lease_ttl_ms` has passed. Redis traffic is therefore one call per lease
+    rather than one per request. Unused tokens from expired leases are
+    returned to Redis by a periodic reconcile task.
+
+    Because a leased token can be spent up to `lease_ttl_ms` after Redis
+    granted it, a key can be over-admitted by at most roughly
+    `limit * lease_ttl_ms / window_ms` requests in any window. Keys below
+    `min_rate` keep using the per-request `RedisRateLimiter`.
+    """
+
+    def __init__(
+        self,
+        remote: RedisRateLimiter,
+        lease_fraction: float,
+        lease_max: int,
+        lease_ttl_ms: int,
+        min_rate: int,
+        reconcile_interval_ms: int,
+        idle_ttl_sec: float = 60.0,
+    ):
+        self.remote = remote
+        self.window_ms = remote.window_ms
+        self.lease_fraction = lease_fraction
+        self.lease_max = lease_max
+        self.lease_ttl_ms = lease_ttl_ms
+        self.min_rate = min_rate
+        self.reconcile_interval_ms = reconcile_interval_ms
+        self.idle_ttl_sec = idle_ttl_sec
+
+        self._leases: Dict[str, _Lease] = {}
+        self._script = None
+        self._task: Optional[asyncio.Task] = None
+
+    def lease_size(self, limit: int) -> int:
+        return max(1, min(self.lease_max, math.ceil(limit * self.lease_fraction)))
+
+    async def hit(self, api_key: ResolvedAPIKey, cost: int = 1) -> RateLimitResult:
+        limit = api_key.rate_limit_per_sec
+        if cost != 1 or limit < self.min_rate:
+            return await self.remote.hit(api_key, cost)
+
+        lease = self._leases.get(api_key.key_hash)
+        if lease is None:
+            lease = self._leases[api_key.key_hash] = _Lease()
+
+        while True:
+            now = time.monotonic()
+            lease.last_used = now
+            if lease.tokens > 0 and lease.expires_at > now:
+                # Common path: a pure in-memory decision.
+                lease.tokens -= 1
+                return RateLimitResult(
+                    allowed=True,
+                    limit=limit,
+                    remaining=lease.tokens + lease.remote_remaining,
+                    reset_ms=int((lease.expires_at - now) * 1000),
+                )
+
+            # Lease exhausted or expired: one renewal in flight per key, the
+            # other requests for the key wait on it.
+            if lease.pending is None:
+                lease.pending = asyncio.create_task(self._renew(api_key, lease))
+            granted = await asyncio.shield(lease.pending)
+            if granted == 0:
+                return RateLimitResult(
+                    allowed=False,
+                    limit=limit,
+                    remaining=0,
+                    reset_ms=lease.reset_ms,
+                )
+
+    async def _renew(self, api_key: ResolvedAPIKey, lease: _Lease) -> int:
+        try:
+            refund = lease.tokens
+            lease.tokens = 0
+            lease.limit = api_key.rate_limit_per_sec
+            granted, remaining, reset_ms = await self._call(
+                api_key.key_hash,
+                api_key.rate_limit_per_sec,
+                self.lease_size(api_key.rate_limit_per_sec),
+                refund,
+            )
+            lease.tokens = int(granted)
+            lease.remote_remaining = int(remaining)
+            lease.reset_ms = int(reset_ms)
+            lease.expires_at = time.monotonic() + self.lease_ttl_ms / 1000
+            return lease.tokens
+        finally:
+            lease.pending = None
+
+    async def _call(self, key_hash: str, limit: int, requested: int, refund: int) -> Tuple[int, int, int]:
+        client = await get_redis_client()
+        if self._script is None:
+            self._script = client.register_script(_LEASE_LUA)
+        return await self._script(
+            keys=[f"rate:{key_hash}:lease"],
+            args=[limit, self.window_ms, requested, refund],
+            client=client,
+        )
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._reconcile_loop())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        # Hand back everything this worker still holds.
+        await self.reconcile(force=True)
+
+    async def _reconcile_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.reconcile_interval_ms / 1000)
+            try:
+                await self.reconcile()
+            except Exception:
+                logger.warning("Rate limit lease reconcile failed", exc_info=True)
+
+    async def reconcile(self, force: bool = False) -> None:
+        """Return unused tokens of expired leases and forget idle keys."""
+        now = time.monotonic()
+        for key_hash, lease in list(self._leases.items()):
+            if lease.pending is not None:
+                continue
+            if lease.tokens > 0 and (force or lease.expires_at <= now):
+                refund = lease.tokens
+                lease.tokens = 0
+                await self._call(key_hash, lease.limit, 0, refund)
+            if lease.tokens == 0 and now - lease.last_used > self.idle_ttl_sec:
+                del self._leases[key_hash]
+
+
+rate_limiter = RedisRateLimiter(window_ms=settings.RATE_LIMIT_WINDOW_MS)
+if settings.RATE_LIMIT_LOCAL_LEASES:
+    rate_limiter = LocalLeaseLimiter(
+        remote=rate_limiter,
+        lease_fraction=settings.RATE_LIMIT_LEASE_FRACTION,
+        lease_max=settings.RATE_LIMIT_LEASE_MAX,
+        lease_ttl_ms=settings.RATE_LIMIT_LEASE_TTL_MS,
+        min_rate=settings.RATE_LIMIT_LEASE_MIN_RATE,
+        reconcile_interval_ms=settings.RATE_LIMIT_LEASE_RECONCILE_MS,
+    )
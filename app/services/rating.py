@@ -0,0 +1,110 @@
+from dataclasses import dataclass
+from decimal import ROUND_HALF_UP, Decimal
+from typing import Optional, Sequence, Tuple
+
+import numpy as np
+
+# Bulk evaluation of tiered price schedules.
+#
+# Every schedule is a list of tiers (up_to, unit_price, flat_fee) sorted by
+# up_to; the last tier is always treated as unbounded. All schedules are
+# packed into (schedules x max_tiers) arrays, padded with zero-width tiers,
+# so rating N (schedule, quantity) pairs is a handful of array operations
+# with no Python loop over the pairs. Amounts are float64 throughout and
+# only rounded to money, with Decimal, at the invoice line (to_money()).
+
+GRADUATED = "graduated"
+VOLUME = "volume"
+
+# Stands in for "no upper bound"; far above any monthly request count.
+_UNBOUNDED = 1e18
+
+CENT = Decimal("0.01")
+
+
+@dataclass(frozen=True)
+class Tier:
+    up_to: Optional[int]  # None = unbounded
+    unit_price: float
+    flat_fee: float = 0.0
+
+
+@dataclass(frozen=True)
+class TierSchedule:
+    """
+    `graduated`: each unit is priced by the tier it falls in.
+    `volume`: every unit is priced by the tier the total quantity falls in.
+    A tier's flat fee is charged once its range is reached (graduated) or
+    when it is the selected tier (volume).
+    """
+
+    mode: str
+    tiers: Tuple[Tier, ...]
+
+    @classmethod
+    def flat(cls, unit_price: float, free_tier_limit: int = 0) -> "TierSchedule":
+        """The classic unit_price / free_tier_limit rule as a graduated schedule."""
+        if free_tier_limit > 0:
+            return cls(GRADUATED, (Tier(free_tier_limit, 0.0), Tier(None, unit_price)))
+        return cls(GRADUATED, (Tier(None, unit_price),))
+
+
+class ScheduleSet:
+    """A fixed list of TierSchedules compiled for vectorized rating; ids are list positions."""
+
+    def __init__(self, schedules: Sequence[TierSchedule]):
+        count = len(schedules)
+        width = max((len(s.tiers) for s in schedules), default=1)
+        self.lower = np.full((count, width), _UNBOUNDED)
+        self.upper = np.full((count, width), _UNBOUNDED)
+        self.price = np.zeros((count, width))
+        self.fee = np.zeros((count, width))
+        self.is_volume = np.zeros(count, dtype=bool)
+
+        for index, schedule in enumerate(schedules):
+            self.is_volume[index] = schedule.mode == VOLUME
+            lower = 0.0
+            for t, tier in enumerate(schedule.tiers):
+                last = t == len(schedule.tiers) - 1
+                upper = _UNBOUNDED if last or tier.up_to is None else float(tier.up_to)
+                self.lower[index, t] = lower
+                self.upper[index, t] = upper
+                self.price[index, t] = tier.unit_price
+                self.fee[index, t] = tier.flat_fee
+                lower = upper
+
+    def __len__(self) -> int:
+        return len(self.is_volume)
+
+    def rate(self, schedule_ids: np.ndarray, quantities: np.ndarray) -> np.ndarray:
+        """Amount for each (schedule_ids[i], quantities[i]) pair, as float64."""
+        schedule_ids = np.asarray(schedule_ids, dtype=np.intp)
+        quantities = np.asarray(quantities, dtype=np.float64)
+        amounts = np.zeros(len(quantities))
+        if len(quantities) == 0:
+            return amounts
+
+        volume = self.is_volume[schedule_ids]
+
+        rows = ~volume
+        if rows.any():
+            ids, q = schedule_ids[rows], quantities[rows, None]
+            lower, upper = self.lower[ids], self.upper[ids]
+            units = np.clip(q - lower, 0.0, upper - lower)
+            reached = q > lower
+            amounts[rows] = (units * self.price[ids]).sum(axis=1) + (reached * self.fee[ids]).sum(axis=1)
+
+        if volume.any():
+            ids, q = schedule_ids[volume], quantities[volume]
+            # First tier whose upper bound covers the quantity; the last real
+            # tier is unbounded so there always is one.
+            tier = (q[:, None] <= self.upper[ids]).argmax(axis=1)
+            charged = q * self.price[ids, tier] + self.fee[ids, tier]
+            amounts[volume] = np.where(q > 0, charged, 0.0)
+
+        return amounts
+
+
+def to_money(amount: float) -> Decimal:
+    """Round a rated amount to cents (half up), via its shortest repr so 0.1 stays 0.1."""
+    return Decimal(repr(float(amount))).quantize(CENT, rounding=ROUND_HALF_UP)
@@ -0,0 +1,96 @@
+import hashlib
+import logging
+from typing import Iterable, Optional
+
+from starlette.requests import Request
+from starlette.responses import Response
+
+from app.core.config import settings
+from app.core.redis import get_redis_client
+
+logger = logging.getLogger(__name__)
+
+# Serialized JSON responses for data that no longer changes (closed usage
+# days, issued invoices), shared by all workers through Redis.
+#
+# Keys embed a per-org version, respcache:{kind}:{org_id}:v{version}:...,
+# so invalidate_orgs() retires every entry of an org with one INCR; the old
+# entries just expire.
+
+
+def etag_for(body: bytes) -> str:
+    """Strong ETag: the same body always gets the same tag, on any worker."""
+    return '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [candidate.strip() for candidate in if_none_match.split(",")]
+    # If-None-Match uses the weak comparison.
+    return "*" in candidates or any(candidate.removeprefix("W/") == etag for candidate in candidates)
+
+
+def json_response(request: Request, body: bytes) -> Response:
+    """200 with `body` and its ETag, or 304 when the client already has it."""
+    etag = etag_for(body)
+    # Clients must revalidate, but may keep the body to do it.
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if _etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+class ResponseCache:
+    def __init__(self, ttl: int):
+        self.ttl = ttl
+
+    def _version_key(self, org_id) -> str:
+        return f"respcache:org:{org_id}:version"
+
+    async def key(self, kind: str, org_id, *parts) -> Optional[str]:
+        """Cache key for this org's current version; None when Redis is unavailable."""
+        try:
+            client = await get_redis_client()
+            version = await client.get(self._version_key(org_id))
+        except Exception:
+            logger.warning("Redis unavailable for response cache", exc_info=True)
+            return None
+        version = int(version) if version is not None else 0
+        return ":".join(["respcache", kind, str(org_id), f"v{version}", *map(str, parts)])
+
+    async def get(self, key: Optional[str]) -> Optional[bytes]:
+        if key is None:
+            return None
+        try:
+            client = await get_redis_client()
+            return await client.get(key)
+        except Exception:
+            logger.warning("Redis unavailable for response cache lookup", exc_info=True)
+            return None
+
+    async def set(self, key: Optional[str], body: bytes) -> None:
+        if key is None:
+            return
+        try:
+            client = await get_redis_client()
+            await client.setex(key, self.ttl, body)
+        except Exception:
+            logger.warning("Failed to store cached response", exc_info=True)
+
+    async def invalidate_orgs(self, org_ids: Iterable) -> None:
+        """Call after committing changes to these orgs' invoices or usage."""
+        org_ids = list(org_ids)
+        if not org_ids:
+            return
+        try:
+            client = await get_redis_client()
+            async with client.pipeline(transaction=False) as pipe:
+                for org_id in org_ids:
+                    pipe.incr(self._version_key(org_id))
+                await pipe.execute()
+        except Exception:
+            logger.warning("Could not invalidate cached responses for %d orgs", len(org_ids), exc_info=True)
+
+
+response_cache = ResponseCache(ttl=settings.RESPONSE_CACHE_TTL_SEC)
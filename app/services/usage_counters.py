@@ -0,0 +1,192 @@
+import asyncio
+import logging
+import uuid
+from collections import defaultdict
+from datetime import date, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import delete, func
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from app.core.config import settings
+from app.core.redis import get_redis_client
+from app.db.session import AsyncSessionLocal
+from app.models.usage import UsageCounterFlush, UsageDailyRollup
+from app.services.analytics import admin_analytics
+from app.services.usage_ingest import UsageEvent
+from app.services.usage_rollups import add_to_rollups
+
+logger = logging.getLogger(__name__)
+
+_INDEX_KEY = "usage:counters:index"
+_FLUSHING_KEY = "usage:counters:flushing"
+_LOCK_KEY = "usage:counters:flush-lock"
+
+# Atomically moves every live counter hash aside under a unique name so new
+# increments start a fresh hash while the snapshot is written to Postgres.
+#
+# KEYS[1] - index of live counter hashes, KEYS[2] - set of snapshots to apply
+# ARGV[1] - suffix making the snapshot names unique
+_DRAIN_LUA = """
+local live = redis.call('SMEMBERS', KEYS[1])
+for _, key in ipairs(live) do
+    if redis.call('EXISTS', key) == 1 then
+        local snapshot = key .. ':flushing:' .. ARGV[1]
+        redis.call('RENAME', key, snapshot)
+        redis.call('SADD', KEYS[2], snapshot)
+    end
+    redis.call('SREM', KEYS[1], key)
+end
+return redis.call('SMEMBERS', KEYS[2])
+"""
+
+_RELEASE_LUA = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+def _status_class(status_code: int) -> str:
+    return f"{status_code // 100}xx"
+
+
+class RedisUsageCounters:
+    """
+    Write-behind usage metering.
+
+    On the request path each event is a single pipelined HINCRBY into a Redis
+    hash per UTC day, field `org_id|api_key_id|status_class|endpoint` (events
+    with a token count add it under status_class `tokens`). A background
+    flusher periodically snapshots those hashes and adds them to
+    `usage_daily_rollups` in one transaction. The snapshot name is recorded
+    in `usage_counter_flushes` in that same transaction, so a snapshot that
+    is retried after a crash is never counted twice. Only one worker flushes
+    at a time (Redis lock).
+    """
+
+    def __init__(self, flush_interval: float, flushed_retention_days: int = 7):
+        self.flush_interval = flush_interval
+        self.flushed_retention_days = flushed_retention_days
+        self._worker_id = uuid.uuid4().hex
+        self._drain_script = None
+        self._release_script = None
+        self._task: Optional[asyncio.Task] = None
+
+    def _hash_key(self, day: date) -> str:
+        return f"usage:counters:{day.isoformat()}"
+
+    async def record(self, event: UsageEvent) -> None:
+        client = await get_redis_client()
+        hash_key = self._hash_key(event.timestamp.date())
+        field = f"{event.org_id}|{event.api_key_id}|{_status_class(event.status_code)}|{event.endpoint}"
+        async with client.pipeline(transaction=True) as pipe:
+            pipe.hincrby(hash_key, field, 1)
+            if event.token_count:
+                pipe.hincrby(hash_key, f"{event.org_id}|{event.api_key_id}|tokens|{event.endpoint}", event.token_count)
+            pipe.sadd(_INDEX_KEY, hash_key)
+            # Admin analytics ride along in the same round trip.
+            admin_analytics.add_usage(pipe, [event])
+            await pipe.execute()
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("Usage counter flush failed")
+
+    async def flush(self) -> int:
+        """Drain Redis counters into Postgres. Returns the rows upserted."""
+        client = await get_redis_client()
+        if self._drain_script is None:
+            self._drain_script = client.register_script(_DRAIN_LUA)
+            self._release_script = client.register_script(_RELEASE_LUA)
+
+        lock_ttl_ms = int(max(self.flush_interval * 5, 30) * 1000)
+        if not await client.set(_LOCK_KEY, self._worker_id, nx=True, px=lock_ttl_ms):
+            return 0
+
+        upserted = 0
+        try:
+            snapshots = await self._drain_script(
+                keys=[_INDEX_KEY, _FLUSHING_KEY],
+                args=[uuid.uuid4().hex],
+                client=client,
+            )
+            # Also picks up snapshots left behind by a flusher that died.
+            for snapshot in snapshots:
+                snapshot = snapshot.decode() if isinstance(snapshot, bytes) else snapshot
+                upserted += await self._apply_snapshot(client, snapshot)
+        finally:
+            await self._release_script(keys=[_LOCK_KEY], args=[self._worker_id], client=client)
+        return upserted
+
+    async def _apply_snapshot(self, client, snapshot: str) -> int:
+        # usage:counters:<day>:flushing:<suffix>
+        day = date.fromisoformat(snapshot.split(":")[2])
+        raw = await client.hgetall(snapshot)
+
+        totals: Dict[Tuple[str, str, str], Dict[str, int]] = defaultdict(
+            lambda: {"request_count": 0, "count_2xx": 0, "count_4xx": 0, "count_5xx": 0, "token_count": 0}
+        )
+        for field, value in raw.items():
+            field = field.decode() if isinstance(field, bytes) else field
+            org_id, api_key_id, status_class, endpoint = field.split("|", 3)
+            count = int(value)
+            row = totals[(org_id, api_key_id, endpoint)]
+            if status_class == "tokens":
+                row["token_count"] += count
+                continue
+            row["request_count"] += count
+            column = f"count_{status_class}"
+            if column in row:
+                row[column] += count
+
+        rows: List[Dict] = [
+            {"org_id": uuid.UUID(org_id), "api_key_id": uuid.UUID(api_key_id), "endpoint": endpoint, "day": day, **counts}
+            for (org_id, api_key_id, endpoint), counts in totals.items()
+        ]
+
+        async with AsyncSessionLocal() as db:
+            claimed = await db.execute(
+                pg_insert(UsageCounterFlush)
+                .values(flush_key=snapshot)
+                .on_conflict_do_nothing()
+                .returning(UsageCounterFlush.flush_key)
+            )
+            if claimed.first() is not None:
+                # Chunked to stay under the bind-parameter limit per statement.
+                for i in range(0, len(rows), 1000):
+                    await db.execute(add_to_rollups(pg_insert(UsageDailyRollup).values(rows[i:i + 1000])))
+            await db.execute(
+                delete(UsageCounterFlush).where(
+                    UsageCounterFlush.created_at < func.now() - timedelta(days=self.flushed_retention_days)
+                )
+            )
+            await db.commit()
+
+        async with client.pipeline(transaction=True) as pipe:
+            pipe.delete(snapshot)
+            pipe.srem(_FLUSHING_KEY, snapshot)
+            await pipe.execute()
+        return len(rows)
+
+
+usage_counters = RedisUsageCounters(flush_interval=settings.USAGE_COUNTER_FLUSH_INTERVAL_SEC)
@@ -0,0 +1,191 @@
+import asyncio
+import logging
+import uuid
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import insert
+
+from app.core.config import settings
+from app.db.session import AsyncSessionLocal
+from app.models.usage import UsageLog
+from app.services.analytics import admin_analytics
+
+logger = logging.getLogger(__name__)
+
+# Sentinel pushed onto the queue by stop() so the flusher drains and exits.
+_STOP = object()
+
+
+@dataclass
+class UsageEvent:
+    org_id: uuid.UUID
+    api_key_id: uuid.UUID
+    endpoint: str
+    method: str
+    status_code: int
+    cost_multiplier: float = 1.0
+    # Generated tokens, for endpoints that report them.
+    token_count: Optional[int] = None
+    # Stamped when the request finished, not when the batch is written.
+    timestamp: datetime = field(default_factory=lambda: datetime.now(timezone.utc))
+
+    def as_row(self) -> Dict[str, Any]:
+        return {
+            "org_id": self.org_id,
+            "api_key_id": self.api_key_id,
+            "endpoint": self.endpoint,
+            "method": self.method,
+            "status_code": self.status_code,
+            "cost_multiplier": self.cost_multiplier,
+            "token_count": self.token_count,
+            "timestamp": self.timestamp,
+        }
+
+
+class UsageIngestQueue:
+    """
+    Bounded in-process buffer between the usage middleware and Postgres.
+
+    Events are collected on an asyncio.Queue and written by a single flusher
+    task as one multi-row INSERT whenever `batch_size` events are waiting or
+    `flush_interval` seconds have passed since the first event of the batch.
+    When the queue is full, `enqueue` waits up to `put_timeout` seconds and
+    then drops the event (counted in `stats()`), so a stalled database can
+    never grow worker memory without bound.
+    """
+
+    def __init__(
+        self,
+        max_size: int,
+        batch_size: int,
+        flush_interval: float,
+        put_timeout: float,
+    ):
+        self.max_size = max_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.put_timeout = put_timeout
+
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+
+        self.flushed = 0
+        self.dropped = 0
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    async def start(self) -> None:
+        if self.running:
+            return
+        # Created here rather than in __init__ so the queue binds to the
+        # server's event loop, not whichever loop existed at import time.
+        self._queue = asyncio.Queue(maxsize=self.max_size)
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Flush everything still buffered, then stop the flusher."""
+        if not self.running:
+            return
+        await self._queue.put(_STOP)
+        await self._task
+        self._task = None
+
+    async def enqueue(self, event: UsageEvent) -> bool:
+        if not self.running:
+            # No flusher (e.g. scripts or shutdown already ran): write inline
+            # so the event is not lost.
+            await self._flush([event])
+            return True
+
+        try:
+            self._queue.put_nowait(event)
+            return True
+        except asyncio.QueueFull:
+            pass
+
+        try:
+            await asyncio.wait_for(self._queue.put(event), self.put_timeout)
+            return True
+        except asyncio.TimeoutError:
+            self.dropped += 1
+            logger.warning("Usage ingest queue full, dropped event for %s", event.endpoint)
+            return False
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "queued": self._queue.qsize() if self._queue else 0,
+            "flushed": self.flushed,
+            "dropped": self.dropped,
+        }
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            item = await self._queue.get()
+            if item is _STOP:
+                break
+
+            batch: List[UsageEvent] = [item]
+            deadline = loop.time() + self.flush_interval
+            while len(batch) < self.batch_size:
+                try:
+                    item = self._queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    remaining = deadline - loop.time()
+                    if remaining <= 0:
+                        break
+                    try:
+                        item = await asyncio.wait_for(self._queue.get(), remaining)
+                    except asyncio.TimeoutError:
+                        break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+
+            await self._flush(batch)
+
+        # Drain whatever was enqueued behind the stop sentinel.
+        leftover: List[UsageEvent] = []
+        while not self._queue.empty():
+            item = self._queue.get_nowait()
+            if item is not _STOP:
+                leftover.append(item)
+        for i in range(0, len(leftover), self.batch_size):
+            await self._flush(leftover[i:i + self.batch_size])
+
+    async def _flush(self, batch: List[UsageEvent]) -> None:
+        if not batch:
+            return
+        rows = [event.as_row() for event in batch]
+        for attempt in range(2):
+            try:
+                async with AsyncSessionLocal() as db:
+                    # executemany on insert() is sent as multi-row VALUES
+                    # statements by SQLAlchemy 2.0's insertmanyvalues.
+                    await db.execute(insert(UsageLog), rows)
+                    await db.commit()
+                self.flushed += len(rows)
+                # Per-minute counts and active key/org sketches for the admin dashboard.
+                await admin_analytics.record_usage(batch)
+                return
+            except Exception:
+                if attempt == 0:
+                    logger.warning("Usage flush of %d rows failed, retrying", len(rows), exc_info=True)
+                    await asyncio.sleep(0.5)
+                else:
+                    self.dropped += len(rows)
+                    logger.exception("Usage flush of %d rows failed, dropping batch", len(rows))
+
+
+usage_ingest_queue = UsageIngestQueue(
+    max_size=settings.USAGE_QUEUE_MAX_SIZE,
+    batch_size=settings.USAGE_FLUSH_BATCH_SIZE,
+    flush_interval=settings.USAGE_FLUSH_INTERVAL_SEC,
+    put_timeout=settings.USAGE_QUEUE_PUT_TIMEOUT_SEC,
+)
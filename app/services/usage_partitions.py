@@ -0,0 +1,146 @@
+import asyncio
+import logging
+from datetime import date, datetime, timezone
+from typing import List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.db.session import AsyncSessionLocal
+
+logger = logging.getLogger(__name__)
+
+# usage_logs is range-partitioned by UTC month. Partitions are named
+# usage_logs_pYYYYMM; usage_logs_default catches anything outside them.
+_PARENT = "usage_logs"
+_DEFAULT_PARTITION = "usage_logs_default"
+# Any constant works, it only has to be the same in every worker.
+_ADVISORY_LOCK_ID = 727_001
+
+
+def _add_months(month: date, months: int) -> date:
+    index = month.year * 12 + (month.month - 1) + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    return f"{_PARENT}_p{month.year:04d}{month.month:02d}"
+
+
+async def list_partitions(db: AsyncSession) -> List[str]:
+    result = await db.execute(text(
+        "SELECT c.relname FROM pg_inherits i "
+        "JOIN pg_class c ON c.oid = i.inhrelid "
+        "WHERE i.inhparent = CAST(:parent AS regclass)"
+    ), {"parent": _PARENT})
+    return [row[0] for row in result.all()]
+
+
+async def create_partition(db: AsyncSession, month: date) -> str:
+    """
+    Create the partition for `month`.
+
+    The table is built standalone, any rows for that month that landed in
+    the default partition are moved into it, and only then is it attached.
+    Attaching a range while the default partition still holds rows in that
+    range would fail.
+    """
+    name = partition_name(month)
+    lower = f"{month.isoformat()} 00:00:00+00"
+    upper = f"{_add_months(month, 1).isoformat()} 00:00:00+00"
+
+    await db.execute(text(
+        f'CREATE TABLE "{name}" (LIKE {_PARENT} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)'
+    ))
+    await db.execute(text(
+        f'WITH moved AS ('
+        f'  DELETE FROM {_DEFAULT_PARTITION} '
+        f'  WHERE "timestamp" >= CAST(:lower AS timestamptz) AND "timestamp" < CAST(:upper AS timestamptz) '
+        f'  RETURNING *'
+        f') INSERT INTO "{name}" SELECT * FROM moved'
+    ), {"lower": lower, "upper": upper})
+    await db.execute(text(
+        f'ALTER TABLE {_PARENT} ATTACH PARTITION "{name}" '
+        f"FOR VALUES FROM ('{lower}') TO ('{upper}')"
+    ))
+    return name
+
+
+async def ensure_partitions(db: AsyncSession, months_ahead: int, today: Optional[date] = None) -> List[str]:
+    """Create any missing partitions from the current month to `months_ahead` months out."""
+    today = today or datetime.now(timezone.utc).date()
+    current = date(today.year, today.month, 1)
+    existing = set(await list_partitions(db))
+
+    created = []
+    for offset in range(months_ahead + 1):
+        month = _add_months(current, offset)
+        if partition_name(month) not in existing:
+            created.append(await create_partition(db, month))
+    return created
+
+
+async def drop_expired_partitions(db: AsyncSession, retention_months: int, today: Optional[date] = None) -> List[str]:
+    """Detach and drop partitions whose whole month is older than the retention window."""
+    today = today or datetime.now(timezone.utc).date()
+    cutoff = _add_months(date(today.year, today.month, 1), -retention_months)
+
+    dropped = []
+    for name in await list_partitions(db):
+        suffix = name[len(f"{_PARENT}_p"):]
+        if not name.startswith(f"{_PARENT}_p") or len(suffix) != 6 or not suffix.isdigit():
+            continue
+        month = date(int(suffix[:4]), int(suffix[4:]), 1)
+        if month < cutoff:
+            await db.execute(text(f'ALTER TABLE {_PARENT} DETACH PARTITION "{name}"'))
+            await db.execute(text(f'DROP TABLE "{name}"'))
+            dropped.append(name)
+    return dropped
+
+
+async def maintain_partitions() -> None:
+    async with AsyncSessionLocal() as db:
+        # Only one worker runs partition DDL at a time.
+        locked = await db.scalar(text("SELECT pg_try_advisory_xact_lock(:id)"), {"id": _ADVISORY_LOCK_ID})
+        if not locked:
+            return
+        created = await ensure_partitions(db, settings.USAGE_PARTITION_MONTHS_AHEAD)
+        dropped = []
+        if settings.USAGE_RETENTION_MONTHS > 0:
+            dropped = await drop_expired_partitions(db, settings.USAGE_RETENTION_MONTHS)
+        await db.commit()
+    if created or dropped:
+        logger.info("usage_logs partitions created=%s dropped=%s", created, dropped)
+
+
+class UsagePartitionMaintainer:
+    """Runs maintain_partitions() at startup and then every `interval` seconds."""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await maintain_partitions()
+            except Exception:
+                logger.exception("usage_logs partition maintenance failed")
+            await asyncio.sleep(self.interval)
+
+
+usage_partition_maintainer = UsagePartitionMaintainer(interval=settings.USAGE_PARTITION_MAINTENANCE_INTERVAL_SEC)
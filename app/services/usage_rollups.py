@@ -0,0 +1,154 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from sqlalchemy import and_, func
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from app.core.config import settings
+from app.db.session import AsyncSessionLocal
+from app.models.usage import UsageDailyRollup, UsageLog, UsageRollupState
+
+logger = logging.getLogger(__name__)
+
+STATE_NAME = "usage_logs"
+
+
+def add_to_rollups(stmt):
+    """Turn an INSERT into usage_daily_rollups into one that adds onto existing counts."""
+    return stmt.on_conflict_do_update(
+        index_elements=["org_id", "api_key_id", "endpoint", "day"],
+        set_={
+            "request_count": UsageDailyRollup.request_count + stmt.excluded.request_count,
+            "count_2xx": UsageDailyRollup.count_2xx + stmt.excluded.count_2xx,
+            "count_4xx": UsageDailyRollup.count_4xx + stmt.excluded.count_4xx,
+            "count_5xx": UsageDailyRollup.count_5xx + stmt.excluded.count_5xx,
+            "token_count": UsageDailyRollup.token_count + stmt.excluded.token_count,
+        },
+    )
+
+
+def _status_count(low: int, high: int):
+    return func.count().filter(and_(UsageLog.status_code >= low, UsageLog.status_code <= high))
+
+
+async def refresh_daily_rollups(db: AsyncSession, max_rows: int, safety_lag: timedelta) -> int:
+    """
+    Add usage_logs rows past the high-water mark to usage_daily_rollups.
+
+    Ids are assigned when a row is inserted, but a row with a lower id can
+    commit after one with a higher id. Rows newer than `safety_lag` are
+    therefore left for the next run: the mark only moves up to the first id
+    that is still that recent, and `covered_until` records the timestamp
+    before which every row is known to be rolled up. Readers use it to decide
+    which days they can take from the rollups.
+
+    Returns the new high-water mark minus the old one (0 when nothing moved).
+    """
+    state = (await db.execute(
+        select(UsageRollupState).filter(UsageRollupState.name == STATE_NAME).with_for_update()
+    )).scalars().first()
+    if state is None:
+        state = UsageRollupState(name=STATE_NAME, last_id=0)
+        db.add(state)
+
+    last_id = state.last_id or 0
+    cutoff = datetime.now(timezone.utc) - safety_lag
+
+    max_id = await db.scalar(select(func.max(UsageLog.id)).filter(UsageLog.id > last_id))
+    upper = last_id
+    backlog = False
+    if max_id is not None:
+        upper = min(max_id, last_id + max_rows)
+        too_recent = await db.scalar(
+            select(func.min(UsageLog.id)).filter(
+                UsageLog.id > last_id,
+                UsageLog.id <= upper,
+                UsageLog.timestamp >= cutoff,
+            )
+        )
+        if too_recent is not None:
+            upper = too_recent - 1
+        else:
+            backlog = upper < max_id
+
+    if upper > last_id:
+        day = func.date(func.timezone("UTC", UsageLog.timestamp))
+        aggregated = select(
+            UsageLog.org_id,
+            UsageLog.api_key_id,
+            UsageLog.endpoint,
+            day,
+            func.count(),
+            _status_count(200, 299),
+            _status_count(400, 499),
+            _status_count(500, 599),
+            func.coalesce(func.sum(UsageLog.token_count), 0),
+        ).filter(
+            UsageLog.id > last_id,
+            UsageLog.id <= upper,
+        ).group_by(UsageLog.org_id, UsageLog.api_key_id, UsageLog.endpoint, day)
+
+        await db.execute(add_to_rollups(
+            pg_insert(UsageDailyRollup).from_select(
+                ["org_id", "api_key_id", "endpoint", "day", "request_count", "count_2xx", "count_4xx", "count_5xx", "token_count"],
+                aggregated,
+            )
+        ))
+
+    if not backlog:
+        # Only recent rows remain past the mark; any of them older than the
+        # cutoff (late commits) hold coverage back.
+        oldest_pending = await db.scalar(select(func.min(UsageLog.timestamp)).filter(UsageLog.id > upper))
+        covered_until = cutoff if oldest_pending is None else min(cutoff, oldest_pending)
+        if state.covered_until is None or covered_until > state.covered_until:
+            state.covered_until = covered_until
+    state.last_id = upper
+    await db.commit()
+    return upper - last_id
+
+
+class UsageRollupWorker:
+    """Calls refresh_daily_rollups() every `interval` seconds, catching up in batches."""
+
+    def __init__(self, interval: float, max_rows: int, safety_lag_sec: float):
+        self.interval = interval
+        self.max_rows = max_rows
+        self.safety_lag = timedelta(seconds=safety_lag_sec)
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                # Keep going while full batches come back (backlog after downtime).
+                while True:
+                    async with AsyncSessionLocal() as db:
+                        advanced = await refresh_daily_rollups(db, self.max_rows, self.safety_lag)
+                    if advanced < self.max_rows:
+                        break
+            except Exception:
+                logger.exception("Usage rollup refresh failed")
+            await asyncio.sleep(self.interval)
+
+
+usage_rollup_worker = UsageRollupWorker(
+    interval=settings.USAGE_ROLLUP_INTERVAL_SEC,
+    max_rows=settings.USAGE_ROLLUP_BATCH_ROWS,
+    safety_lag_sec=settings.USAGE_ROLLUP_SAFETY_LAG_SEC,
+)
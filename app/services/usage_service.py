@@ -0,0 +1,250 @@
+from collections import defaultdict
+from datetime import date, datetime, time, timedelta, timezone
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from sqlalchemy import func, tuple_
+from app.core.config import settings
+from app.db.session import read_sessionmaker
+from app.models.usage import UsageLog, UsageDailyRollup, UsageRollupState
+from app.services.usage_rollups import STATE_NAME
+
+# Usage aggregation shared by the usage summary and invoicing.
+#
+# Closed days are read from usage_daily_rollups. In "log" metering mode the
+# days the rollup job hasn't fully covered yet (normally just today) are
+# aggregated from raw usage_logs; in "counters" mode there are no raw rows
+# and everything comes from the rollups.
+#
+# usage_logs is partitioned by month on `timestamp`, so raw queries filter on
+# a half-open UTC timestamp range rather than func.date(timestamp); the
+# planner can only prune partitions for predicates on the bare column.
+
+DateRange = Tuple[date, date]
+# Keyset positions: (day, endpoint) for the summary, (timestamp, id) for raw events.
+SummaryKey = Tuple[date, str]
+EventKey = Tuple[datetime, int]
+
+def day_start(day: date) -> datetime:
+    """Midnight UTC at the start of `day`."""
+    return datetime.combine(day, time.min, tzinfo=timezone.utc)
+
+def _utc_day(column):
+    return func.date(func.timezone("UTC", column))
+
+async def raw_boundary(db: AsyncSession) -> date:
+    """First UTC day that still has to be read from raw usage_logs."""
+    today = datetime.now(timezone.utc).date()
+    covered_until = await db.scalar(
+        select(UsageRollupState.covered_until).filter(UsageRollupState.name == STATE_NAME)
+    )
+    if covered_until is None:
+        return date.min
+    return min(today, covered_until.astimezone(timezone.utc).date())
+
+async def closed_before(db: AsyncSession) -> date:
+    """
+    First UTC day whose usage may still change; earlier days are final and
+    their aggregates can be cached.
+    """
+    if settings.USAGE_METERING_MODE == "log":
+        return await raw_boundary(db)
+    # Counters reach the rollups within a flush or two of the day ending.
+    settled = datetime.now(timezone.utc) - timedelta(
+        seconds=settings.USAGE_ROLLUP_SAFETY_LAG_SEC + 2 * settings.USAGE_COUNTER_FLUSH_INTERVAL_SEC
+    )
+    return settled.date()
+
+async def split_range(
+    db: AsyncSession, start_date: date, end_date: date
+) -> Tuple[Optional[DateRange], Optional[DateRange]]:
+    """Split start_date..end_date into (rollup days, raw days); either may be None."""
+    if settings.USAGE_METERING_MODE == "counters":
+        return (start_date, end_date), None
+
+    boundary = await raw_boundary(db)
+    rollup_range = raw_range = None
+    if start_date < boundary:
+        rollup_range = (start_date, min(end_date, boundary - timedelta(days=1)))
+    if end_date >= boundary:
+        raw_range = (max(start_date, boundary), end_date)
+    return rollup_range, raw_range
+
+def _summary_statements(org_id, rollup_range: Optional[DateRange], raw_range: Optional[DateRange], after: Optional[SummaryKey]):
+    """Summary queries in (day, endpoint) order; rollup days all precede raw days."""
+    statements = []
+    if rollup_range:
+        stmt = select(
+            UsageDailyRollup.endpoint,
+            func.sum(UsageDailyRollup.request_count).label("count"),
+            UsageDailyRollup.day.label("date")
+        ).filter(
+            UsageDailyRollup.org_id == org_id,
+            UsageDailyRollup.day >= rollup_range[0],
+            UsageDailyRollup.day <= rollup_range[1]
+        ).group_by(UsageDailyRollup.endpoint, UsageDailyRollup.day)
+        if after:
+            stmt = stmt.filter(tuple_(UsageDailyRollup.day, UsageDailyRollup.endpoint) > tuple_(*after))
+        statements.append(stmt.order_by(UsageDailyRollup.day, UsageDailyRollup.endpoint))
+
+    if raw_range:
+        start = raw_range[0] if not after else max(raw_range[0], after[0])
+        stmt = select(
+            UsageLog.endpoint,
+            func.count(UsageLog.id).label("count"),
+            _utc_day(UsageLog.timestamp).label("date")
+        ).filter(
+            UsageLog.org_id == org_id,
+            UsageLog.timestamp >= day_start(start),
+            UsageLog.timestamp < day_start(raw_range[1] + timedelta(days=1))
+        ).group_by(UsageLog.endpoint, _utc_day(UsageLog.timestamp))
+        if after:
+            stmt = stmt.having(tuple_(_utc_day(UsageLog.timestamp), UsageLog.endpoint) > tuple_(*after))
+        statements.append(stmt.order_by(_utc_day(UsageLog.timestamp), UsageLog.endpoint))
+    return statements
+
+async def usage_by_endpoint_and_day(
+    db: AsyncSession,
+    org_id,
+    start_date: date,
+    end_date: date,
+    after: Optional[SummaryKey] = None,
+    limit: Optional[int] = None,
+) -> List[Tuple[str, int, date]]:
+    """
+    (endpoint, count, day) for one org, start_date..end_date inclusive, in
+    (day, endpoint) order. With `limit`, one page of at most that many rows
+    following the keyset position `after`.
+    """
+    rollup_range, raw_range = await split_range(db, start_date, end_date)
+    data: List[Tuple[str, int, date]] = []
+
+    for stmt in _summary_statements(org_id, rollup_range, raw_range, after):
+        if limit is not None:
+            if len(data) >= limit:
+                break
+            stmt = stmt.limit(limit - len(data))
+        result = await db.execute(stmt)
+        data.extend((endpoint, int(count), day) for endpoint, count, day in result.all())
+
+    return data
+
+async def stream_usage_by_endpoint_and_day(
+    org_id, start_date: date, end_date: date, batch_size: int = 1000
+) -> AsyncIterator[List[Tuple[str, int, date]]]:
+    """
+    usage_by_endpoint_and_day() in batches from server-side cursors, so
+    memory stays flat however long the range. Uses its own session, on the
+    read replica when it is in use: it is meant to be consumed by a
+    streaming response, after the request's dependencies have been torn down.
+    """
+    session_factory = await read_sessionmaker()
+    async with session_factory() as db:
+        rollup_range, raw_range = await split_range(db, start_date, end_date)
+        for stmt in _summary_statements(org_id, rollup_range, raw_range, None):
+            result = await db.stream(stmt.execution_options(yield_per=batch_size))
+            async for rows in result.partitions():
+                yield [(endpoint, int(count), day) for endpoint, count, day in rows]
+
+def _events_statement(org_id, start_date: date, end_date: date, after: Optional[EventKey]):
+    stmt = select(
+        UsageLog.id,
+        UsageLog.timestamp,
+        UsageLog.api_key_id,
+        UsageLog.endpoint,
+        UsageLog.method,
+        UsageLog.status_code,
+        UsageLog.token_count,
+    ).filter(
+        UsageLog.org_id == org_id,
+        UsageLog.timestamp >= day_start(start_date),
+        UsageLog.timestamp < day_start(end_date + timedelta(days=1))
+    )
+    if after:
+        stmt = stmt.filter(tuple_(UsageLog.timestamp, UsageLog.id) > tuple_(*after))
+    # Walks ix_usage_logs_org_id_timestamp; id only breaks timestamp ties.
+    return stmt.order_by(UsageLog.timestamp, UsageLog.id)
+
+async def usage_events(
+    db: AsyncSession, org_id, start_date: date, end_date: date, after: Optional[EventKey] = None, limit: int = 1000
+) -> List[tuple]:
+    """One page of raw usage_logs rows for an org, in (timestamp, id) order after `after`."""
+    result = await db.execute(_events_statement(org_id, start_date, end_date, after).limit(limit))
+    return result.all()
+
+async def stream_usage_events(
+    org_id, start_date: date, end_date: date, batch_size: int = 1000
+) -> AsyncIterator[List[tuple]]:
+    """usage_events() for the whole range in batches from a server-side cursor, on its own (read) session."""
+    session_factory = await read_sessionmaker()
+    async with session_factory() as db:
+        stmt = _events_statement(org_id, start_date, end_date, None)
+        result = await db.stream(stmt.execution_options(yield_per=batch_size))
+        async for rows in result.partitions():
+            yield rows
+
+async def usage_by_endpoint(
+    db: AsyncSession, org_id, start_date: date, end_date: date
+) -> List[Tuple[str, int]]:
+    """(endpoint, count) for one org, start_date..end_date inclusive."""
+    rollup_range, raw_range = await split_range(db, start_date, end_date)
+    totals: Dict[str, int] = defaultdict(int)
+
+    if rollup_range:
+        result = await db.execute(select(
+            UsageDailyRollup.endpoint,
+            func.sum(UsageDailyRollup.request_count).label("count")
+        ).filter(
+            UsageDailyRollup.org_id == org_id,
+            UsageDailyRollup.day >= rollup_range[0],
+            UsageDailyRollup.day <= rollup_range[1]
+        ).group_by(UsageDailyRollup.endpoint))
+        for endpoint, count in result.all():
+            totals[endpoint] += int(count)
+
+    if raw_range:
+        result = await db.execute(select(
+            UsageLog.endpoint,
+            func.count(UsageLog.id).label("count")
+        ).filter(
+            UsageLog.org_id == org_id,
+            UsageLog.timestamp >= day_start(raw_range[0]),
+            UsageLog.timestamp < day_start(raw_range[1] + timedelta(days=1))
+        ).group_by(UsageLog.endpoint))
+        for endpoint, count in result.all():
+            totals[endpoint] += int(count)
+
+    return list(totals.items())
+
+async def usage_by_org_and_endpoint(
+    db: AsyncSession, start_date: date, end_date: date
+) -> Dict[object, List[Tuple[str, int]]]:
+    """{org_id: [(endpoint, count), ...]} for every org with usage, in one GROUP BY per source."""
+    rollup_range, raw_range = await split_range(db, start_date, end_date)
+    totals: Dict[object, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+
+    if rollup_range:
+        result = await db.execute(select(
+            UsageDailyRollup.org_id,
+            UsageDailyRollup.endpoint,
+            func.sum(UsageDailyRollup.request_count).label("count")
+        ).filter(
+            UsageDailyRollup.day >= rollup_range[0],
+            UsageDailyRollup.day <= rollup_range[1]
+        ).group_by(UsageDailyRollup.org_id, UsageDailyRollup.endpoint))
+        for org_id, endpoint, count in result.all():
+            totals[org_id][endpoint] += int(count)
+
+    if raw_range:
+        result = await db.execute(select(
+            UsageLog.org_id,
+            UsageLog.endpoint,
+            func.count(UsageLog.id).label("count")
+        ).filter(
+            UsageLog.timestamp >= day_start(raw_range[0]),
+            UsageLog.timestamp < day_start(raw_range[1] + timedelta(days=1))
+        ).group_by(UsageLog.org_id, UsageLog.endpoint))
+        for org_id, endpoint, count in result.all():
+            totals[org_id][endpoint] += int(count)
+
+    return {org_id: list(endpoints.items()) for org_id, endpoints in totals.items()}
@@ -0,0 +1,148 @@
+"""
+Cost of authenticating dashboard requests (Bearer JWT) on a warm worker.
+
+Serves one org-scoped endpoint and compares:
+
+  * legacy - decode the JWT, load the user by email and then the user's
+             organization membership on every request
+  * cached - deps.get_current_org (memoized token verification plus the
+             user principal cache, which carries the membership)
+
+The database session is a fake that counts queries and sleeps
+--db-latency-ms per query, so the numbers show queries per request and the
+latency they cost without needing Postgres.
+
+    python benchmarks/bench_auth.py --requests 5000 --db-latency-ms 1
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+from fastapi import Depends, FastAPI, HTTPException
+from jose import JWTError, jwt
+from sqlalchemy.future import select
+
+from app.api import deps
+from app.core import security
+from app.core.config import settings
+from app.crud.crud_user import get_user_by_email
+from app.db import base  # noqa: F401  (registers every model so relationships resolve)
+from app.models.organization import OrganizationMember
+from app.models.user import User
+
+EMAIL = "bench@example.com"
+USER = User(id=uuid.uuid4(), email=EMAIL, hashed_password="x", full_name="Bench", is_active=True, is_superuser=False)
+
+
+ORG_ID = uuid.uuid4()
+
+
+class FakeScalars:
+    def first(self):
+        return USER
+
+
+class FakeResult:
+    def scalars(self):
+        return FakeScalars()
+
+    def first(self):
+        # (User, org_id, role) row of the principal cache's joined query.
+        return (USER, ORG_ID, "admin")
+
+
+class CountingSession:
+    queries = 0
+    latency = 0.0
+
+    async def execute(self, statement):
+        CountingSession.queries += 1
+        if CountingSession.latency:
+            await asyncio.sleep(CountingSession.latency)
+        return FakeResult()
+
+
+async def fake_db():
+    yield CountingSession()
+
+
+async def legacy_current_user(db=Depends(deps.get_db), token: str = Depends(deps.reusable_oauth2)):
+    try:
+        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+    except JWTError:
+        raise HTTPException(status_code=403, detail="Could not validate credentials")
+    user = await get_user_by_email(db, email=payload.get("sub"))
+    if not user or not user.is_active:
+        raise HTTPException(status_code=400, detail="Inactive user")
+    return user
+
+
+async def legacy_current_org(db=Depends(deps.get_db), current_user=Depends(legacy_current_user)):
+    await db.execute(select(OrganizationMember).filter(OrganizationMember.user_id == current_user.id))
+    return ORG_ID
+
+
+def build_app(variant: str) -> FastAPI:
+    app = FastAPI()
+    dependency = legacy_current_org if variant == "legacy" else deps.get_current_org
+
+    @app.get("/org")
+    async def org(org=Depends(dependency)):
+        return {"org_id": str(getattr(org, "org_id", org))}
+
+    app.dependency_overrides[deps.get_db] = fake_db
+    return app
+
+
+async def run_variant(variant: str, n_requests: int, warmup: int) -> dict:
+    transport = httpx.ASGITransport(app=build_app(variant))
+    headers = {"Authorization": f"Bearer {security.create_access_token(EMAIL)}"}
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for _ in range(warmup):
+            await client.get("/org", headers=headers)
+
+        CountingSession.queries = 0
+        samples = []
+        for _ in range(n_requests):
+            start = time.perf_counter()
+            resp = await client.get("/org", headers=headers)
+            samples.append(time.perf_counter() - start)
+            assert resp.status_code == 200, resp.text
+            assert resp.json()["org_id"] == str(ORG_ID), resp.text
+
+    samples.sort()
+    return {
+        "queries_per_request": CountingSession.queries / n_requests,
+        "mean_us": statistics.fmean(samples) * 1e6,
+        "p50_us": samples[len(samples) // 2] * 1e6,
+        "p99_us": samples[int(len(samples) * 0.99) - 1] * 1e6,
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--warmup", type=int, default=100)
+    parser.add_argument("--db-latency-ms", type=float, default=1.0)
+    args = parser.parse_args()
+    CountingSession.latency = args.db_latency_ms / 1000
+
+    print(f"requests={args.requests} db_latency_ms={args.db_latency_ms}")
+    print(f"{'variant':<8} {'queries/req':>12} {'mean us':>10} {'p50 us':>10} {'p99 us':>10}")
+    for variant in ("legacy", "cached"):
+        r = await run_variant(variant, args.requests, args.warmup)
+        print(
+            f"{variant:<8} {r['queries_per_request']:>12.2f} {r['mean_us']:>10.1f} "
+            f"{r['p50_us']:>10.1f} {r['p99_us']:>10.1f}"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
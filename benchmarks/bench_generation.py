@@ -0,0 +1,111 @@
+"""
+Throughput and latency of ai_service text generation under concurrency,
+one request per `generate` call vs micro-batched.
+
+  * unbatched - GenerationBatcher with max_batch_size=1 (the old behaviour)
+  * batched   - GenerationBatcher with the given window and batch size
+
+--mode mock replaces the model with a stub whose cost is
+`--base-ms + --per-item-ms * batch_size`, roughly how a batched forward pass
+scales on CPU. --mode real loads distilgpt2.
+
+    python benchmarks/bench_generation.py --mode mock --concurrency 32
+    python benchmarks/bench_generation.py --mode real --concurrency 8 --requests 64
+    python benchmarks/bench_generation.py --mode real --workers 4
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+parser.add_argument("--mode", choices=["mock", "real"], default="mock")
+parser.add_argument("--requests", type=int, default=512)
+parser.add_argument("--concurrency", type=int, default=32)
+parser.add_argument("--window-ms", type=float, default=10.0)
+parser.add_argument("--max-batch", type=int, default=8)
+parser.add_argument("--max-length", type=int, default=30)
+parser.add_argument("--base-ms", type=float, default=40.0)
+parser.add_argument("--per-item-ms", type=float, default=4.0)
+parser.add_argument("--workers", type=int, default=0, help="inference worker processes (0 = in-process thread)")
+args = parser.parse_args()
+
+os.environ["MOCK_AI_MODEL"] = "true" if args.mode == "mock" else "false"
+
+from app.services import ai_service
+
+PROMPTS = [
+    "The quick brown fox",
+    "Once upon a time in a land far away",
+    "Usage-based billing works by",
+    "Hello world",
+]
+
+if args.mode == "mock":
+    def simulated_batch(prompts, max_lengths):
+        time.sleep((args.base_ms + args.per_item_ms * len(prompts)) / 1000)
+        return [f"[MOCK AI] Generated text for: {prompt}" for prompt in prompts]
+
+    ai_service.generate_batch_sync = simulated_batch
+
+
+async def run(label: str, window_ms: float, max_batch: int) -> dict:
+    if ai_service._process_pool is not None:
+        batcher = ai_service.GenerationBatcher(window_ms, max_batch, ai_service._process_pool, args.workers)
+    else:
+        batcher = ai_service.GenerationBatcher(window_ms, max_batch, ai_service._executor)
+    await batcher.start()
+    latencies = []
+    per_client = args.requests // args.concurrency
+
+    async def client(index: int):
+        for i in range(per_client):
+            prompt = PROMPTS[(index + i) % len(PROMPTS)]
+            started = time.perf_counter()
+            await batcher.submit(prompt, args.max_length)
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client(i) for i in range(args.concurrency)))
+    elapsed = time.perf_counter() - started
+    stats = batcher.stats()
+    await batcher.stop()
+
+    latencies.sort()
+    return {
+        "label": label,
+        "rps": len(latencies) / elapsed,
+        "p50_ms": latencies[len(latencies) // 2] * 1000,
+        "p99_ms": latencies[max(int(len(latencies) * 0.99) - 1, 0)] * 1000,
+        "mean_ms": statistics.fmean(latencies) * 1000,
+        "avg_batch": stats["avg_batch_size"],
+    }
+
+
+async def main():
+    # Forked after the mock patch / model load, so workers inherit both.
+    await ai_service.start_inference_workers(args.workers)
+    if args.mode == "real" and not args.workers:
+        ai_service.load_model()
+        # Warm up kernels / allocator outside the measurement.
+        ai_service.generate_batch_sync(PROMPTS, [args.max_length] * len(PROMPTS))
+
+    results = [
+        await run("unbatched", 0.0, 1),
+        await run("batched", args.window_ms, args.max_batch),
+    ]
+    await ai_service.stop_inference_workers()
+    print(f"mode={args.mode} workers={args.workers} requests={args.requests} concurrency={args.concurrency} "
+          f"window_ms={args.window_ms} max_batch={args.max_batch}")
+    print(f"{'variant':<10} {'req/s':>8} {'mean ms':>9} {'p50 ms':>9} {'p99 ms':>9} {'avg batch':>10}")
+    for r in results:
+        print(f"{r['label']:<10} {r['rps']:>8.1f} {r['mean_ms']:>9.1f} {r['p50_ms']:>9.1f} "
+              f"{r['p99_ms']:>9.1f} {r['avg_batch']:>10.1f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
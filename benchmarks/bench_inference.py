@@ -0,0 +1,96 @@
+"""
+CPU inference speed of the ai_service backends: fp32 vs int8 dynamic
+quantization, each under torch.inference_mode().
+
+For every backend and thread count, runs --requests single-prompt
+generations of --new-tokens tokens (greedy, so both backends do the same
+amount of work) and reports tokens/sec and p50/p99 request latency, plus
+the model's parameter + buffer size.
+
+Needs the real model (downloads distilgpt2 on first run):
+
+    python benchmarks/bench_inference.py --threads 1 4 --requests 50
+"""
+import argparse
+import io
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ["MOCK_AI_MODEL"] = "false"
+
+import torch
+
+from app.services import ai_service
+
+PROMPTS = [
+    "The quick brown fox",
+    "Once upon a time in a land far away",
+    "Usage-based billing works by",
+    "Hello world",
+]
+
+
+def model_size_mb(model) -> float:
+    # state_dict() includes the packed int8 weights of quantized layers.
+    buffer = io.BytesIO()
+    torch.save(model.state_dict(), buffer)
+    return buffer.tell() / 1e6
+
+
+def run(model, tokenizer, requests: int, new_tokens: int, warmup: int) -> dict:
+    latencies = []
+    generated = 0
+    for i in range(warmup + requests):
+        inputs = tokenizer(PROMPTS[i % len(PROMPTS)], return_tensors="pt")
+        started = time.perf_counter()
+        with ai_service.inference_context():
+            output = model.generate(
+                **inputs,
+                max_new_tokens=new_tokens,
+                min_new_tokens=new_tokens,
+                do_sample=False,
+                pad_token_id=tokenizer.eos_token_id,
+            )
+        elapsed = time.perf_counter() - started
+        if i >= warmup:
+            latencies.append(elapsed)
+            generated += output.shape[1] - inputs["input_ids"].shape[1]
+    latencies.sort()
+    return {
+        "tokens_per_sec": generated / sum(latencies),
+        "p50_ms": latencies[len(latencies) // 2] * 1000,
+        "p99_ms": latencies[max(int(len(latencies) * 0.99) - 1, 0)] * 1000,
+        "mean_ms": statistics.fmean(latencies) * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backends", nargs="+", default=["fp32", "int8"])
+    parser.add_argument("--threads", nargs="+", type=int, default=[torch.get_num_threads()])
+    parser.add_argument("--requests", type=int, default=50)
+    parser.add_argument("--warmup", type=int, default=5)
+    parser.add_argument("--new-tokens", type=int, default=32)
+    args = parser.parse_args()
+
+    rows = []
+    for backend in args.backends:
+        model, tokenizer = ai_service.build_model(backend)
+        size = model_size_mb(model)
+        for threads in args.threads:
+            ai_service.configure_threads(threads)
+            result = run(model, tokenizer, args.requests, args.new_tokens, args.warmup)
+            rows.append((backend, threads, size, result))
+
+    print(f"requests={args.requests} new_tokens={args.new_tokens}")
+    print(f"{'backend':<8} {'threads':>7} {'size MB':>8} {'tok/s':>8} {'mean ms':>9} {'p50 ms':>9} {'p99 ms':>9}")
+    for backend, threads, size, r in rows:
+        print(f"{backend:<8} {threads:>7} {size:>8.1f} {r['tokens_per_sec']:>8.1f} {r['mean_ms']:>9.1f} "
+              f"{r['p50_ms']:>9.1f} {r['p99_ms']:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""
+Latency of ordinary API traffic while a burst of logins hashes passwords.
+
+Serves a trivial keyed endpoint next to a login endpoint that verifies an
+Argon2 hash, and compares:
+
+  * blocking - security.verify_password() called inside the async handler
+  * async    - security.verify_password_async() (bounded hashing threads,
+               503 once PASSWORD_HASH_MAX_PENDING calls are pending)
+
+For each variant, --logins concurrent login requests are fired while a
+probe sends one keyed request every --probe-interval-ms; the keyed
+endpoint's p50/p99 latency is reported next to its latency with no burst.
+
+    python benchmarks/bench_login_burst.py --logins 200
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+from fastapi import FastAPI, HTTPException
+
+from app.core import security
+
+PASSWORD = "correct horse battery staple"
+HASHED = security.get_password_hash(PASSWORD)
+
+
+def build_app(variant: str) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/keyed")
+    async def keyed():
+        return {"ok": True}
+
+    @app.post("/login")
+    async def login():
+        if variant == "blocking":
+            ok = security.verify_password(PASSWORD, HASHED)
+        else:
+            try:
+                ok = await security.verify_password_async(PASSWORD, HASHED)
+            except security.PasswordHashingBusy:
+                raise HTTPException(status_code=503, detail="busy")
+        return {"ok": ok}
+
+    return app
+
+
+def percentiles(samples):
+    samples = sorted(samples)
+    return (
+        statistics.fmean(samples) * 1000,
+        samples[len(samples) // 2] * 1000,
+        samples[max(int(len(samples) * 0.99) - 1, 0)] * 1000,
+    )
+
+
+async def probe(client: httpx.AsyncClient, interval: float, stop: asyncio.Event, samples: list):
+    while not stop.is_set():
+        start = time.perf_counter()
+        resp = await client.get("/keyed")
+        samples.append(time.perf_counter() - start)
+        assert resp.status_code == 200
+        await asyncio.sleep(interval)
+
+
+async def run_variant(variant: str, logins: int, interval: float, baseline_requests: int) -> dict:
+    transport = httpx.ASGITransport(app=build_app(variant))
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        baseline = []
+        for _ in range(baseline_requests):
+            start = time.perf_counter()
+            await client.get("/keyed")
+            baseline.append(time.perf_counter() - start)
+
+        stop = asyncio.Event()
+        during = []
+        prober = asyncio.create_task(probe(client, interval, stop, during))
+        started = time.perf_counter()
+        responses = await asyncio.gather(*(client.post("/login") for _ in range(logins)))
+        burst_sec = time.perf_counter() - started
+        stop.set()
+        await prober
+
+    return {
+        "baseline": percentiles(baseline),
+        "during": percentiles(during) if during else (0.0, 0.0, 0.0),
+        "probes": len(during),
+        "logins_ok": sum(1 for r in responses if r.status_code == 200),
+        "logins_503": sum(1 for r in responses if r.status_code == 503),
+        "burst_sec": burst_sec,
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--logins", type=int, default=200)
+    parser.add_argument("--probe-interval-ms", type=float, default=5.0)
+    parser.add_argument("--baseline-requests", type=int, default=200)
+    args = parser.parse_args()
+
+    print(f"logins={args.logins} hash_workers={security.settings.PASSWORD_HASH_WORKERS} "
+          f"max_pending={security.settings.PASSWORD_HASH_MAX_PENDING}")
+    print(f"{'variant':<9} {'idle p50/p99 ms':>16} {'burst p50/p99 ms':>17} {'probes':>7} {'ok':>5} {'503':>5} {'burst s':>8}")
+    for variant in ("blocking", "async"):
+        r = await run_variant(variant, args.logins, args.probe_interval_ms / 1000, args.baseline_requests)
+        idle, during = r["baseline"], r["during"]
+        print(
+            f"{variant:<9} {idle[1]:>7.2f}/{idle[2]:<8.2f} {during[1]:>8.2f}/{during[2]:<8.2f} "
+            f"{r['probes']:>7} {r['logins_ok']:>5} {r['logins_503']:>5} {r['burst_sec']:>8.2f}"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,189 @@
+"""
+Per-request overhead of the middleware stack on POST /api/v1/demo/generate.
+
+Compares three apps serving the same router in MOCK_AI_MODEL mode:
+
+  * bare       - no middleware
+  * basehttp   - the previous BaseHTTPMiddleware implementations
+  * asgi       - the current pure-ASGI RateLimit/UsageTracking middleware
+
+Redis, the API key resolver and the usage queue are replaced with in-memory
+fakes so the numbers isolate the cost of the middleware plumbing itself.
+
+    python benchmarks/bench_middleware.py --requests 5000
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("MOCK_AI_MODEL", "true")
+# Sequential requests; don't hold each one for a batching window.
+os.environ.setdefault("AI_BATCH_WINDOW_MS", "0")
+
+import httpx
+from fastapi import FastAPI, Request
+from starlette.background import BackgroundTask
+from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.responses import JSONResponse
+
+from app.api.v1.endpoints import demo
+from app.core.config import settings
+from app.middleware import rate_limit, usage_tracker
+from app.services.api_key_resolver import ResolvedAPIKey
+from app.services.rate_limiter import RateLimitResult
+from app.services.usage_ingest import UsageEvent
+
+API_KEY = "sk_live_benchmark"
+RESOLVED = ResolvedAPIKey(
+    id=uuid.uuid4(),
+    org_id=uuid.uuid4(),
+    key_hash="0" * 64,
+    is_active=True,
+    rate_limit_per_sec=10 ** 9,
+    rate_limit_algorithm="sliding_window",
+)
+
+
+class FakeRedis:
+    def __init__(self):
+        self.counters = {}
+
+    async def incr(self, key):
+        self.counters[key] = self.counters.get(key, 0) + 1
+        return self.counters[key]
+
+    async def expire(self, key, seconds):
+        return True
+
+
+class FakeLimiter:
+    async def hit(self, api_key, cost=1):
+        return RateLimitResult(allowed=True, limit=api_key.rate_limit_per_sec, remaining=api_key.rate_limit_per_sec, reset_ms=1000)
+
+
+class FakeResolver:
+    async def resolve(self, api_key_value):
+        return RESOLVED
+
+
+class FakeQueue:
+    def __init__(self):
+        self.events = []
+
+    async def enqueue(self, event):
+        self.events.append(event)
+        return True
+
+
+fake_redis = FakeRedis()
+fake_resolver = FakeResolver()
+fake_queue = FakeQueue()
+
+
+rate_limit.rate_limiter = FakeLimiter()
+rate_limit.api_key_resolver = fake_resolver
+usage_tracker.api_key_resolver = fake_resolver
+usage_tracker.usage_ingest_queue = fake_queue
+
+
+class LegacyRateLimitMiddleware(BaseHTTPMiddleware):
+    async def dispatch(self, request: Request, call_next):
+        api_key_header = request.headers.get("X-API-KEY")
+        if api_key_header:
+            api_key = await fake_resolver.resolve(api_key_header)
+            request.state.api_key = api_key
+            request_count = await fake_redis.incr(f"rate:{api_key.key_hash}:{int(time.time())}")
+            if request_count == 1:
+                await fake_redis.expire(f"rate:{api_key.key_hash}:{int(time.time())}", 5)
+            if request_count > api_key.rate_limit_per_sec:
+                return JSONResponse(status_code=429, content={"detail": "Rate limit exceeded"})
+        return await call_next(request)
+
+
+class LegacyUsageTrackingMiddleware(BaseHTTPMiddleware):
+    async def dispatch(self, request: Request, call_next):
+        api_key_header = request.headers.get("X-API-KEY")
+        response = await call_next(request)
+        if api_key_header:
+            existing_task = response.background
+            api_key = getattr(request.state, "api_key", None)
+
+            async def task_wrapper():
+                if existing_task:
+                    await existing_task()
+                await fake_queue.enqueue(UsageEvent(
+                    org_id=api_key.org_id,
+                    api_key_id=api_key.id,
+                    endpoint=request.url.path,
+                    method=request.method,
+                    status_code=response.status_code,
+                ))
+
+            response.background = BackgroundTask(task_wrapper)
+        return response
+
+
+def build_app(variant: str) -> FastAPI:
+    app = FastAPI()
+    if variant == "basehttp":
+        app.add_middleware(LegacyUsageTrackingMiddleware)
+        app.add_middleware(LegacyRateLimitMiddleware)
+    elif variant == "asgi":
+        app.add_middleware(usage_tracker.UsageTrackingMiddleware)
+        app.add_middleware(rate_limit.RateLimitMiddleware)
+    app.include_router(demo.router, prefix=f"{settings.API_V1_STR}/demo")
+    return app
+
+
+async def run_variant(variant: str, n_requests: int, warmup: int):
+    app = build_app(variant)
+    transport = httpx.ASGITransport(app=app)
+    url = f"{settings.API_V1_STR}/demo/generate"
+    body = {"prompt": "Hello world", "max_length": 10}
+    headers = {"X-API-KEY": API_KEY}
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for _ in range(warmup):
+            await client.post(url, json=body, headers=headers)
+
+        samples = []
+        for _ in range(n_requests):
+            start = time.perf_counter()
+            resp = await client.post(url, json=body, headers=headers)
+            samples.append(time.perf_counter() - start)
+            assert resp.status_code == 200, resp.text
+
+    samples.sort()
+    return {
+        "mean_us": statistics.fmean(samples) * 1e6,
+        "p50_us": samples[len(samples) // 2] * 1e6,
+        "p99_us": samples[int(len(samples) * 0.99) - 1] * 1e6,
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--warmup", type=int, default=200)
+    args = parser.parse_args()
+
+    results = {}
+    for variant in ("bare", "basehttp", "asgi"):
+        results[variant] = await run_variant(variant, args.requests, args.warmup)
+
+    bare = results["bare"]["mean_us"]
+    print(f"{'variant':<10} {'mean us':>10} {'p50 us':>10} {'p99 us':>10} {'overhead us':>12}")
+    for variant, r in results.items():
+        print(
+            f"{variant:<10} {r['mean_us']:>10.1f} {r['p50_us']:>10.1f} {r['p99_us']:>10.1f} "
+            f"{r['mean_us'] - bare:>12.1f}"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,96 @@
+"""
+Rating throughput for month-end billing: N (schedule, quantity) pairs.
+
+Compares a per-pair Python loop over the tiers (how invoicing used to rate
+usage) with ScheduleSet.rate(), on a random mix of flat, graduated and
+volume schedules, and checks both agree to the cent.
+
+    python benchmarks/bench_rating.py --pairs 1000000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from app.services.rating import GRADUATED, VOLUME, ScheduleSet, Tier, TierSchedule, to_money
+
+
+def random_schedule(rng: random.Random) -> TierSchedule:
+    kind = rng.choice(["flat", GRADUATED, VOLUME])
+    if kind == "flat":
+        return TierSchedule.flat(rng.choice([0.001, 0.002, 0.01]), rng.choice([0, 1000, 10000]))
+    bounds = sorted(rng.sample(range(1_000, 5_000_000, 1_000), rng.randint(1, 4)))
+    price = rng.choice([0.01, 0.005])
+    tiers = []
+    for up_to in bounds + [None]:
+        tiers.append(Tier(up_to, price, rng.choice([0.0, 0.0, 5.0])))
+        price = round(price * 0.7, 6)
+    return TierSchedule(kind, tuple(tiers))
+
+
+def rate_python(schedule: TierSchedule, quantity: int) -> float:
+    if quantity <= 0:
+        return 0.0
+    if schedule.mode == VOLUME:
+        for i, tier in enumerate(schedule.tiers):
+            last = i == len(schedule.tiers) - 1
+            if last or tier.up_to is None or quantity <= tier.up_to:
+                return quantity * tier.unit_price + tier.flat_fee
+    amount, lower = 0.0, 0
+    for i, tier in enumerate(schedule.tiers):
+        last = i == len(schedule.tiers) - 1
+        upper = None if last else tier.up_to
+        if quantity <= lower:
+            break
+        units = quantity - lower if upper is None else min(quantity, upper) - lower
+        amount += units * tier.unit_price + tier.flat_fee
+        if upper is None:
+            break
+        lower = upper
+    return amount
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pairs", type=int, default=1_000_000)
+    parser.add_argument("--schedules", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    schedules = [random_schedule(rng) for _ in range(args.schedules)]
+    np_rng = np.random.default_rng(args.seed)
+    schedule_ids = np_rng.integers(0, len(schedules), size=args.pairs)
+    # Heavy-tailed request counts, like real per-org usage.
+    quantities = np.floor(np_rng.lognormal(mean=8, sigma=2.5, size=args.pairs)).astype(np.int64)
+
+    ids_list, q_list = schedule_ids.tolist(), quantities.tolist()
+    started = time.perf_counter()
+    expected = [rate_python(schedules[s], q) for s, q in zip(ids_list, q_list)]
+    python_sec = time.perf_counter() - started
+
+    started = time.perf_counter()
+    compiled = ScheduleSet(schedules)
+    compile_sec = time.perf_counter() - started
+
+    started = time.perf_counter()
+    amounts = compiled.rate(schedule_ids, quantities)
+    numpy_sec = time.perf_counter() - started
+
+    sample = rng.sample(range(args.pairs), min(args.pairs, 20_000))
+    mismatches = sum(1 for i in sample if to_money(amounts[i]) != to_money(expected[i]))
+
+    print(f"pairs={args.pairs} schedules={args.schedules}")
+    print(f"python loop   {python_sec:8.3f}s  {args.pairs / python_sec:12,.0f} pairs/s")
+    print(f"numpy (rate)  {numpy_sec:8.3f}s  {args.pairs / numpy_sec:12,.0f} pairs/s  (+{compile_sec * 1000:.1f}ms compile)")
+    print(f"speedup       {python_sec / numpy_sec:8.1f}x")
+    print(f"cent mismatches in {len(sample)} sampled pairs: {mismatches}")
+
+
+if __name__ == "__main__":
+    main()